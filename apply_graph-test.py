@@ -0,0 +1,141 @@
+import json
+
+import pytest
+from cdktf import Testing
+
+from apply_graph import (
+    analyze,
+    build_graph,
+    critical_path,
+    earliest_schedule,
+    redundant_edges,
+    simulate,
+    stack_files,
+    topological_order,
+)
+from main import MyStack
+
+DURATIONS = {'default': 5, 'data': 1, 'aws_eks_cluster': 600, 'aws_eks_node_group': 240, 'aws_s3_bucket_policy': 50}
+
+STACK = {
+    'data': {'aws_caller_identity': {'CallerIdentity': {}}},
+    'provider': {'kubernetes': [{'alias': 'angular2', 'host': '${aws_eks_cluster.Cluster.endpoint}'}]},
+    'resource': {
+        'aws_vpc': {'Vpc': {'cidr_block': '10.0.0.0/16'}},
+        'aws_subnet': {
+            'SubnetA': {'vpc_id': '${aws_vpc.Vpc.id}'},
+            'SubnetB': {'vpc_id': '${aws_vpc.Vpc.id}'},
+        },
+        'aws_iam_role': {'EksRole': {'name': 'eks-${data.aws_caller_identity.CallerIdentity.account_id}'}},
+        'aws_eks_cluster': {'Cluster': {
+            'role_arn': '${aws_iam_role.EksRole.arn}',
+            'vpc_config': {'subnet_ids': ['${aws_subnet.SubnetA.id}', '${aws_subnet.SubnetB.id}']},
+            'depends_on': ['aws_vpc.Vpc'],
+        }},
+        'aws_eks_node_group': {'General': {
+            'cluster_name': '${aws_eks_cluster.Cluster.name}',
+            'lifecycle': {'ignore_changes': ['scaling_config[0].desired_size']},
+        }},
+        'aws_s3_bucket_policy': {'Logs': {'bucket': 'reports'}},
+        'aws_lb': {'Web': {'subnets': ['${aws_subnet.SubnetA.id}'], 'depends_on': ['aws_s3_bucket_policy.Logs']}},
+        'kubernetes_service_v1': {'Service': {'provider': 'kubernetes.angular2', 'metadata': {'name': 'web'}}},
+    },
+}
+
+
+@pytest.fixture(scope='module')
+def graph():
+    return build_graph(STACK, DURATIONS)
+
+
+class TestBuildGraph:
+
+    def test_references_and_depends_on(self, graph):
+        assert graph['aws_eks_cluster.Cluster']['dependencies'] == [
+            'aws_iam_role.EksRole', 'aws_subnet.SubnetA', 'aws_subnet.SubnetB', 'aws_vpc.Vpc']
+        assert graph['aws_eks_cluster.Cluster']['explicit'] == ['aws_vpc.Vpc']
+        assert graph['aws_iam_role.EksRole']['dependencies'] == ['data.aws_caller_identity.CallerIdentity']
+        assert graph['aws_eks_node_group.General']['dependencies'] == ['aws_eks_cluster.Cluster']
+
+    def test_aliased_provider_dependencies(self, graph):
+        assert graph['kubernetes_service_v1.Service']['dependencies'] == ['aws_eks_cluster.Cluster']
+
+    def test_durations_by_type(self, graph):
+        assert graph['aws_eks_cluster.Cluster']['duration'] == 600
+        assert graph['aws_subnet.SubnetA']['duration'] == 5
+        assert graph['data.aws_caller_identity.CallerIdentity']['duration'] == 1
+
+    def test_unknown_depends_on(self):
+        stack = {'resource': {'aws_lb': {'Web': {'depends_on': ['aws_s3_bucket_policy.Missing']}}}}
+        with pytest.raises(KeyError):
+            build_graph(stack)
+
+    def test_cycle(self):
+        stack = {'resource': {'aws_vpc': {
+            'A': {'tags': {'peer': '${aws_vpc.B.id}'}},
+            'B': {'tags': {'peer': '${aws_vpc.A.id}'}},
+        }}}
+        with pytest.raises(ValueError):
+            topological_order(build_graph(stack))
+
+
+class TestAnalysis:
+
+    def test_critical_path(self, graph):
+        schedule = earliest_schedule(graph)
+        assert critical_path(graph, schedule) == [
+            'aws_vpc.Vpc', 'aws_subnet.SubnetB', 'aws_eks_cluster.Cluster', 'aws_eks_node_group.General']
+        assert schedule['aws_eks_node_group.General'] == (610, 850)
+
+    def test_simulate_limits_parallelism(self, graph):
+        assert simulate(graph, len(graph)) == 850
+        assert simulate(graph, 1) == sum(node['duration'] for node in graph.values())
+
+    def test_redundant_edges(self, graph):
+        assert ('aws_eks_cluster.Cluster', 'aws_vpc.Vpc') in redundant_edges(graph)
+
+    def test_report(self):
+        report = analyze(STACK, DURATIONS, parallelism=(1, 10))
+        assert report['critical_path_s'] == 850
+        assert report['apply_s'][10] == 850
+        assert report['max_useful_parallelism'] <= report['peak_concurrency']
+        assert simulate(build_graph(STACK, DURATIONS), report['max_useful_parallelism']) == 850
+        assert report['redundant_depends_on'] == [{'resource': 'aws_eks_cluster.Cluster', 'depends_on': 'aws_vpc.Vpc'}]
+        assert report['serializing_depends_on'] == []
+
+    def test_serializing_depends_on(self):
+        stack = json.loads(json.dumps(STACK))
+        stack['resource']['aws_s3_bucket_policy']['Logs']['bucket'] = '${aws_eks_node_group.General.id}'
+        report = analyze(stack, DURATIONS)
+        # The load balancer waits for the policy, which now waits for the node group
+        assert report['critical_path_s'] == 850 + 50 + 5
+        assert report['critical_path'][-1]['resource'] == 'aws_lb.Web'
+        assert report['serializing_depends_on'] == [
+            {'resource': 'aws_lb.Web', 'depends_on': 'aws_s3_bucket_policy.Logs', 'saving_s': 905 - 900}]
+
+
+class TestSynthesizedStack:
+
+    def test_eks_chain_dominates(self):
+        config = {
+            'region': 'us-east-1',
+            'availability_zones': {'us-east-1': ['us-east-1a', 'us-east-1b']},
+            'network': {'vpc_cidr': '10.0.0.0/16', 'az_count': 2, 'nat_gateways': 'single'},
+            'eks_clusters': [{'name': 'angularnew-cs', 'alias': 'angular2'}],
+            'node_group': {'desired_size': 2, 'max_size': 2, 'min_size': 1},
+            'rds': {'username': 'admin'},
+        }
+        stack = json.loads(Testing.synth(MyStack(Testing.app(), 'cdktf-eks-cluster', config)))
+        report = analyze(stack, {'default': 5, 'data': 1, 'aws_eks_cluster': 600, 'aws_eks_node_group': 240})
+        steps = [step['resource'].split('.')[0] for step in report['critical_path']]
+        assert steps[0] == 'aws_vpc'
+        assert steps[-2:] == ['aws_eks_cluster', 'aws_eks_node_group']
+
+    def test_stack_files(self, tmp_path):
+        (tmp_path / 'stacks' / 'network').mkdir(parents=True)
+        (tmp_path / 'manifest.json').write_text(json.dumps({'stacks': {'network': {
+            'dependencies': [], 'workingDirectory': 'stacks/network'}}}))
+        assert stack_files(str(tmp_path)) == {'network': str(tmp_path / 'stacks' / 'network' / 'cdk.tf.json')}
+        single = tmp_path / 'stacks' / 'network' / 'cdk.tf.json'
+        single.write_text('{}')
+        assert stack_files(str(single)) == {'network': str(single)}
@@ -0,0 +1,336 @@
+"""Offline critical-path and parallelism analysis of a synthesized stack.
+
+Reads a stack's cdk.tf.json and builds the resource graph terraform walks on
+apply: an edge for every ${type.name...} reference, every depends_on entry and,
+for resources on an aliased provider (the per-cluster kubernetes providers),
+everything that provider's configuration references. Each resource gets an
+estimated create time from a table by resource type (DEFAULT_DURATIONS,
+overridable with --durations), and the report shows:
+
+  - the critical path, the chain of resources that bounds apply time however
+    high -parallelism is set;
+  - the maximum useful parallelism, the smallest -parallelism that still
+    finishes as early as unlimited parallelism, and the apply time at the
+    -parallelism values asked for (terraform's default is 10);
+  - depends_on edges that serialize the apply: the ones that delay it and by
+    how much, and the ones already implied by other dependencies.
+
+    pipenv run python main.py && pipenv run python apply_graph.py
+    pipenv run python apply_graph.py cdktf.out/stacks/cdktf-eks-cluster/cdk.tf.json --parallelism 4 10 20
+
+The durations are rough create times; plans that change few resources are
+much faster. Put measured numbers in a JSON file ({"aws_eks_cluster": 720})
+to tune the estimate.
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import re
+import sys
+
+from deploy import load_stack_graph
+
+# Typical create times in seconds; "default" covers every other resource and "data" every data source
+DEFAULT_DURATIONS = {
+    'default': 5,
+    'data': 2,
+    'aws_eks_cluster': 600,
+    'aws_eks_node_group': 240,
+    'aws_eks_addon': 60,
+    'aws_rds_cluster': 420,
+    'aws_rds_cluster_instance': 540,
+    'aws_db_proxy': 240,
+    'aws_db_proxy_target': 120,
+    'aws_db_proxy_endpoint': 180,
+    'aws_nat_gateway': 110,
+    'aws_vpc_endpoint': 90,
+    'aws_lb': 180,
+    'aws_ecr_repository': 5,
+    'aws_secretsmanager_secret_version': 3,
+    'kubernetes_deployment_v1': 60,
+}
+
+# "type.name" (optionally "data.type.name") at the start of a reference
+REFERENCE = re.compile(r'\b(data\.)?([a-z][a-z0-9_]*)\.([A-Za-z_][A-Za-z0-9_-]*)')
+
+
+def load_durations(path=None):
+    """DEFAULT_DURATIONS with the entries of the JSON file at path on top."""
+    durations = dict(DEFAULT_DURATIONS)
+    if path:
+        with open(path) as f:
+            durations.update(json.load(f))
+    return durations
+
+
+def estimate_duration(address, durations):
+    if address.startswith('data.'):
+        return durations.get(address.split('.')[1], durations['data'])
+    return durations.get(address.split('.')[0], durations['default'])
+
+
+def _references(value, addresses):
+    """Addresses referenced by the ${...} expressions anywhere in value."""
+    found = set()
+    if isinstance(value, str):
+        if '${' in value:
+            for data, resource_type, name in REFERENCE.findall(value):
+                address = f"{data}{resource_type}.{name}"
+                if address in addresses:
+                    found.add(address)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if key != '//':
+                found |= _references(item, addresses)
+    elif isinstance(value, list):
+        for item in value:
+            found |= _references(item, addresses)
+    return found
+
+
+def build_graph(stack, durations=None):
+    """{address: {'type', 'duration', 'dependencies', 'explicit'}} for the stack's resources and data sources.
+
+    dependencies holds every address the resource waits for; explicit the
+    subset that only comes from its depends_on.
+    """
+    durations = durations or DEFAULT_DURATIONS
+    blocks = {}
+    for resource_type, entries in stack.get('resource', {}).items():
+        for name, block in entries.items():
+            blocks[f"{resource_type}.{name}"] = (resource_type, block)
+    for resource_type, entries in stack.get('data', {}).items():
+        for name, block in entries.items():
+            blocks[f"data.{resource_type}.{name}"] = (resource_type, block)
+    addresses = set(blocks)
+
+    provider_references = {}
+    for provider_type, entries in stack.get('provider', {}).items():
+        for entry in entries:
+            if entry.get('alias'):
+                provider_references[f"{provider_type}.{entry['alias']}"] = _references(entry, addresses)
+
+    graph = {}
+    for address, (resource_type, block) in blocks.items():
+        body = {key: value for key, value in block.items() if key not in ('depends_on', 'lifecycle', 'provider')}
+        implicit = _references(body, addresses) | provider_references.get(block.get('provider'), set())
+        explicit = set()
+        for dependency in block.get('depends_on', []):
+            dependency = dependency.strip('${}')
+            if dependency not in addresses:
+                raise KeyError(f"{address} depends on unknown resource {dependency}")
+            explicit.add(dependency)
+        implicit.discard(address)
+        graph[address] = {
+            'type': resource_type,
+            'duration': estimate_duration(address, durations),
+            'dependencies': sorted(implicit | explicit),
+            'explicit': sorted(explicit - implicit),
+        }
+    return graph
+
+
+def topological_order(graph):
+    """Addresses with every resource after its dependencies. Raises ValueError on a cycle."""
+    remaining = {address: len(node['dependencies']) for address, node in graph.items()}
+    dependents = {address: [] for address in graph}
+    for address, node in graph.items():
+        for dependency in node['dependencies']:
+            dependents[dependency].append(address)
+    ready = sorted(address for address, count in remaining.items() if count == 0)
+    order = []
+    while ready:
+        address = ready.pop()
+        order.append(address)
+        for dependent in dependents[address]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+    if len(order) != len(graph):
+        raise ValueError(f"Dependency cycle between {sorted(set(graph) - set(order))}")
+    return order
+
+
+def earliest_schedule(graph, order=None, skip_edge=None):
+    """{address: (start, finish)} with every resource starting as soon as its dependencies finished.
+
+    skip_edge, an (address, dependency) pair, is left out of the graph.
+    """
+    schedule = {}
+    for address in order or topological_order(graph):
+        node = graph[address]
+        start = max((schedule[dependency][1] for dependency in node['dependencies']
+                     if (address, dependency) != skip_edge), default=0)
+        schedule[address] = (start, start + node['duration'])
+    return schedule
+
+
+def critical_path(graph, schedule):
+    """The chain of addresses ending last in schedule, first resource first."""
+    if not schedule:
+        return []
+    address = max(schedule, key=lambda key: (schedule[key][1], key))
+    path = [address]
+    while graph[address]['dependencies']:
+        start = schedule[address][0]
+        blocking = [dependency for dependency in graph[address]['dependencies'] if schedule[dependency][1] == start]
+        if not blocking:
+            break
+        address = max(blocking)
+        path.append(address)
+    return path[::-1]
+
+
+def peak_concurrency(schedule):
+    """Most resources running at once in schedule."""
+    events = sorted([(finish, -1) for start, finish in schedule.values()] +
+                    [(start, 1) for start, finish in schedule.values()])
+    running = peak = 0
+    for _, change in events:
+        running += change
+        peak = max(peak, running)
+    return peak
+
+
+def simulate(graph, parallelism, order=None):
+    """Apply time with at most parallelism resources in flight, the way terraform's walker limits it."""
+    order = order or topological_order(graph)
+    position = {address: index for index, address in enumerate(order)}
+    waiting = {address: set(graph[address]['dependencies']) for address in graph}
+    dependents = {address: [] for address in graph}
+    for address, node in graph.items():
+        for dependency in node['dependencies']:
+            dependents[dependency].append(address)
+    ready = [(position[address], address) for address, dependencies in waiting.items() if not dependencies]
+    heapq.heapify(ready)
+    running = []
+    now = 0
+    while ready or running:
+        while ready and len(running) < parallelism:
+            _, address = heapq.heappop(ready)
+            heapq.heappush(running, (now + graph[address]['duration'], address))
+        now, address = heapq.heappop(running)
+        for dependent in dependents[address]:
+            waiting[dependent].discard(address)
+            if not waiting[dependent]:
+                heapq.heappush(ready, (position[dependent], dependent))
+    return now
+
+
+def redundant_edges(graph, order=None):
+    """[(address, dependency)] edges already implied by another dependency of address."""
+    ancestors = {}
+    for address in order or topological_order(graph):
+        ancestors[address] = set()
+        for dependency in graph[address]['dependencies']:
+            ancestors[address] |= {dependency} | ancestors[dependency]
+    redundant = []
+    for address, node in graph.items():
+        for dependency in node['dependencies']:
+            if any(dependency in ancestors[other] for other in node['dependencies'] if other != dependency):
+                redundant.append((address, dependency))
+    return sorted(redundant)
+
+
+def analyze(stack, durations=None, parallelism=(10,)):
+    """The report for one stack JSON document, as a dict."""
+    graph = build_graph(stack, durations)
+    order = topological_order(graph)
+    schedule = earliest_schedule(graph, order)
+    makespan = max((finish for _, finish in schedule.values()), default=0)
+    path = critical_path(graph, schedule)
+    peak = peak_concurrency(schedule)
+
+    useful = peak
+    for workers in range(1, peak + 1):
+        if simulate(graph, workers, order) <= makespan:
+            useful = workers
+            break
+
+    redundant = redundant_edges(graph, order)
+    serializing = []
+    for address, node in graph.items():
+        for dependency in node['explicit']:
+            if (address, dependency) in redundant:
+                continue
+            without = earliest_schedule(graph, order, skip_edge=(address, dependency))
+            saving = makespan - max(finish for _, finish in without.values())
+            if saving > 0:
+                serializing.append({'resource': address, 'depends_on': dependency, 'saving_s': saving})
+    serializing.sort(key=lambda edge: (-edge['saving_s'], edge['resource']))
+
+    return {
+        'resources': len(graph),
+        'edges': sum(len(node['dependencies']) for node in graph.values()),
+        'serial_s': sum(node['duration'] for node in graph.values()),
+        'critical_path_s': makespan,
+        'critical_path': [{'resource': address, 'start_s': schedule[address][0], 'duration_s': graph[address]['duration']}
+                          for address in path],
+        'peak_concurrency': peak,
+        'max_useful_parallelism': useful,
+        'apply_s': {workers: simulate(graph, workers, order) for workers in parallelism},
+        'serializing_depends_on': serializing,
+        'redundant_depends_on': [{'resource': address, 'depends_on': dependency} for address, dependency in redundant
+                                 if dependency in graph[address]['explicit']],
+        'redundant_edges': len(redundant),
+    }
+
+
+def stack_files(path):
+    """{stack_name: cdk.tf.json path} for a cdktf outdir, or for a single cdk.tf.json file."""
+    if os.path.isfile(path):
+        return {os.path.basename(os.path.dirname(os.path.abspath(path))): path}
+    return {name: os.path.join(stack['working_directory'], 'cdk.tf.json')
+            for name, stack in load_stack_graph(path).items()}
+
+
+def print_report(name, report):
+    print(f"{name}: {report['resources']} resources, {report['edges']} dependencies")
+    print(f"  estimated apply {report['critical_path_s']}s with unlimited parallelism, "
+          f"{report['serial_s']}s one at a time")
+    for workers, seconds in report['apply_s'].items():
+        print(f"  -parallelism={workers}: {seconds}s")
+    print(f"  peak concurrency {report['peak_concurrency']}, "
+          f"max useful parallelism {report['max_useful_parallelism']}")
+    print("  critical path:")
+    for step in report['critical_path']:
+        print(f"    {step['start_s']:>6}s +{step['duration_s']:<4} {step['resource']}")
+    if report['serializing_depends_on']:
+        print("  depends_on edges delaying the apply:")
+        for edge in report['serializing_depends_on']:
+            print(f"    {edge['resource']} -> {edge['depends_on']} (-{edge['saving_s']}s without it)")
+    if report['redundant_depends_on']:
+        print("  depends_on edges already implied by other dependencies:")
+        for edge in report['redundant_depends_on']:
+            print(f"    {edge['resource']} -> {edge['depends_on']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Critical path and parallelism of the synthesized stacks.')
+    parser.add_argument('path', nargs='?', default=os.getenv('CDKTF_OUTDIR', 'cdktf.out'),
+                        help='a cdktf outdir or a cdk.tf.json file (default: cdktf.out)')
+    parser.add_argument('--durations', help='JSON file of {resource_type: seconds} overriding the defaults')
+    parser.add_argument('--parallelism', type=int, nargs='+', default=[10],
+                        help='-parallelism values to estimate the apply time for (default: 10)')
+    parser.add_argument('--json', help='write the reports to this file as JSON')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    durations = load_durations(args.durations)
+    reports = {}
+    for name, path in stack_files(args.path).items():
+        with open(path) as f:
+            reports[name] = analyze(json.load(f), durations, args.parallelism)
+        print_report(name, reports[name])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+        logging.info(f"Wrote the report to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import base64
+import threading
+
+import yaml
+from kubernetes import client
+from kubernetes.client.exceptions import ApiException
+
+from aws_auth import admin_role_mapping, admin_user_mapping, merge_mappings, reconcile_clusters
+
+USER_ARN = 'arn:aws:iam::123456789012:user/fullstackappuser'
+ROLE_ARN = 'arn:aws:iam::123456789012:role/platform-admin'
+NODE_ROLE = {'rolearn': 'arn:aws:iam::123456789012:role/node', 'username': 'system:node:{{EC2PrivateDNSName}}',
+             'groups': ['system:bootstrappers', 'system:nodes']}
+
+
+class FakeEks:
+
+    def describe_cluster(self, name):
+        return {'cluster': {'endpoint': f'https://{name}.eks.example.com',
+                            'certificateAuthority': {'data': base64.b64encode(f'CA for {name}'.encode()).decode()}}}
+
+
+class FakeCoreV1Api:
+    """Holds one aws-auth ConfigMap per cluster host and enforces resourceVersion on replace."""
+
+    stores = {}
+    lock = threading.Lock()
+
+    def __init__(self, api_client, conflicts=0):
+        self.host = api_client.configuration.host
+        self.ca = api_client.configuration.ca_cert_data
+        self.conflicts = conflicts
+        self.replaces = 0
+
+    @property
+    def store(self):
+        return self.stores[self.host]
+
+    def read_namespaced_config_map(self, name, namespace):
+        with self.lock:
+            if self.host not in self.stores:
+                raise ApiException(status=404)
+            return client.V1ConfigMap(metadata=client.V1ObjectMeta(name=name, resource_version=str(self.store['version'])),
+                                      data=dict(self.store['data']))
+
+    def create_namespaced_config_map(self, namespace, body):
+        with self.lock:
+            self.stores[self.host] = {'version': 1, 'data': body.data}
+
+    def replace_namespaced_config_map(self, name, namespace, body):
+        with self.lock:
+            if self.conflicts:
+                # Someone else wrote in between our read and replace
+                self.conflicts -= 1
+                self.store['version'] += 1
+            if body.metadata.resource_version != str(self.store['version']):
+                raise ApiException(status=409)
+            self.replaces += 1
+            self.stores[self.host] = {'version': self.store['version'] + 1, 'data': body.data}
+
+
+def seed(cluster_name, data):
+    FakeCoreV1Api.stores[f'https://{cluster_name}.eks.example.com'] = {'version': 1, 'data': data}
+
+
+def reconcile(cluster_names, apis, conflicts=0, **kwargs):
+    def factory(api_client):
+        api = FakeCoreV1Api(api_client, conflicts=conflicts)
+        apis.append(api)
+        return api
+
+    return reconcile_clusters(cluster_names, eks_client=FakeEks(), token_provider=lambda name: f'token-{name}',
+                              core_api_factory=factory, **kwargs)
+
+
+class TestMergeMappings:
+
+    def test_batches_roles_and_users(self):
+        data, changed = merge_mappings({'mapRoles': yaml.safe_dump([NODE_ROLE])},
+                                       map_roles=[admin_role_mapping(ROLE_ARN)],
+                                       map_users=[admin_user_mapping(USER_ARN)])
+        assert changed
+        assert [role['rolearn'] for role in yaml.safe_load(data['mapRoles'])] == [NODE_ROLE['rolearn'], ROLE_ARN]
+        assert yaml.safe_load(data['mapUsers']) == [admin_user_mapping(USER_ARN)]
+
+    def test_is_idempotent(self):
+        data, _ = merge_mappings({}, map_users=[admin_user_mapping(USER_ARN)])
+        assert merge_mappings(data, map_users=[admin_user_mapping(USER_ARN)]) == (data, False)
+
+
+class TestReconcileClusters:
+
+    def setup_method(self):
+        FakeCoreV1Api.stores.clear()
+
+    def test_each_cluster_gets_its_own_client(self):
+        names = [f'cluster{i}' for i in range(6)]
+        for name in names:
+            seed(name, {'mapRoles': yaml.safe_dump([NODE_ROLE])})
+        apis = []
+        results = reconcile(names, apis, map_users=[admin_user_mapping(USER_ARN)], max_workers=3)
+
+        assert {result['outcome'] for result in results.values()} == {'updated'}
+        assert sorted(api.ca for api in apis) == sorted(f'CA for {name}' for name in names)
+        for name in names:
+            stored = FakeCoreV1Api.stores[f'https://{name}.eks.example.com']['data']
+            assert yaml.safe_load(stored['mapRoles']) == [NODE_ROLE]
+            assert yaml.safe_load(stored['mapUsers']) == [admin_user_mapping(USER_ARN)]
+
+    def test_single_replace_per_cluster(self):
+        seed('a', {})
+        apis = []
+        reconcile(['a'], apis, map_roles=[admin_role_mapping(ROLE_ARN)], map_users=[admin_user_mapping(USER_ARN)])
+        assert apis[0].replaces == 1
+
+    def test_retries_on_conflict(self):
+        seed('a', {})
+        apis = []
+        results = reconcile(['a'], apis, conflicts=2, map_users=[admin_user_mapping(USER_ARN)])
+        assert results['a']['outcome'] == 'updated'
+        assert results['a']['attempts'] == 3
+
+    def test_creates_missing_config_map_and_reports_unchanged(self):
+        apis = []
+        assert reconcile(['a'], apis, map_users=[admin_user_mapping(USER_ARN)])['a']['outcome'] == 'created'
+        assert reconcile(['a'], apis, map_users=[admin_user_mapping(USER_ARN)])['a']['outcome'] == 'unchanged'
@@ -0,0 +1,174 @@
+"""Parallel aws-auth ConfigMap reconciler.
+
+Each cluster gets its own Kubernetes ApiClient (nothing touches the global
+client.Configuration default) with the cluster CA kept in memory, so clusters
+can be reconciled concurrently. All role and user mappings for a cluster are
+merged into a single replace of aws-auth, and resourceVersion conflicts are
+retried from a fresh read.
+"""
+import base64
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+import tracing
+
+AWS_AUTH_NAME = 'aws-auth'
+AWS_AUTH_NAMESPACE = 'kube-system'
+
+
+def admin_user_mapping(user_arn, username='admin'):
+    return {'userarn': user_arn, 'username': username, 'groups': ['system:masters']}
+
+
+def admin_role_mapping(role_arn, username='admin'):
+    return {'rolearn': role_arn, 'username': username, 'groups': ['system:masters']}
+
+
+def _merge_section(raw, mappings, arn_key):
+    """Upsert mappings (by ARN) into a mapRoles/mapUsers YAML string."""
+    entries = yaml.safe_load(raw or '[]') or []
+    changed = False
+    for mapping in mappings:
+        index = next((i for i, entry in enumerate(entries) if entry.get(arn_key) == mapping[arn_key]), None)
+        if index is None:
+            entries.append(mapping)
+            changed = True
+        elif entries[index] != mapping:
+            entries[index] = mapping
+            changed = True
+    return yaml.safe_dump(entries, default_flow_style=False), changed
+
+
+def merge_mappings(data, map_roles=(), map_users=()):
+    """Return (new ConfigMap data, changed) with all mappings applied in one pass."""
+    data = dict(data or {})
+    changed = False
+    for key, mappings, arn_key in (('mapRoles', map_roles, 'rolearn'), ('mapUsers', map_users, 'userarn')):
+        if mappings:
+            data[key], section_changed = _merge_section(data.get(key), mappings, arn_key)
+            changed = changed or section_changed
+    return data, changed
+
+
+def _default_token_provider(cluster_name):
+    from eks_token_cache import get_eks_token
+
+    return get_eks_token(cluster_name)
+
+
+class ClusterConnection:
+    """An isolated ApiClient for one cluster. Use as a context manager."""
+
+    def __init__(self, cluster_name, endpoint, ca_data, token):
+        from kubernetes import client
+
+        self.cluster_name = cluster_name
+        self._ca_file = None
+        configuration = client.Configuration()
+        configuration.host = endpoint
+        configuration.verify_ssl = True
+        ca_pem = base64.b64decode(ca_data).decode('utf-8')
+        if hasattr(configuration, 'ca_cert_data'):
+            configuration.ca_cert_data = ca_pem
+        else:
+            # Older kubernetes clients only accept a CA file; give each cluster its own
+            fd, self._ca_file = tempfile.mkstemp(prefix=f'eks-{cluster_name}-', suffix='.pem')
+            with os.fdopen(fd, 'w') as f:
+                f.write(ca_pem)
+            configuration.ssl_ca_cert = self._ca_file
+        configuration.api_key = {'authorization': f'Bearer {token}'}
+        self.api_client = client.ApiClient(configuration)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.api_client.close()
+        if self._ca_file and os.path.exists(self._ca_file):
+            os.remove(self._ca_file)
+
+
+def _default_core_api_factory(api_client):
+    from kubernetes import client
+
+    return client.CoreV1Api(api_client)
+
+
+def reconcile_cluster(cluster_name, map_roles=(), map_users=(), eks_client=None, token_provider=None,
+                      core_api_factory=None, max_conflict_retries=5):
+    """Apply the mappings to one cluster's aws-auth ConfigMap and return a result dict."""
+    from kubernetes import client
+    from kubernetes.client.exceptions import ApiException
+
+    token_provider = token_provider or _default_token_provider
+    core_api_factory = core_api_factory or _default_core_api_factory
+    started = time.monotonic()
+    result = {'cluster': cluster_name, 'outcome': None, 'attempts': 0, 'error': None}
+
+    with tracing.span('aws.eks.describe_cluster', cluster=cluster_name):
+        cluster = eks_client.describe_cluster(name=cluster_name)['cluster']
+    with ClusterConnection(cluster_name, cluster['endpoint'], cluster['certificateAuthority']['data'],
+                           token_provider(cluster_name)) as connection:
+        v1 = core_api_factory(connection.api_client)
+        while result['outcome'] is None:
+            result['attempts'] += 1
+            try:
+                config_map = v1.read_namespaced_config_map(AWS_AUTH_NAME, AWS_AUTH_NAMESPACE)
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+                data, _ = merge_mappings({}, map_roles, map_users)
+                v1.create_namespaced_config_map(AWS_AUTH_NAMESPACE, client.V1ConfigMap(
+                    metadata=client.V1ObjectMeta(name=AWS_AUTH_NAME, namespace=AWS_AUTH_NAMESPACE), data=data))
+                result['outcome'] = 'created'
+                continue
+
+            data, changed = merge_mappings(config_map.data, map_roles, map_users)
+            if not changed:
+                result['outcome'] = 'unchanged'
+                continue
+            # config_map keeps the resourceVersion from the read, so a concurrent
+            # writer makes this replace fail with 409 instead of being overwritten
+            config_map.data = data
+            try:
+                v1.replace_namespaced_config_map(AWS_AUTH_NAME, AWS_AUTH_NAMESPACE, config_map)
+                result['outcome'] = 'updated'
+            except ApiException as e:
+                if e.status != 409 or result['attempts'] > max_conflict_retries:
+                    raise
+                logging.info(f"aws-auth on {cluster_name} changed underneath us, retrying")
+
+    result['elapsed_s'] = round(time.monotonic() - started, 3)
+    return result
+
+
+def reconcile_clusters(cluster_names, map_roles=(), map_users=(), max_workers=8, eks_client=None,
+                       token_provider=None, core_api_factory=None):
+    """Reconcile aws-auth on every cluster with a bounded worker pool.
+
+    Returns {cluster_name: result}. Failures are reported per cluster with
+    outcome 'error' rather than aborting the other clusters.
+    """
+    cluster_names = list(cluster_names)
+    if eks_client is None:
+        import boto3
+
+        eks_client = boto3.client('eks')
+
+    def run(cluster_name):
+        try:
+            return reconcile_cluster(cluster_name, map_roles, map_users, eks_client, token_provider, core_api_factory)
+        except Exception as e:
+            logging.error(f"Exception when updating aws-auth ConfigMap for cluster {cluster_name}: {e}")
+            return {'cluster': cluster_name, 'outcome': 'error', 'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(cluster_names)))) as pool:
+        return {result['cluster']: result for result in pool.map(run, cluster_names)}
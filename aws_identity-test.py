@@ -0,0 +1,58 @@
+import boto3
+from botocore.stub import Stubber
+
+from aws_identity import CallerIdentityProvider
+
+IDENTITY = {
+    'Account': '123456789012',
+    'Arn': 'arn:aws:iam::123456789012:user/fullstackappuser',
+    'UserId': 'AIDAEXAMPLE',
+}
+
+
+class StubbedSts:
+    """A client factory handing out botocore-stubbed STS clients."""
+
+    def __init__(self, responses=1):
+        self.client = boto3.client('sts', region_name='us-east-1',
+                                   aws_access_key_id='testing', aws_secret_access_key='testing')
+        self.stubber = Stubber(self.client)
+        for _ in range(responses):
+            self.stubber.add_response('get_caller_identity', IDENTITY, {})
+        self.stubber.activate()
+
+    def __call__(self, profile):
+        return self.client
+
+
+class TestCallerIdentityProvider:
+
+    def test_memoizes_in_process(self, tmp_path):
+        sts = StubbedSts()
+        provider = CallerIdentityProvider(cache_dir=str(tmp_path), client_factory=sts)
+        assert provider.account_id() == '123456789012'
+        assert provider.arn() == IDENTITY['Arn']
+        sts.stubber.assert_no_pending_responses()
+
+    def test_warm_disk_cache_makes_no_sts_calls(self, tmp_path):
+        CallerIdentityProvider(cache_dir=str(tmp_path), client_factory=StubbedSts()).get()
+
+        sts = StubbedSts(responses=0)
+        provider = CallerIdentityProvider(cache_dir=str(tmp_path), client_factory=sts)
+        assert provider.account_id() == '123456789012'
+
+    def test_expired_entry_is_refetched(self, tmp_path):
+        CallerIdentityProvider(cache_dir=str(tmp_path), client_factory=StubbedSts()).get()
+
+        sts = StubbedSts()
+        provider = CallerIdentityProvider(cache_dir=str(tmp_path), ttl=0, client_factory=sts)
+        provider.get()
+        sts.stubber.assert_no_pending_responses()
+
+    def test_cache_is_keyed_by_profile(self, tmp_path, monkeypatch):
+        monkeypatch.delenv('AWS_ACCESS_KEY_ID', raising=False)
+        dev = CallerIdentityProvider(profile='dev', cache_dir=str(tmp_path), client_factory=StubbedSts())
+        prod = CallerIdentityProvider(profile='prod', cache_dir=str(tmp_path), client_factory=StubbedSts())
+        assert dev.cache_file != prod.cache_file
+        dev.get()
+        assert prod._read_disk() is None
@@ -0,0 +1,117 @@
+"""Shared STS caller identity.
+
+GetCallerIdentity is memoized in-process and persisted to a small JSON file
+per credential profile, so repeated synths and post-deploy helpers make no
+STS calls until the cached identity is older than the TTL.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import tracing
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'srefromnoobtoninja')
+DEFAULT_TTL = 3600  # seconds
+
+
+def _default_client_factory(profile):
+    import boto3
+
+    session = boto3.Session(profile_name=profile) if profile else boto3.Session()
+    return session.client('sts')
+
+
+class CallerIdentityProvider:
+    """Returns the STS caller identity, fetching it at most once per TTL."""
+
+    def __init__(self, profile=None, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, client_factory=None):
+        self.profile = profile
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.client_factory = client_factory or _default_client_factory
+        self._identity = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_file(self):
+        """One file per profile; static keys from the environment get their own file."""
+        name = self.profile or os.getenv('AWS_PROFILE') or 'default'
+        access_key = os.getenv('AWS_ACCESS_KEY_ID')
+        if access_key:
+            name += '-' + hashlib.sha256(access_key.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"sts-identity-{name}.json")
+
+    def _fresh(self, identity):
+        return identity is not None and time.time() - identity['fetched_at'] < self.ttl
+
+    def _read_disk(self):
+        try:
+            with open(self.cache_file) as f:
+                identity = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return identity if self._fresh(identity) else None
+
+    def _write_disk(self, identity):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.sts-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(identity, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            # The disk cache is an optimization only
+            logging.warning(f"Could not write STS identity cache {self.cache_file}: {e}")
+
+    def get(self):
+        """Return {'Account', 'Arn', 'UserId', 'fetched_at'} for the current credentials."""
+        with self._lock:
+            if self._fresh(self._identity):
+                return self._identity
+            identity = self._read_disk()
+            if identity is None:
+                with tracing.span('aws.sts.get_caller_identity', profile=self.profile):
+                    response = self.client_factory(self.profile).get_caller_identity()
+                identity = {
+                    'Account': response['Account'],
+                    'Arn': response['Arn'],
+                    'UserId': response['UserId'],
+                    'fetched_at': time.time(),
+                }
+                self._write_disk(identity)
+            self._identity = identity
+            return identity
+
+    def invalidate(self):
+        """Forget the cached identity, e.g. after switching credentials."""
+        with self._lock:
+            self._identity = None
+            if os.path.exists(self.cache_file):
+                os.remove(self.cache_file)
+
+    def account_id(self):
+        return self.get()['Account']
+
+    def arn(self):
+        return self.get()['Arn']
+
+
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+
+def default_provider():
+    """The process-wide provider shared by main.py, mainWithoutConstructs.py and postinit.py."""
+    global _default_provider
+    with _default_provider_lock:
+        if _default_provider is None:
+            _default_provider = CallerIdentityProvider(ttl=int(os.getenv('STS_IDENTITY_TTL', DEFAULT_TTL)))
+        return _default_provider
+
+
+def get_caller_identity():
+    return default_provider().get()
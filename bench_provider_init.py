@@ -0,0 +1,99 @@
+"""Cold versus warm `terraform init` benchmark for provider_mirror.py.
+
+Copies a synthesized stack's cdk.tf.json into a fresh directory for every run
+and times `terraform init -backend=false` three ways:
+
+  cold    registry downloads, no plugin cache (a fresh CI workspace today);
+  mirror  the mirror's CLI config with an empty plugin cache (first init on a
+          runner that restored the mirror);
+  warm    the mirror's CLI config and a populated plugin cache.
+
+    pipenv run python main.py && pipenv run python provider_mirror.py build
+    pipenv run python bench_provider_init.py --runs 3 --offline
+
+--offline routes the mirror and warm runs through an unreachable proxy, so
+they fail if init still needs the network for anything.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import provider_mirror
+from deploy import load_stack_graph
+from process_runner import run_streamed
+
+UNREACHABLE_PROXY = 'http://127.0.0.1:9'
+
+
+def init_once(stack_file, env, directory):
+    """Seconds one terraform init of stack_file takes in a fresh directory under directory."""
+    workdir = tempfile.mkdtemp(dir=directory)
+    shutil.copy(stack_file, os.path.join(workdir, 'cdk.tf.json'))
+    started = time.perf_counter()
+    result = run_streamed(['terraform', 'init', '-input=false', '-backend=false'], prefix='init', cwd=workdir,
+                          env=env, on_line=lambda prefix, stream, line: None)
+    seconds = time.perf_counter() - started
+    if result['returncode'] != 0:
+        raise provider_mirror.MirrorError(f"terraform init failed: {' '.join(result['stderr'][-5:])}")
+    return seconds
+
+
+def bench(stack_file, runs, cache_dir=provider_mirror.DEFAULT_CACHE_DIR, offline=False):
+    paths = provider_mirror.mirror_paths(cache_dir)
+    if not os.path.exists(paths['cli_config']):
+        raise provider_mirror.MirrorError(f"{paths['cli_config']} is missing, run `provider_mirror.py build` first")
+    base = {name: value for name, value in os.environ.items()
+            if name not in ('TF_CLI_CONFIG_FILE', 'TF_PLUGIN_CACHE_DIR')}
+    base['TF_IN_AUTOMATION'] = '1'
+    results = {'cold': [], 'mirror': [], 'warm': []}
+    with tempfile.TemporaryDirectory() as directory:
+        # An empty CLI config keeps ~/.terraformrc (and any cache it sets) out of the cold runs
+        empty_config = os.path.join(directory, 'empty.tfrc')
+        open(empty_config, 'w').close()
+        cold_env = dict(base, TF_CLI_CONFIG_FILE=empty_config)
+        warm_env = dict(base, **provider_mirror.environment(cache_dir))
+        if offline:
+            warm_env.update(HTTPS_PROXY=UNREACHABLE_PROXY, HTTP_PROXY=UNREACHABLE_PROXY)
+
+        for _ in range(runs):
+            results['cold'].append(init_once(stack_file, cold_env, directory))
+            # Same config, but the plugin cache starts out empty
+            scratch_cache = tempfile.mkdtemp(dir=directory)
+            results['mirror'].append(init_once(stack_file, dict(warm_env, TF_PLUGIN_CACHE_DIR=scratch_cache),
+                                               directory))
+        init_once(stack_file, warm_env, directory)  # fills the shared plugin cache
+        for _ in range(runs):
+            results['warm'].append(init_once(stack_file, warm_env, directory))
+    return {mode: {'min': min(values), 'median': statistics.median(values), 'max': max(values)}
+            for mode, values in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--outdir', default=os.getenv('CDKTF_OUTDIR', 'cdktf.out'))
+    parser.add_argument('--stack', help='stack to initialize (default: the first one in the manifest)')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--cache-dir', default=provider_mirror.DEFAULT_CACHE_DIR)
+    parser.add_argument('--offline', action='store_true', help='fail the mirror and warm runs if they use the network')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    graph = load_stack_graph(args.outdir)
+    name = args.stack or next(iter(graph))
+    stack_file = os.path.join(graph[name]['working_directory'], 'cdk.tf.json')
+    summary = bench(stack_file, args.runs, args.cache_dir, args.offline)
+
+    for mode, timings in summary.items():
+        print(f"{mode:<7} median {timings['median']:7.2f}s  min {timings['min']:7.2f}s  max {timings['max']:7.2f}s")
+    print(f"warm init is {summary['cold']['median'] / summary['warm']['median']:.1f}x faster than cold")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'stack': name, 'runs': args.runs, 'offline': args.offline, 'summary': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
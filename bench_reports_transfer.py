@@ -0,0 +1,109 @@
+"""Throughput benchmark for reports_transfer.py.
+
+Writes a random file of --size-mb, then times a single put_object/get_object
+(how report jobs moved files so far) and parallel multipart transfers at
+every --concurrency level, reporting MiB/s for each.
+
+    pipenv run python bench_reports_transfer.py --size-mb 1024 --concurrency 1 4 8 16
+    pipenv run python bench_reports_transfer.py --endpoint-url http://localhost:9000 --bucket reports
+    pipenv run python bench_reports_transfer.py --moto --size-mb 64
+
+--moto runs against an in-process moto S3, which checks the code paths but
+measures moto rather than the network; use a real bucket or MinIO for numbers.
+"""
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import time
+
+import reports_transfer
+from reports_transfer import MIB
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_PREFIX = 'bench-reports-transfer'
+
+
+def write_random_file(path, size):
+    with open(path, 'wb') as f:
+        for offset in range(0, size, 16 * MIB):
+            f.write(os.urandom(min(16 * MIB, size - offset)))
+
+
+def mib_per_s(size, seconds):
+    return size / MIB / seconds if seconds else None
+
+
+def bench_single_request(client, bucket, path, size, directory):
+    key = f"{BENCH_PREFIX}/single"
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        client.put_object(Bucket=bucket, Key=key, Body=f)
+    upload_s = time.perf_counter() - started
+    started = time.perf_counter()
+    client.download_file(bucket, key, os.path.join(directory, 'single.out'))
+    download_s = time.perf_counter() - started
+    client.delete_object(Bucket=bucket, Key=key)
+    return {'mode': 'single', 'concurrency': 1, 'upload_s': upload_s, 'download_s': download_s,
+            'upload_mib_s': mib_per_s(size, upload_s), 'download_mib_s': mib_per_s(size, download_s)}
+
+
+def bench_parallel(client, bucket, path, size, directory, part_size, concurrency):
+    key = f"{BENCH_PREFIX}/parallel-{concurrency}"
+    uploaded = reports_transfer.upload(path, bucket, key, part_size, concurrency, client)
+    downloaded = reports_transfer.download(bucket, key, os.path.join(directory, 'parallel.out'), part_size,
+                                           concurrency, client)
+    client.delete_object(Bucket=bucket, Key=key)
+    return {'mode': 'parallel', 'concurrency': concurrency, 'parts': uploaded['parts'],
+            'upload_s': uploaded['seconds'], 'download_s': downloaded['seconds'],
+            'upload_mib_s': mib_per_s(size, uploaded['seconds']),
+            'download_mib_s': mib_per_s(size, downloaded['seconds'])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--part-size-mb', type=int, default=reports_transfer.DEFAULT_PART_SIZE // MIB)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--config', default=os.path.join(PROJECT_DIR, 'config.json'))
+    parser.add_argument('--bucket', help='defaults to s3_bucket.name from the config')
+    parser.add_argument('--endpoint-url', help='a local S3 stand-in such as MinIO')
+    parser.add_argument('--moto', action='store_true', help='run against an in-process moto S3')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    bucket = args.bucket or reports_transfer.bucket_name(config)
+    size = args.size_mb * MIB
+    part_size = args.part_size_mb * MIB
+
+    with contextlib.ExitStack() as stack:
+        if args.moto:
+            from moto import mock_aws
+
+            os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+            os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+            stack.enter_context(mock_aws())
+        client = reports_transfer._default_client_factory(config.get('region'), args.endpoint_url)
+        if args.moto:
+            client.create_bucket(Bucket=bucket)
+
+        directory = stack.enter_context(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, 'report.bin')
+        write_random_file(path, size)
+        runs = [bench_single_request(client, bucket, path, size, directory)]
+        runs += [bench_parallel(client, bucket, path, size, directory, part_size, concurrency)
+                 for concurrency in args.concurrency]
+
+    for run in runs:
+        print(f"{run['mode']:<8} x{run['concurrency']:<3} upload {run['upload_mib_s']:8.1f} MiB/s  "
+              f"download {run['download_mib_s']:8.1f} MiB/s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'size_bytes': size, 'part_size_bytes': part_size, 'runs': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Startup benchmark for main.py.
+
+Each run starts a fresh interpreter (so jsii/node startup is included, just
+like `cdktf synth`) and reports how long `import main` and a full synth of
+MyStack take. Synth makes no AWS calls, so no credentials are needed.
+
+    python bench_startup.py --runs 5 --output bench_startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = '''
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+from cdktf import App
+from dotenv import load_dotenv
+load_dotenv()
+app = App(outdir=sys.argv[2])
+main.MyStack(app, "cdktf-eks-cluster", main.load_config(sys.argv[1]))
+app.synth()
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "synth_s": t2 - t1}))
+'''
+
+
+def run_once(config_path):
+    with tempfile.TemporaryDirectory() as outdir:
+        env = dict(os.environ, JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1")
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", CHILD, config_path, outdir],
+                                cwd=PROJECT_DIR, env=env, check=True, capture_output=True, text=True)
+        total = time.perf_counter() - started
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["total_s"] = total
+    return timings
+
+
+def summarize(runs):
+    summary = {}
+    for key in ("import_s", "synth_s", "total_s"):
+        values = [run[key] for run in runs]
+        summary[key] = {"min": min(values), "median": statistics.median(values), "max": max(values)}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--config", default=os.path.join(PROJECT_DIR, "config.json"))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    runs = [run_once(args.config) for _ in range(args.runs)]
+    results = {"runs": runs, "summary": summarize(runs)}
+
+    for key, stats in results["summary"].items():
+        print(f"{key:<9} min {stats['min']:.3f}s  median {stats['median']:.3f}s  max {stats['max']:.3f}s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Synth scaling benchmark.
+
+Generates config.json fleets with 1, 10, 100 and 500 eks_clusters entries and
+synthesizes MyStack for each through cdktf.Testing.synth in a fresh process
+(synth makes no AWS calls). Records wall time (construct and synth, after a
+warm-up stack has imported the providers), peak RSS (Python plus the jsii
+node runtime) and output JSON size per fleet size, and optionally fails when
+a result regressed against a baseline.
+
+    python bench_synth.py --output bench_synth.json
+    python bench_synth.py --baseline bench_synth.json --threshold 0.25
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [1, 10, 100, 500]
+# Metrics compared against the baseline; output size should only change with the code
+CHECKED_METRICS = ['total_s', 'peak_rss_kb', 'output_bytes']
+# Timings below this many seconds of growth are scheduler noise, not regressions
+NOISE_FLOOR_S = 0.25
+
+CHILD = '''
+import json, os, resource, sys, time
+import main
+from cdktf import Testing
+
+def peak_rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        return 0
+
+def child_pids():
+    pids = []
+    for task in os.listdir("/proc/self/task"):
+        try:
+            with open(f"/proc/self/task/{task}/children") as f:
+                pids += [int(pid) for pid in f.read().split()]
+        except OSError:
+            pass
+    return pids
+
+config = main.load_config(sys.argv[1])
+# The provider modules are imported lazily by the first stack; keep that out of the timings
+warmup_started = time.perf_counter()
+main.MyStack(Testing.app(), "warmup", dict(config, eks_clusters=config["eks_clusters"][:1]))
+started = time.perf_counter()
+stack = main.MyStack(Testing.app(), "cdktf-eks-cluster", config)
+built = time.perf_counter()
+synthesized = Testing.synth(stack)
+finished = time.perf_counter()
+
+python_rss = peak_rss_kb("self") or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "warmup_s": started - warmup_started,
+    "construct_s": built - started,
+    "synth_s": finished - built,
+    "total_s": finished - started,
+    "peak_rss_kb": python_rss + sum(peak_rss_kb(pid) for pid in child_pids()),
+    "output_bytes": len(synthesized.encode()),
+}))
+'''
+
+
+def generate_config(cluster_count, base_config):
+    """A copy of base_config with cluster_count eks_clusters entries, no deployment matrix and no load balancers."""
+    config = json.loads(json.dumps(base_config))
+    config.pop('deployments', None)
+    # Load balancer rules name services of the real clusters, which the generated fleet replaces
+    config.pop('load_balancers', None)
+    config['eks_clusters'] = [
+        {'name': f"bench-cluster-{index:03d}", 'alias': f"bench{index:03d}"}
+        for index in range(cluster_count)
+    ]
+    return config
+
+
+def run_size(cluster_count, base_config):
+    with tempfile.TemporaryDirectory() as workdir:
+        config_path = os.path.join(workdir, 'config.json')
+        with open(config_path, 'w') as f:
+            json.dump(generate_config(cluster_count, base_config), f)
+        env = dict(os.environ, JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION='1', RDS_PASSWORD='benchmark')
+        result = subprocess.run([sys.executable, '-c', CHILD, config_path], cwd=PROJECT_DIR, env=env,
+                                check=True, capture_output=True, text=True)
+    metrics = json.loads(result.stdout.strip().splitlines()[-1])
+    metrics['clusters'] = cluster_count
+    return metrics
+
+
+def find_regressions(results, baseline, threshold):
+    """Metrics that grew by more than threshold (a fraction) compared to the baseline run."""
+    previous = {entry['clusters']: entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        before = previous.get(entry['clusters'])
+        if not before:
+            continue
+        for metric in CHECKED_METRICS:
+            if not before.get(metric) or entry[metric] <= before[metric] * (1 + threshold):
+                continue
+            if metric.endswith('_s') and entry[metric] - before[metric] < NOISE_FLOOR_S:
+                continue
+            regressions.append(f"{entry['clusters']} clusters: {metric} {before[metric]:.6g} -> {entry[metric]:.6g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated cluster counts (default: 1,10,100,500)')
+    parser.add_argument('--config', default=os.path.join(PROJECT_DIR, 'config.json'),
+                        help='config.json the generated fleets are based on')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='results file from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed relative growth per metric before failing (default: 0.25)')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        base_config = json.load(f)
+
+    results = []
+    print(f"{'clusters':>8}  {'total':>9}  {'construct':>9}  {'synth':>9}  {'peak RSS':>10}  {'output':>12}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        entry = run_size(size, base_config)
+        results.append(entry)
+        print(f"{size:>8}  {entry['total_s']:>8.2f}s  {entry['construct_s']:>8.2f}s  {entry['synth_s']:>8.2f}s  "
+              f"{entry['peak_rss_kb'] / 1024:>7.0f} MB  {entry['output_bytes']:>10} B")
+
+    report = {'python': sys.version.split()[0], 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
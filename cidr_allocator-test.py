@@ -0,0 +1,46 @@
+import ipaddress
+import itertools
+
+import pytest
+
+from cidr_allocator import AllocationError, allocate_subnets, find_overlaps
+
+ZONES = ['us-east-1a', 'us-east-1b', 'us-east-1c']
+
+
+class TestAllocateSubnets:
+
+    def test_every_tier_gets_one_subnet_per_zone(self):
+        subnets = allocate_subnets('10.0.0.0/16', ZONES, {'public': 24, 'private': 19, 'data': 24})
+        assert [(subnet['tier'], subnet['zone']) for subnet in subnets] == \
+            [(tier, zone) for tier in ['public', 'private', 'data'] for zone in ZONES]
+        assert [subnet['cidr'] for subnet in subnets if subnet['tier'] == 'private'] == \
+            ['10.0.0.0/19', '10.0.32.0/19', '10.0.64.0/19']
+        assert subnets[0] == {'tier': 'public', 'zone': 'us-east-1a', 'index': 0, 'cidr': '10.0.96.0/24'}
+
+    @pytest.mark.parametrize('vpc_cidr', ['10.0.0.0/16', '172.16.0.0/12', '10.20.0.0/18'])
+    @pytest.mark.parametrize('zone_count', [1, 2, 3, 4, 6])
+    def test_allocations_never_overlap_and_stay_in_the_vpc(self, vpc_cidr, zone_count):
+        vpc = ipaddress.ip_network(vpc_cidr)
+        for sizes in itertools.product([vpc.prefixlen + 4, vpc.prefixlen + 6, 28], repeat=3):
+            tiers = dict(zip(['public', 'private', 'data'], sizes))
+            try:
+                subnets = allocate_subnets(vpc_cidr, [f'zone-{index}' for index in range(zone_count)], tiers)
+            except AllocationError:
+                continue
+            cidrs = [subnet['cidr'] for subnet in subnets]
+            assert find_overlaps(cidrs) == []
+            assert all(ipaddress.ip_network(cidr).subnet_of(vpc) for cidr in cidrs)
+            for a, b in itertools.combinations(cidrs, 2):
+                assert not ipaddress.ip_network(a).overlaps(ipaddress.ip_network(b))
+
+    def test_rejects_tiers_that_do_not_fit(self):
+        with pytest.raises(AllocationError):
+            allocate_subnets('10.0.0.0/16', ZONES, {'private': 17})
+        with pytest.raises(AllocationError):
+            allocate_subnets('10.0.0.0/16', ZONES, {'public': 15})
+
+
+def test_find_overlaps():
+    assert find_overlaps(['10.0.0.0/24', '10.0.1.0/24']) == []
+    assert find_overlaps(['10.0.0.0/16', '10.1.0.0/16', '10.0.5.0/24']) == [('10.0.0.0/16', '10.0.5.0/24')]
@@ -0,0 +1,48 @@
+"""Carve a VPC CIDR into per-AZ subnets for each tier.
+
+    allocate_subnets('10.0.0.0/16', ['us-east-1a', 'us-east-1b', 'us-east-1c'],
+                     {'public': 24, 'private': 19, 'data': 24})
+
+returns one {'tier', 'zone', 'index', 'cidr'} dict per tier and zone, in tier
+then zone order. Blocks are handed out largest first from the start of the
+VPC range, so every block is aligned to its own size and none overlap. The
+result only depends on the arguments; adding a zone or a tier moves the
+blocks that follow it, which replaces those subnets.
+"""
+import ipaddress
+
+
+class AllocationError(ValueError):
+    pass
+
+
+def allocate_subnets(vpc_cidr, zones, tiers):
+    """Return the subnets for every tier in every zone, see the module docstring."""
+    vpc = ipaddress.ip_network(vpc_cidr)
+    requests = []
+    for tier_index, (tier, prefix_length) in enumerate(tiers.items()):
+        if not vpc.prefixlen <= prefix_length <= vpc.max_prefixlen:
+            raise AllocationError(f"Tier {tier}: /{prefix_length} does not fit in {vpc}")
+        for zone_index, zone in enumerate(zones):
+            requests.append((prefix_length, tier_index, zone_index, tier, zone))
+
+    allocations = []
+    cursor = int(vpc.network_address)
+    end = int(vpc.broadcast_address) + 1
+    # Largest blocks first: each block then starts on a multiple of its own size
+    for prefix_length, tier_index, zone_index, tier, zone in sorted(requests, key=lambda request: request[:3]):
+        size = 2 ** (vpc.max_prefixlen - prefix_length)
+        cursor = -(-cursor // size) * size
+        if cursor + size > end:
+            raise AllocationError(f"{vpc} is too small for {len(zones)} zones of {dict(tiers)}")
+        network = ipaddress.ip_network((cursor, prefix_length))
+        allocations.append((tier_index, zone_index, {'tier': tier, 'zone': zone, 'index': zone_index,
+                                                     'cidr': str(network)}))
+        cursor += size
+    return [allocation for _, _, allocation in sorted(allocations, key=lambda entry: entry[:2])]
+
+
+def find_overlaps(cidrs):
+    """Overlapping neighbours once the CIDRs are sorted by start address; empty when none overlap."""
+    networks = sorted((ipaddress.ip_network(cidr) for cidr in cidrs), key=lambda network: int(network.network_address))
+    return [(str(a), str(b)) for a, b in zip(networks, networks[1:]) if a.overlaps(b)]
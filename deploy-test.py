@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+
+import pytest
+
+from deploy import load_stack_graph, plugin_cache_in_use, run_in_dependency_order, run_stack, select_stacks
+
+GRAPH = {
+    'network': {'dependencies': []},
+    'iam': {'dependencies': []},
+    'data': {'dependencies': ['network']},
+    'cluster-a': {'dependencies': ['network', 'iam']},
+    'cluster-b': {'dependencies': ['network', 'iam']},
+}
+
+
+class Recorder:
+
+    def __init__(self, failing=(), delay=0.1, overlapping=()):
+        self.failing = set(failing)
+        self.delay = delay
+        self.events = []
+        self.lock = threading.Lock()
+        # Every group of stack names that must run at the same time shares a barrier
+        self.barriers = {}
+        for group in overlapping:
+            barrier = threading.Barrier(len(group))
+            self.barriers.update({name: barrier for name in group})
+
+    def __call__(self, name, stack):
+        with self.lock:
+            self.events.append(('start', name))
+        if name in self.barriers:
+            # Raises BrokenBarrierError unless the rest of the group is running too
+            self.barriers[name].wait(timeout=10)
+        time.sleep(self.delay)
+        with self.lock:
+            self.events.append(('end', name))
+        return {'returncode': 1 if name in self.failing else 0, 'duration_s': self.delay}
+
+
+class TestRunInDependencyOrder:
+
+    def test_dependencies_finish_before_dependents_start(self):
+        recorder = Recorder()
+        results = run_in_dependency_order(GRAPH, recorder, parallelism=4)
+        assert {result['returncode'] for result in results.values()} == {0}
+        position = {event: index for index, event in enumerate(recorder.events)}
+        for name, stack in GRAPH.items():
+            for dep in stack['dependencies']:
+                assert position[('end', dep)] < position[('start', name)]
+
+    def test_independent_stacks_run_concurrently(self):
+        # Two waves instead of five serial runs
+        recorder = Recorder(delay=0, overlapping=[['network', 'iam'], ['data', 'cluster-a', 'cluster-b']])
+        results = run_in_dependency_order(GRAPH, recorder, parallelism=4)
+        assert {result['returncode'] for result in results.values()} == {0}
+
+    def test_failure_skips_only_dependents(self):
+        results = run_in_dependency_order(GRAPH, Recorder(failing=['iam']), parallelism=4)
+        assert results['iam']['returncode'] == 1
+        assert results['cluster-a'] == {'skipped': True, 'returncode': None}
+        assert results['data']['returncode'] == 0
+
+    def test_cycle_is_reported(self):
+        with pytest.raises(ValueError):
+            run_in_dependency_order({'a': {'dependencies': ['b']}, 'b': {'dependencies': ['a']}}, Recorder())
+
+
+class ConcurrencyRecorder:
+    """Stands in for run_streamed and records the most commands of each kind running at once."""
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.running = {}
+        self.peak = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, argv, prefix=None, timeout=None, cwd=None):
+        command = argv[1]
+        with self.lock:
+            self.running[command] = self.running.get(command, 0) + 1
+            self.peak[command] = max(self.peak.get(command, 0), self.running[command])
+        time.sleep(self.delay)
+        with self.lock:
+            self.running[command] -= 1
+        return {'returncode': 0}
+
+
+class TestRunStack:
+
+    def run_concurrently(self, count):
+        recorder = ConcurrencyRecorder()
+        threads = [threading.Thread(target=run_stack, args=(f"stack-{index}", {'working_directory': '.'}, 'plan'),
+                                    kwargs={'run': recorder}) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return recorder.peak
+
+    def test_init_is_serialized_with_a_plugin_cache(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('TF_PLUGIN_CACHE_DIR', str(tmp_path))
+        peak = self.run_concurrently(3)
+        assert peak['init'] == 1
+        assert peak['plan'] > 1
+
+    def test_init_runs_concurrently_without_a_plugin_cache(self, monkeypatch, tmp_path):
+        monkeypatch.delenv('TF_PLUGIN_CACHE_DIR', raising=False)
+        monkeypatch.setenv('TF_CLI_CONFIG_FILE', str(tmp_path / 'missing.tfrc'))
+        assert self.run_concurrently(3)['init'] == 3
+
+    def test_plugin_cache_in_use(self, tmp_path):
+        config = tmp_path / 'terraformrc'
+        config.write_text('disable_checkpoint = true\n')
+        assert not plugin_cache_in_use({'TF_CLI_CONFIG_FILE': str(config)})
+        config.write_text('plugin_cache_dir   = "/cache/plugin-cache"\ndisable_checkpoint = true\n')
+        assert plugin_cache_in_use({'TF_CLI_CONFIG_FILE': str(config)})
+        assert plugin_cache_in_use({'TF_PLUGIN_CACHE_DIR': '/cache/plugin-cache'})
+
+
+def test_select_stacks_and_manifest(tmp_path):
+    (tmp_path / 'manifest.json').write_text(json.dumps({'stacks': {
+        name: {'dependencies': stack['dependencies'], 'workingDirectory': f'stacks/{name}'}
+        for name, stack in GRAPH.items()
+    }}))
+    graph = load_stack_graph(str(tmp_path))
+    assert graph['data']['working_directory'] == str(tmp_path / 'stacks' / 'data')
+    assert sorted(select_stacks(graph, ['cluster-a'])) == ['cluster-a', 'iam', 'network']
@@ -0,0 +1,148 @@
+"""Plan or apply the synthesized stacks concurrently, in dependency order.
+
+Reads the stack dependencies from cdktf.out/manifest.json and runs terraform
+directly in each stack's working directory. A stack starts as soon as every
+stack it depends on has succeeded, so independent stacks (IAM next to the
+network, the data stack next to the cluster stacks) run in parallel. When a
+stack fails, only its dependents are skipped. When terraform uses a plugin
+cache (provider_mirror.py sets one up), `terraform init` runs one stack at a
+time: concurrent installs into a shared cache are not safe, and inits served
+from the mirror take seconds anyway.
+
+    pipenv run python main.py && pipenv run python deploy.py apply --parallelism 4
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from process_runner import run_streamed
+import tracing
+
+TERRAFORM_COMMANDS = {
+    'plan': [['terraform', 'init', '-input=false'], ['terraform', 'plan', '-input=false']],
+    'apply': [['terraform', 'init', '-input=false'], ['terraform', 'apply', '-input=false', '-auto-approve']],
+}
+
+_init_lock = threading.Lock()
+
+
+def plugin_cache_in_use(env=None):
+    """Whether terraform init would install into a plugin cache, from TF_PLUGIN_CACHE_DIR or the CLI config."""
+    env = os.environ if env is None else env
+    if env.get('TF_PLUGIN_CACHE_DIR'):
+        return True
+    path = env.get('TF_CLI_CONFIG_FILE') or os.path.join(os.path.expanduser('~'), '.terraformrc')
+    try:
+        with open(path) as f:
+            return re.search(r'^\s*plugin_cache_dir\s*=', f.read(), re.MULTILINE) is not None
+    except OSError:
+        return False
+
+
+def load_stack_graph(outdir):
+    """Return {stack_name: {'dependencies': [...], 'working_directory': path}} from manifest.json."""
+    with open(os.path.join(outdir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    return {
+        name: {
+            'dependencies': list(stack.get('dependencies', [])),
+            'working_directory': os.path.join(outdir, stack['workingDirectory']),
+        }
+        for name, stack in manifest['stacks'].items()
+    }
+
+
+def select_stacks(graph, names):
+    """The requested stacks plus everything they depend on."""
+    selected = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in graph:
+            raise KeyError(f"Unknown stack {name}")
+        if name not in selected:
+            selected.add(name)
+            pending.extend(graph[name]['dependencies'])
+    return {name: graph[name] for name in graph if name in selected}
+
+
+def run_stack(name, stack, action, timeout=None, run=run_streamed):
+    """Run terraform init and plan/apply for one stack and return the last command's result."""
+    result = None
+    for argv in TERRAFORM_COMMANDS[action]:
+        if argv[1] == 'init' and plugin_cache_in_use():
+            with _init_lock:
+                result = run(argv, prefix=name, timeout=timeout, cwd=stack['working_directory'])
+        else:
+            result = run(argv, prefix=name, timeout=timeout, cwd=stack['working_directory'])
+        if result['returncode'] != 0:
+            break
+    return result
+
+
+def run_in_dependency_order(graph, run, parallelism=4):
+    """Call run(name, stack) for every stack once its dependencies succeeded.
+
+    Returns {stack_name: result}; stacks whose dependencies failed get
+    {'skipped': True}. A result counts as success when its returncode is 0.
+    """
+    for name, stack in graph.items():
+        missing = set(stack['dependencies']) - set(graph)
+        if missing:
+            raise KeyError(f"Stack {name} depends on unknown stacks {sorted(missing)}")
+
+    results = {}
+    waiting = dict(graph)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as pool:
+        while waiting or running:
+            for name, stack in list(waiting.items()):
+                dependencies = stack['dependencies']
+                if any(dep in results and results[dep].get('returncode') != 0 for dep in dependencies):
+                    logging.error(f"Skipping {name}: a dependency failed")
+                    results[name] = {'skipped': True, 'returncode': None}
+                    del waiting[name]
+                elif all(dep in results for dep in dependencies):
+                    running[pool.submit(run, name, stack)] = name
+                    del waiting[name]
+            if not running:
+                if waiting:
+                    raise ValueError(f"Dependency cycle between stacks {sorted(waiting)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Plan or apply the synthesized cdktf stacks in parallel.')
+    parser.add_argument('action', choices=sorted(TERRAFORM_COMMANDS))
+    parser.add_argument('stacks', nargs='*', help='stacks to run (with their dependencies); default: all')
+    parser.add_argument('--outdir', default=os.getenv('CDKTF_OUTDIR', 'cdktf.out'))
+    parser.add_argument('--parallelism', type=int, default=4, help='stacks to run at the same time (default: 4)')
+    parser.add_argument('--timeout', type=int, help='seconds before a terraform command is killed')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    tracing.configure_from_env()
+
+    graph = load_stack_graph(args.outdir)
+    if args.stacks:
+        graph = select_stacks(graph, args.stacks)
+    results = run_in_dependency_order(graph, lambda name, stack: run_stack(name, stack, args.action, args.timeout),
+                                      parallelism=args.parallelism)
+
+    for name, result in results.items():
+        status = 'skipped' if result.get('skipped') else f"exit {result['returncode']} in {result['duration_s']}s"
+        print(f"{name}: {status}")
+    return 0 if all(result.get('returncode') == 0 for result in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import json
+
+import tracing
+from deployment_matrix import cell_config, expand_cells, merge_manifests, synth_cell
+
+CONFIG = {
+    'region': 'us-east-1',
+    'eks_clusters': [{'name': 'angularnew-cs', 'alias': 'angular2'}],
+    'node_group': {'desired_size': 2, 'max_size': 2, 'min_size': 1},
+    'deployments': {
+        'environments': {'dev': {}, 'prod': {'node_group': {'desired_size': 3, 'max_size': 6, 'min_size': 2}}},
+        'regions': ['us-east-1', 'us-west-2', 'eu-west-1'],
+    },
+}
+
+
+class TestExpandCells:
+
+    def test_without_matrix_keeps_the_single_stack(self):
+        config = {key: value for key, value in CONFIG.items() if key != 'deployments'}
+        assert expand_cells(config) == [
+            {'id': 'default', 'environment': None, 'region': 'us-east-1', 'stack_prefix': 'cdktf-eks-cluster'}]
+        assert cell_config(config, expand_cells(config)[0])['eks_clusters'][0]['name'] == 'angularnew-cs'
+
+    def test_one_cell_per_environment_and_region(self):
+        cells = expand_cells(CONFIG)
+        assert len(cells) == 6
+        assert cells[-1] == {'id': 'prod-eu-west-1', 'environment': 'prod', 'region': 'eu-west-1',
+                             'stack_prefix': 'cdktf-eks-cluster-prod-eu-west-1'}
+
+    def test_cell_config_applies_overrides_and_unique_names(self):
+        prod = cell_config(CONFIG, expand_cells(CONFIG)[-1])
+        assert prod['region'] == 'eu-west-1'
+        assert prod['node_group'] == {'desired_size': 3, 'max_size': 6, 'min_size': 2}
+        assert prod['eks_clusters'][0]['name'] == 'angularnew-cs-prod'
+        assert prod['name_suffix'] == '-prod'
+        assert 'deployments' not in prod
+        # The shared config is left untouched
+        assert CONFIG['eks_clusters'][0]['name'] == 'angularnew-cs'
+
+    def test_first_environment_owns_the_registry_of_each_region(self):
+        owners = [cell['id'] for cell in expand_cells(CONFIG) if cell_config(CONFIG, cell)['owns_registry']]
+        assert owners == ['dev-us-east-1', 'dev-us-west-2', 'dev-eu-west-1']
+        assert cell_config(CONFIG, expand_cells(CONFIG)[0])['regions'] == ['us-east-1', 'us-west-2', 'eu-west-1']
+
+
+def test_merge_manifests(tmp_path):
+    for cell in ['dev-us-east-1', 'prod-us-east-1']:
+        cell_dir = tmp_path / 'cells' / cell
+        cell_dir.mkdir(parents=True)
+        name = f'cdktf-eks-cluster-{cell}'
+        (cell_dir / 'manifest.json').write_text(json.dumps({'version': '0.20.10', 'stacks': {name: {
+            'name': name, 'dependencies': [],
+            'synthesizedStackPath': f'stacks/{name}/cdk.tf.json', 'workingDirectory': f'stacks/{name}'}}}))
+    merged = merge_manifests(str(tmp_path), [str(tmp_path / 'cells' / cell) for cell in ['dev-us-east-1', 'prod-us-east-1']])
+    assert json.loads((tmp_path / 'manifest.json').read_text()) == merged
+    assert merged['stacks']['cdktf-eks-cluster-prod-us-east-1']['workingDirectory'] == \
+        'cells/prod-us-east-1/stacks/cdktf-eks-cluster-prod-us-east-1'
+
+
+def test_synth_cell_returns_its_spans_for_the_parent(tmp_path):
+    config = dict(CONFIG, rds={'username': 'admin'},
+                  availability_zones={'us-east-1': ['us-east-1a', 'us-east-1b']})
+    cell = expand_cells(config)[0]
+    try:
+        result = synth_cell(config, cell, str(tmp_path / 'cell'), trace=True)
+    finally:
+        tracing.disable()
+        tracing.reset()
+    names = {event['name'] for event in result['trace']['events']}
+    assert {'synth.cell', 'construct.cell', 'synth.write'} <= names
+    assert (tmp_path / 'cell' / 'manifest.json').exists()
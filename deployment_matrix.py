@@ -0,0 +1,152 @@
+"""Environment x region fan-out.
+
+config.json may describe a matrix of environments and regions:
+
+    "deployments": {
+        "environments": {"dev": {}, "prod": {"node_group": {"desired_size": 3, "max_size": 6, "min_size": 2}}},
+        "regions": ["us-east-1", "us-west-2", "eu-west-1"]
+    }
+
+Every (environment, region) cell gets its own copy of the config, with the
+environment's overrides applied, and its own stack(s). Cells are synthesized
+in a process pool because each jsii runtime is single-threaded. Each cell
+writes to <outdir>/cells/<cell-id>/ and a merged manifest.json at the top of
+outdir lists every stack, so cdktf and deploy.py see a single app. Without a
+"deployments" section there is one cell: the region from config.json and the
+historical "cdktf-eks-cluster" stack name.
+"""
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import tracing
+
+DEFAULT_REGION = 'us-east-1'
+STACK_PREFIX = 'cdktf-eks-cluster'
+
+
+def expand_cells(config):
+    """Return one {'id', 'environment', 'region', 'stack_prefix'} dict per matrix cell."""
+    deployments = config.get('deployments')
+    if not deployments:
+        region = config.get('region', DEFAULT_REGION)
+        return [{'id': 'default', 'environment': None, 'region': region, 'stack_prefix': STACK_PREFIX}]
+    cells = []
+    for environment in deployments.get('environments') or {'default': {}}:
+        for region in deployments.get('regions') or [config.get('region', DEFAULT_REGION)]:
+            cell_id = f"{environment}-{region}"
+            cells.append({'id': cell_id, 'environment': environment, 'region': region,
+                          'stack_prefix': f"{STACK_PREFIX}-{cell_id}"})
+    return cells
+
+
+def cell_config(config, cell):
+    """The config one cell is built from: environment overrides, region and unique names."""
+    derived = copy.deepcopy(config)
+    deployments = derived.pop('deployments', None) or {}
+    environment = cell['environment']
+    derived.update(copy.deepcopy((deployments.get('environments') or {}).get(environment) or {}))
+    derived['region'] = cell['region']
+    derived['environment'] = environment
+    # Registry-wide resources (ECR replication, pull-through cache) exist once per region
+    derived['regions'] = list(deployments.get('regions') or [cell['region']])
+    environments = list(deployments.get('environments') or {'default': {}})
+    derived['owns_registry'] = environment is None or environment == environments[0]
+    if environment:
+        # EKS cluster and DB subnet group names must be unique per account and region
+        derived['name_suffix'] = f"-{environment}"
+        for cluster in derived['eks_clusters']:
+            cluster['name'] = f"{cluster['name']}-{environment}"
+    return derived
+
+
+def build_cell(app, config, cell, account_id=None):
+    """Add the stack(s) for one cell to app, in the layout config asks for."""
+    import main
+    import stacks
+
+    derived = cell_config(config, cell)
+    with tracing.span('construct.cell', cell=cell['id'], layout=derived.get('stack_layout', 'single')):
+        if derived.get('stack_layout', 'single') == 'split':
+            return stacks.build_split_stacks(app, derived, account_id, prefix=cell['stack_prefix'], region=cell['region'])
+        return [main.MyStack(app, cell['stack_prefix'], derived, account_id=account_id)]
+
+
+def synth_cell(config, cell, outdir, account_id=None, trace=False):
+    """Synthesize one cell into outdir. Runs in a worker process.
+
+    With trace set, the cell's spans are recorded and returned under 'trace'
+    (see tracing.export) for the parent process to merge.
+    """
+    from cdktf import App
+
+    if trace:
+        # Workers are reused across cells; each result carries only its own cell's spans
+        tracing.enable()
+        tracing.reset()
+    started = time.monotonic()
+    with tracing.span('synth.cell', cell=cell['id']):
+        os.makedirs(outdir, exist_ok=True)
+        app = App(outdir=outdir)
+        build_cell(app, config, cell, account_id)
+        with tracing.span('synth.write', outdir=outdir):
+            app.synth()
+    result = {'cell': cell['id'], 'outdir': outdir, 'synth_s': round(time.monotonic() - started, 3)}
+    if trace:
+        result['trace'] = tracing.export()
+    return result
+
+
+def merge_manifests(outdir, cell_outdirs):
+    """Write outdir/manifest.json listing the stacks of every cell with paths relative to outdir."""
+    merged = {'stacks': {}}
+    for cell_outdir in cell_outdirs:
+        with open(os.path.join(cell_outdir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        relative = os.path.relpath(cell_outdir, outdir)
+        merged['version'] = manifest.get('version')
+        for name, stack in manifest['stacks'].items():
+            stack = dict(stack)
+            for key in ('synthesizedStackPath', 'workingDirectory', 'stackMetadataPath'):
+                if key in stack:
+                    stack[key] = os.path.join(relative, stack[key])
+            merged['stacks'][name] = stack
+    with open(os.path.join(outdir, 'manifest.json'), 'w') as f:
+        json.dump(merged, f, indent=2)
+    return merged
+
+
+@tracing.traced('synth.matrix')
+def synth_matrix(config, outdir, account_id=None, max_workers=None):
+    """Synthesize every cell of the matrix into per-cell directories under outdir.
+
+    Returns the per-cell timing results.
+    """
+    cells = expand_cells(config)
+    shutil.rmtree(os.path.join(outdir, 'cells'), ignore_errors=True)
+    cell_outdirs = [os.path.join(outdir, 'cells', cell['id']) for cell in cells]
+    jobs = list(zip(cells, cell_outdirs))
+    if len(jobs) == 1:
+        results = [synth_cell(config, jobs[0][0], jobs[0][1], account_id)]
+    else:
+        # jsii talks to a node child process over pipes, so workers must be
+        # spawned fresh rather than forked from a process that already loaded it
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max_workers or min(len(jobs), os.cpu_count() or 1),
+                                 mp_context=context) as pool:
+            # TRACE_FILE is only read by the entry point, so workers record spans when the parent does
+            futures = [pool.submit(synth_cell, config, cell, cell_outdir, account_id, tracing.is_enabled())
+                       for cell, cell_outdir in jobs]
+            results = [future.result() for future in futures]
+        for result in results:
+            if 'trace' in result:
+                tracing.merge(result.pop('trace'))
+    merge_manifests(outdir, cell_outdirs)
+    for result in results:
+        logging.info(f"Synthesized cell {result['cell']} in {result['synth_s']}s")
+    return results
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from eks_token_cache import EksTokenCache
+
+
+class FakeSigner:
+    """Stands in for eks_token.get_token, issuing 15 minute tokens."""
+
+    def __init__(self, clock, delay=0):
+        self.clock = clock
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, cluster_name, role_arn=None, region_name=None):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls += 1
+            expires = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.clock() + 15 * 60))
+            return {'status': {'token': f'k8s-aws-v1.{cluster_name}.{self.calls}', 'expirationTimestamp': expires}}
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(clock, signer, identity='arn:aws:iam::123456789012:user/a'):
+    return EksTokenCache(fetch=signer, identity=lambda: identity, clock=clock)
+
+
+class TestEksTokenCache:
+
+    def test_reuses_token_until_refresh_margin(self):
+        clock = Clock()
+        signer = FakeSigner(clock)
+        cache = make_cache(clock, signer)
+
+        token = cache.get('angularnew-cs')
+        clock.now += 10 * 60
+        assert cache.get('angularnew-cs') == token
+        clock.now += 4 * 60  # within two minutes of expiry
+        assert cache.get('angularnew-cs') != token
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 2
+
+    def test_keyed_by_cluster_and_identity(self):
+        clock = Clock()
+        signer = FakeSigner(clock)
+        cache = make_cache(clock, signer)
+        cache.get('a')
+        cache.get('b')
+        cache.get('a', role_arn='arn:aws:iam::123456789012:role/deployer')
+        assert signer.calls == 3
+
+    def test_concurrent_callers_share_one_refresh(self):
+        clock = Clock()
+        signer = FakeSigner(clock, delay=0.05)
+        cache = make_cache(clock, signer)
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(cache.get('a'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert signer.calls == 1
+        assert len(set(tokens)) == 1
+        assert cache.stats() == {'hits': 7, 'misses': 1, 'hit_rate': 7 / 8, 'cached_tokens': 1}
@@ -0,0 +1,110 @@
+"""Expiry-aware cache for EKS bearer tokens.
+
+eks_token.get_token presigns a fresh STS request on every call although the
+token stays valid for about 15 minutes. Tokens are cached per cluster and
+credential identity and refreshed shortly before they expire; concurrent
+callers for the same key share one in-flight refresh.
+"""
+import calendar
+import logging
+import threading
+import time
+
+import tracing
+
+DEFAULT_REFRESH_MARGIN = 120  # seconds before expiry to fetch a new token
+
+
+def _default_fetch(cluster_name, role_arn=None, region_name=None):
+    from eks_token import get_token
+
+    return get_token(cluster_name=cluster_name, role_arn=role_arn, region_name=region_name)
+
+
+def _default_identity():
+    from aws_identity import get_caller_identity
+
+    return get_caller_identity()['Arn']
+
+
+def parse_expiration(timestamp):
+    """ExecCredential expirationTimestamp ('2024-01-01T00:00:00Z') to epoch seconds."""
+    return calendar.timegm(time.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ'))
+
+
+class EksTokenCache:
+
+    def __init__(self, fetch=None, identity=None, refresh_margin=DEFAULT_REFRESH_MARGIN, clock=time.time):
+        self.fetch = fetch or _default_fetch
+        self.identity = identity or _default_identity
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._tokens = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _valid(self, entry):
+        return entry is not None and entry['expires_at'] - self.refresh_margin > self.clock()
+
+    def get(self, cluster_name, role_arn=None, region_name=None):
+        """Return a bearer token for cluster_name, fetching one only if needed."""
+        key = (cluster_name, role_arn or self.identity(), region_name)
+        with self._lock:
+            entry = self._tokens.get(key)
+            if self._valid(entry):
+                self.hits += 1
+                return entry['token']
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another caller may have refreshed while we waited for the key lock
+            with self._lock:
+                entry = self._tokens.get(key)
+                if self._valid(entry):
+                    self.hits += 1
+                    return entry['token']
+            with tracing.span('aws.eks.get_token', cluster=cluster_name):
+                credential = self.fetch(cluster_name, role_arn=role_arn, region_name=region_name)
+            entry = {
+                'token': credential['status']['token'],
+                'expires_at': parse_expiration(credential['status']['expirationTimestamp']),
+            }
+            with self._lock:
+                self._tokens[key] = entry
+                self.misses += 1
+            logging.debug(f"Fetched EKS token for {cluster_name}")
+            return entry['token']
+
+    def invalidate(self, cluster_name=None):
+        with self._lock:
+            for key in [key for key in self._tokens if cluster_name in (None, key[0])]:
+                del self._tokens[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'cached_tokens': len(self._tokens),
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache():
+    """The process-wide cache used by get_eks_token and the aws-auth reconciler."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EksTokenCache()
+        return _default_cache
+
+
+def get_eks_token(cluster_name, role_arn=None, region_name=None):
+    return default_cache().get(cluster_name, role_arn=role_arn, region_name=region_name)
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from eks_waiter import ClusterWaitError, wait_for_clusters
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'DescribeCluster')
+
+
+class FakeEks:
+    """A local stand-in for the EKS API that replays scripted cluster statuses.
+
+    A scripted exception is raised instead of returning a status. Clusters in
+    barrier only get their first answer once all of them have asked, which
+    can only happen when they are polled concurrently.
+    """
+
+    class exceptions:
+        class ResourceNotFoundException(Exception):
+            pass
+
+    def __init__(self, statuses, barrier=()):
+        self.statuses = {name: list(sequence) for name, sequence in statuses.items()}
+        self.calls = {name: 0 for name in statuses}
+        self.lock = threading.Lock()
+        self.barrier_names = set(barrier)
+        self.barrier = threading.Barrier(len(self.barrier_names)) if self.barrier_names else None
+
+    def describe_cluster(self, name):
+        with self.lock:
+            if name not in self.statuses:
+                raise self.exceptions.ResourceNotFoundException(name)
+            self.calls[name] += 1
+            first_call = self.calls[name] == 1
+            sequence = self.statuses[name]
+            status = sequence.pop(0) if len(sequence) > 1 else sequence[0]
+        if first_call and name in self.barrier_names:
+            # Raises BrokenBarrierError if the other clusters are not being polled at the same time
+            self.barrier.wait(timeout=10)
+        if isinstance(status, Exception):
+            raise status
+        return {'cluster': {'name': name, 'status': status}}
+
+
+class TestWaitForClusters:
+
+    def test_waits_for_all_clusters_concurrently(self):
+        eks = FakeEks({
+            'a': ['CREATING'] * 4 + ['ACTIVE'],
+            'b': ['CREATING'] * 4 + ['ACTIVE'],
+            'c': ['ACTIVE'],
+        }, barrier=['a', 'b', 'c'])
+        report = wait_for_clusters(['a', 'b', 'c'], eks_client=eks, initial_delay=0.01, max_delay=0.01)
+
+        assert {entry['outcome'] for entry in report.values()} == {'active'}
+        assert report['a']['polls'] == 5
+        assert report['c']['polls'] == 1
+
+    def test_fails_fast_on_failed_cluster(self):
+        eks = FakeEks({'slow': ['CREATING'], 'broken': ['CREATING', 'FAILED']})
+        with pytest.raises(ClusterWaitError) as excinfo:
+            wait_for_clusters(['slow', 'broken'], eks_client=eks, timeout=30, initial_delay=0.01, max_delay=0.01)
+        report = excinfo.value.report
+        assert report['broken']['outcome'] == 'failed'
+        assert report['broken']['status'] == 'FAILED'
+        assert report['slow']['outcome'] == 'cancelled'
+
+    def test_missing_cluster_fails(self):
+        with pytest.raises(ClusterWaitError) as excinfo:
+            wait_for_clusters(['ghost'], eks_client=FakeEks({}), initial_delay=0.01)
+        assert excinfo.value.report['ghost']['status'] == 'NOT_FOUND'
+
+    def test_overall_deadline(self):
+        eks = FakeEks({'stuck': ['CREATING']})
+        with pytest.raises(ClusterWaitError) as excinfo:
+            wait_for_clusters(['stuck'], eks_client=eks, timeout=0.1, initial_delay=0.02, max_delay=0.02)
+        assert excinfo.value.report['stuck']['outcome'] == 'timeout'
+
+    def test_retries_throttling(self):
+        eks = FakeEks({'a': [client_error('ThrottlingException'), client_error('TooManyRequestsException'), 'ACTIVE']})
+        report = wait_for_clusters(['a'], eks_client=eks, initial_delay=0.01, max_delay=0.01)
+        assert report['a']['outcome'] == 'active'
+        assert report['a']['polls'] == 3
+
+    def test_api_error_stops_other_waiters(self):
+        eks = FakeEks({'slow': ['CREATING'], 'denied': [client_error('AccessDeniedException')]})
+        with pytest.raises(ClusterWaitError) as excinfo:
+            # Without the stop the slow waiter would poll until the one hour deadline
+            wait_for_clusters(['slow', 'denied'], eks_client=eks, timeout=3600, initial_delay=0.01, max_delay=0.01)
+        report = excinfo.value.report
+        assert report['denied']['outcome'] == 'error'
+        assert report['denied']['status'] == 'AccessDeniedException'
+        assert 'AccessDeniedException' in report['denied']['error']
+        assert report['slow']['outcome'] == 'cancelled'
+
+    def test_endpoint_error(self):
+        eks = FakeEks({'a': [EndpointConnectionError(endpoint_url='https://eks.us-east-1.amazonaws.com')]})
+        with pytest.raises(ClusterWaitError) as excinfo:
+            wait_for_clusters(['a'], eks_client=eks, initial_delay=0.01)
+        assert excinfo.value.report['a']['outcome'] == 'error'
+        assert excinfo.value.report['a']['polls'] == 1
@@ -0,0 +1,117 @@
+"""Concurrent EKS readiness waiter.
+
+Every cluster is polled from its own worker thread with jittered exponential
+backoff, so the total wait is bounded by the slowest cluster rather than the
+sum of all of them. A cluster entering FAILED or DELETING (or disappearing),
+or an API error other than throttling, stops the other waiters straight away.
+Throttled polls are retried with the same backoff.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+import tracing
+
+FAILURE_STATES = {'FAILED', 'DELETING'}
+THROTTLING_CODES = {'Throttling', 'ThrottlingException', 'TooManyRequestsException', 'RequestLimitExceeded'}
+
+
+class ClusterWaitError(Exception):
+    """Raised when a cluster failed, timed out or was cancelled. Carries the timing report."""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+def backoff_delay(attempt, initial_delay, max_delay):
+    """Exponential backoff with equal jitter: half fixed, half random."""
+    delay = min(max_delay, initial_delay * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _wait_for_cluster(eks_client, cluster_name, deadline, stop, initial_delay, max_delay):
+    started = time.monotonic()
+    polls = 0
+    status = None
+    outcome = None
+    error = None
+    while outcome is None:
+        throttled = False
+        with tracing.span('aws.eks.describe_cluster', cluster=cluster_name) as span:
+            try:
+                status = eks_client.describe_cluster(name=cluster_name)['cluster']['status']
+            except eks_client.exceptions.ResourceNotFoundException:
+                status = 'NOT_FOUND'
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code', '')
+                if code in THROTTLING_CODES:
+                    throttled = True
+                else:
+                    status, error = code or 'ERROR', str(e)
+            except BotoCoreError as e:
+                status, error = 'ERROR', str(e)
+            span.set_attribute('status', status)
+        polls += 1
+
+        if error:
+            outcome = 'error'
+            logging.error(f"Cannot describe cluster {cluster_name}: {error}")
+            stop.set()
+        elif status == 'ACTIVE':
+            outcome = 'active'
+            logging.info(f"Cluster {cluster_name} is active.")
+        elif status in FAILURE_STATES or status == 'NOT_FOUND':
+            outcome = 'failed'
+            logging.error(f"Cluster {cluster_name} will not become active. Current status: {status}")
+            stop.set()
+        else:
+            delay = min(backoff_delay(polls - 1, initial_delay, max_delay), max(0.0, deadline - time.monotonic()))
+            if throttled:
+                logging.warning(f"Throttled describing cluster {cluster_name}, retrying in {delay:.1f}s")
+            else:
+                logging.info(f"Waiting for cluster {cluster_name} to become active. Current status: {status}")
+            if stop.wait(delay):
+                outcome = 'cancelled'
+            elif time.monotonic() >= deadline:
+                outcome = 'timeout'
+    return {
+        'status': status,
+        'outcome': outcome,
+        'polls': polls,
+        'error': error,
+        'elapsed_s': round(time.monotonic() - started, 3),
+    }
+
+
+@tracing.traced('eks.wait_for_clusters')
+def wait_for_clusters(cluster_names, eks_client=None, timeout=1800, initial_delay=5, max_delay=60, max_workers=None):
+    """Wait until every cluster is ACTIVE and return {cluster_name: timing report}.
+
+    Raises ClusterWaitError if any cluster failed, could not be described, or
+    did not become active before the overall timeout (in seconds).
+    """
+    cluster_names = list(cluster_names)
+    if not cluster_names:
+        return {}
+    if eks_client is None:
+        import boto3
+
+        eks_client = boto3.client('eks')
+
+    deadline = time.monotonic() + timeout
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=max_workers or len(cluster_names)) as pool:
+        futures = {name: pool.submit(_wait_for_cluster, eks_client, name, deadline, stop, initial_delay, max_delay)
+                   for name in cluster_names}
+        report = {name: future.result() for name, future in futures.items()}
+
+    not_ready = sorted(name for name, entry in report.items() if entry['outcome'] != 'active')
+    if not_ready:
+        details = ', '.join(f"{name} ({report[name]['outcome']}: {report[name]['status']})" for name in not_ready)
+        raise ClusterWaitError(f"Clusters not active: {details}", report)
+    return report
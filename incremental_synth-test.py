@@ -0,0 +1,76 @@
+import copy
+import os
+
+from cdktf import App
+
+from deployment_matrix import expand_cells
+from incremental_synth import synth_incremental
+
+CONFIG = {
+    'region': 'us-east-1',
+    'availability_zones': {'us-east-1': ['us-east-1a', 'us-east-1b']},
+    'eks_clusters': [
+        {'name': 'angularnew-cs', 'alias': 'angular2'},
+        {'name': 'reports-cs', 'alias': 'reports'},
+        {'name': 'django-cs', 'alias': 'django'},
+    ],
+    'node_group': {'desired_size': 2, 'max_size': 2, 'min_size': 1},
+    'rds': {'username': 'admin'},
+}
+
+
+def synth(tmp_path, name, config, state_dir):
+    outdir = tmp_path / name
+    outdir.mkdir()
+    result = synth_incremental(App(outdir=str(outdir)), config, expand_cells(config)[0], state_dir=str(state_dir))
+    with open(os.path.join(outdir, 'stacks', 'cdktf-eks-cluster', 'cdk.tf.json'), 'rb') as f:
+        return result, f.read()
+
+
+class TestIncrementalSynth:
+
+    def test_only_changed_clusters_are_rebuilt_and_output_matches_a_full_synth(self, tmp_path):
+        state_dir = tmp_path / 'state'
+        result, _ = synth(tmp_path, 'first', CONFIG, state_dir)
+        assert result == {'rebuilt': ['angular2', 'reports', 'django'], 'reused': []}
+
+        changed = copy.deepcopy(CONFIG)
+        changed['eks_clusters'][1]['node_group'] = {'desired_size': 3, 'max_size': 5, 'min_size': 1}
+        del changed['eks_clusters'][2]
+        changed['eks_clusters'].append({'name': 'springboot-cs', 'alias': 'springboot'})
+        result, incremental = synth(tmp_path, 'incremental', changed, state_dir)
+        assert result == {'rebuilt': ['reports', 'springboot'], 'reused': ['angular2']}
+
+        # A fresh state directory forces a full synth
+        result, full = synth(tmp_path, 'full', changed, tmp_path / 'fresh-state')
+        assert result['reused'] == []
+        assert incremental == full
+        assert b'Django' not in incremental and b'"desired_size": 3' in incremental
+
+    def test_shared_config_change_rebuilds_everything(self, tmp_path):
+        state_dir = tmp_path / 'state'
+        synth(tmp_path, 'first', CONFIG, state_dir)
+        result, _ = synth(tmp_path, 'second', dict(CONFIG, node_group={'desired_size': 1, 'max_size': 2, 'min_size': 1}),
+                          state_dir)
+        assert result['reused'] == []
+
+    def test_reused_cluster_keeps_its_kubernetes_provider(self, tmp_path):
+        state_dir = tmp_path / 'state'
+        config = copy.deepcopy(CONFIG)
+        config['eks_clusters'][0]['workload'] = {'image': 'public.ecr.aws/nginx/nginx:1.27'}
+        config['eks_clusters'][2]['workload'] = {'image': 'public.ecr.aws/nginx/nginx:1.27'}
+        synth(tmp_path, 'first', config, state_dir)
+
+        config['eks_clusters'][2]['workload']['container_port'] = 9090
+        result, incremental = synth(tmp_path, 'incremental', config, state_dir)
+        assert result['reused'] == ['angular2', 'reports']
+        _, full = synth(tmp_path, 'full', config, tmp_path / 'fresh-state')
+        assert incremental == full
+
+    def test_clusters_behind_a_load_balancer_are_always_rebuilt(self, tmp_path):
+        state_dir = tmp_path / 'state'
+        config = dict(CONFIG, load_balancers=[{'name': 'web', 'listeners': [
+            {'port': 80, 'rules': [{'service': 'reports', 'paths': ['/reports/*']}]}]}])
+        synth(tmp_path, 'first', config, state_dir)
+        result, _ = synth(tmp_path, 'second', config, state_dir)
+        assert result == {'rebuilt': ['reports'], 'reused': ['angular2', 'django']}
@@ -0,0 +1,169 @@
+"""Incremental synth of the single stack: only clusters whose config changed are rebuilt.
+
+Every cluster lives in its own EksClusterConstruct subtree (<Alias>Cluster),
+so its resources and outputs in cdk.tf.json depend only on that cluster's
+config slice and on the shared resources it references. Each subtree is
+fingerprinted from its slice. When the rest of the config and the stack code
+are unchanged since the previous run, MyStack is built with only the dirty
+clusters and the clean subtrees are spliced in from the previous cdk.tf.json.
+cdktf writes the stack JSON with sorted keys, and the spliced stack is
+written the same way, so the result is byte-identical to a full synth.
+
+The previous stack JSON and fingerprints are kept in .synth-cache/.incremental/.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import synth_cache
+import tracing
+
+DEFAULT_STATE_DIR = os.path.join(synth_cache.DEFAULT_CACHE_DIR, '.incremental')
+
+# Stack JSON sections that hold constructs with "//" metadata paths
+CONSTRUCT_SECTIONS = ('resource', 'data')
+
+
+def canonical_json(stack):
+    """Serialize stack JSON the way cdktf writes cdk.tf.json."""
+    return json.dumps(stack, indent=2, sort_keys=True, ensure_ascii=False)
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def cluster_fingerprints(config):
+    """{alias: hash of everything that goes into that cluster's subtree}."""
+    from stacks import cluster_node_groups
+
+    return {cluster['alias']: _digest({'cluster': cluster, 'node_groups': cluster_node_groups(config, cluster)})
+            for cluster in config['eks_clusters']}
+
+
+def base_key(config, project_dir=synth_cache.PROJECT_DIR, extra=None):
+    """Hash of the stack code and the config outside eks_clusters, which every subtree depends on."""
+    shared = {key: value for key, value in config.items() if key != 'eks_clusters'}
+    # config.json is left out of the input files: its shared part is hashed here instead
+    return synth_cache.compute_key(project_dir, extra={'config': shared, 'context': extra},
+                                   input_files=[name for name in synth_cache.INPUT_FILES if name != 'config.json'])
+
+
+def extract_subtree(stack, stack_name, construct_id, provider_alias=None):
+    """The resources, data sources and outputs under construct_id, in stack JSON layout.
+
+    Providers carry no metadata path, so the ones the subtree declares are
+    matched by their alias (the cluster alias) instead.
+    """
+    prefix = f"{stack_name}/{construct_id}/"
+    subtree = {}
+    for section in CONSTRUCT_SECTIONS:
+        for resource_type, blocks in stack.get(section, {}).items():
+            for logical_id, block in blocks.items():
+                if block.get('//', {}).get('metadata', {}).get('path', '').startswith(prefix):
+                    subtree.setdefault(section, {}).setdefault(resource_type, {})[logical_id] = block
+    output_ids = stack.get('//', {}).get('outputs', {}).get(stack_name, {}).get(construct_id)
+    if output_ids:
+        subtree['output_ids'] = output_ids
+        subtree['output'] = {output_id: stack['output'][output_id] for output_id in output_ids.values()}
+    if provider_alias:
+        for provider_type, entries in stack.get('provider', {}).items():
+            aliased = [entry for entry in entries if entry.get('alias') == provider_alias]
+            if aliased:
+                subtree.setdefault('provider', {})[provider_type] = aliased
+                subtree.setdefault('required_providers', {})[provider_type] = \
+                    stack['terraform']['required_providers'][provider_type]
+    return subtree
+
+
+def splice_subtree(stack, stack_name, construct_id, subtree):
+    """Add a subtree taken by extract_subtree to stack, in place."""
+    for section in CONSTRUCT_SECTIONS:
+        for resource_type, blocks in subtree.get(section, {}).items():
+            stack.setdefault(section, {}).setdefault(resource_type, {}).update(blocks)
+    if 'output_ids' in subtree:
+        stack['//']['outputs'][stack_name][construct_id] = subtree['output_ids']
+        stack.setdefault('output', {}).update(subtree['output'])
+    for provider_type, entries in subtree.get('provider', {}).items():
+        stack.setdefault('provider', {}).setdefault(provider_type, []).extend(entries)
+        stack['terraform'].setdefault('required_providers', {})[provider_type] = \
+            subtree['required_providers'][provider_type]
+
+
+def order_providers(stack, aliases):
+    """Put provider blocks in construction order: unaliased first, then by cluster."""
+    position = {alias: index for index, alias in enumerate(aliases)}
+    for entries in stack.get('provider', {}).values():
+        entries.sort(key=lambda entry: position.get(entry.get('alias'), -1))
+
+
+def _state_path(state_dir, stack_name):
+    return os.path.join(state_dir, f"{stack_name}.json")
+
+
+def load_state(state_dir, stack_name):
+    try:
+        with open(_state_path(state_dir, stack_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(state_dir, stack_name, state):
+    os.makedirs(state_dir, exist_ok=True)
+    fd, staging = tempfile.mkstemp(prefix='.tmp-', dir=state_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f)
+    os.replace(staging, _state_path(state_dir, stack_name))
+
+
+def synth_incremental(app, config, cell, state_dir=DEFAULT_STATE_DIR, project_dir=synth_cache.PROJECT_DIR,
+                      extra=None):
+    """Synthesize one cell's MyStack into app's outdir, reusing unchanged cluster subtrees.
+
+    Returns {'rebuilt': [aliases], 'reused': [aliases]}.
+    """
+    from deployment_matrix import cell_config
+    from load_balancers import referenced_services
+    import main
+    import stacks
+
+    derived = cell_config(config, cell)
+    stack_name = cell['stack_prefix']
+    fingerprints = cluster_fingerprints(derived)
+    base = base_key(derived, project_dir, extra)
+
+    state = load_state(state_dir, stack_name)
+    clean = []
+    if state and state['base'] == base:
+        # Load balancer target groups are built from the workload config of the services they name
+        pinned = set(referenced_services(derived))
+        clean = [alias for alias, fingerprint in fingerprints.items()
+                 if state['clusters'].get(alias) == fingerprint and alias not in pinned]
+    dirty = [cluster for cluster in derived['eks_clusters'] if cluster['alias'] not in clean]
+
+    with tracing.span('construct.cell', cell=cell['id'], rebuilt=len(dirty), reused=len(clean)):
+        main.MyStack(app, stack_name, dict(derived, eks_clusters=dirty))
+    with tracing.span('synth.write', outdir=app.outdir):
+        app.synth()
+
+    path = os.path.join(app.outdir, 'stacks', stack_name, 'cdk.tf.json')
+    with open(path) as f:
+        stack = json.load(f)
+    if clean:
+        with tracing.span('synth.splice', clusters=len(clean)):
+            previous = state['stack']
+            for cluster in derived['eks_clusters']:
+                if cluster['alias'] in clean:
+                    construct_id = stacks.cluster_construct_id(cluster)
+                    splice_subtree(stack, stack_name, construct_id,
+                                   extract_subtree(previous, stack_name, construct_id, provider_alias=cluster['alias']))
+            order_providers(stack, [cluster['alias'] for cluster in derived['eks_clusters']])
+            with open(path, 'w') as f:
+                f.write(canonical_json(stack))
+
+    save_state(state_dir, stack_name, {'base': base, 'clusters': fingerprints, 'stack': stack})
+    logging.info(f"Incremental synth of {stack_name}: rebuilt {len(dirty)} clusters, reused {len(clean)}")
+    return {'rebuilt': [cluster['alias'] for cluster in dirty], 'reused': clean}
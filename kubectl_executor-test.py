@@ -0,0 +1,86 @@
+import os
+import stat
+import threading
+
+import pytest
+import yaml
+
+import kubectl_executor
+from kubectl_executor import apply_manifests, run_batch
+
+FAKE_KUBECTL = '''#!/bin/sh
+# Fake kubectl: logs each invocation, echoes stdin for apply, and fails/sleeps on request
+echo "$@" >> "$KUBECTL_LOG"
+case "$*" in
+  *apply*) cat > "$KUBECTL_STDIN.$$"; echo "applied $(grep -c '^kind:' "$KUBECTL_STDIN.$$") objects" ;;
+  *flaky*) if [ ! -f "$KUBECTL_LOG.flaky" ]; then touch "$KUBECTL_LOG.flaky"; echo "connection refused" >&2; exit 1; fi; echo ok ;;
+  *slow*) sleep 5 ;;
+  *) sleep 0.3; echo "$@" ;;
+esac
+'''
+
+
+@pytest.fixture
+def fake_kubectl(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'kubectl'
+    script.write_text(FAKE_KUBECTL)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('KUBECTL_LOG', str(tmp_path / 'calls.log'))
+    monkeypatch.setenv('KUBECTL_STDIN', str(tmp_path / 'stdin'))
+    return tmp_path
+
+
+def quiet(prefix, stream, line):
+    pass
+
+
+class TestRunBatch:
+
+    def test_runs_concurrently_in_order(self, monkeypatch):
+        barrier = threading.Barrier(6)
+
+        def run_streamed(argv, prefix=None, timeout=None, input=None, on_line=None, tail_lines=None):
+            # Raises BrokenBarrierError unless all six commands are running at the same time
+            barrier.wait(timeout=10)
+            return {'returncode': 0, 'stdout': [' '.join(argv[1:])], 'stderr': [], 'timed_out': False,
+                    'duration_s': 0.0}
+
+        monkeypatch.setattr(kubectl_executor, 'run_streamed', run_streamed)
+        commands = [{'args': ['get', 'pods', f'-n=ns{i}'], 'context': f'cluster{i}'} for i in range(6)]
+        results = run_batch(commands, max_workers=6, on_line=quiet)
+        assert [result['stdout'] for result in results] == [[f'--context cluster{i} get pods -n=ns{i}'] for i in range(6)]
+        assert all(result['ok'] for result in results)
+
+    def test_retries_and_timeouts(self, fake_kubectl):
+        results = run_batch([
+            {'args': ['get', 'flaky'], 'retries': 1},
+            {'args': ['get', 'slow'], 'timeout': 0.5},
+        ], on_line=quiet)
+        flaky, slow = results
+        assert flaky['ok'] and flaky['attempts'] == 2
+        assert slow['timed_out'] and not slow['ok']
+
+    def test_streams_lines_with_label(self, fake_kubectl):
+        lines = []
+        run_batch([{'args': ['version'], 'label': 'angular2'}], on_line=lambda *line: lines.append(line))
+        assert lines == [('angular2', 'stdout', 'version')]
+
+
+class TestApplyManifests:
+
+    def test_one_server_side_apply_per_cluster(self, fake_kubectl):
+        manifests = [{'apiVersion': 'v1', 'kind': 'ConfigMap', 'metadata': {'name': f'cm{i}'}} for i in range(12)]
+        results = apply_manifests({'a': manifests, 'b': manifests[:3]}, on_line=quiet)
+
+        assert results['a']['stdout'] == ['applied 12 objects']
+        assert results['b']['stdout'] == ['applied 3 objects']
+        calls = (fake_kubectl / 'calls.log').read_text().splitlines()
+        assert sorted(calls) == [
+            '--context a apply -f - --server-side --field-manager=srefromnoobtoninja',
+            '--context b apply -f - --server-side --field-manager=srefromnoobtoninja',
+        ]
+        stdin_file = next(p for p in fake_kubectl.iterdir() if p.name.startswith('stdin.'))
+        assert all(doc['kind'] == 'ConfigMap' for doc in yaml.safe_load_all(stdin_file.read_text()))
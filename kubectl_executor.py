@@ -0,0 +1,93 @@
+"""Batched, non-blocking kubectl executor.
+
+Commands are argv lists (never a shell string) and run concurrently on a
+bounded pool, each with its own timeout and retries. Output is streamed line
+by line through process_runner. apply_manifests collapses any number of
+manifests for a cluster into one `kubectl apply --server-side -f -`.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from process_runner import print_line, run_streamed
+
+DEFAULT_TIMEOUT = 300
+FIELD_MANAGER = 'srefromnoobtoninja'
+
+
+def kubectl_argv(args, context=None, kubeconfig=None):
+    argv = ['kubectl']
+    if kubeconfig:
+        argv += ['--kubeconfig', kubeconfig]
+    if context:
+        argv += ['--context', context]
+    return argv + list(args)
+
+
+def run_kubectl(args, context=None, kubeconfig=None, input=None, timeout=DEFAULT_TIMEOUT, retries=0,
+                retry_delay=2.0, label=None, on_line=print_line, tail_lines=50):
+    """Run one kubectl invocation, retrying failures and timeouts, and return a result dict.
+
+    The result is process_runner's result plus label, attempts and ok.
+    """
+    argv = kubectl_argv(args, context, kubeconfig)
+    label = label or context or 'kubectl'
+    for attempt in range(1, retries + 2):
+        result = run_streamed(argv, prefix=label, timeout=timeout, input=input, on_line=on_line, tail_lines=tail_lines)
+        result.update(label=label, attempts=attempt, ok=result['returncode'] == 0)
+        if result['ok'] or attempt > retries:
+            break
+        delay = retry_delay * (2 ** (attempt - 1))
+        logging.info(f"{label}: kubectl {' '.join(args)} failed (exit {result['returncode']}), retrying in {delay}s")
+        time.sleep(delay)
+    return result
+
+
+def run_batch(commands, max_workers=8, timeout=DEFAULT_TIMEOUT, retries=0, on_line=print_line):
+    """Run a batch of kubectl commands concurrently; results come back in input order.
+
+    Each command is a dict with 'args' and optionally 'context', 'kubeconfig',
+    'input', 'label', 'timeout' and 'retries' (the latter two default to the
+    batch-wide values).
+    """
+    commands = list(commands)
+    if not commands:
+        return []
+
+    def run(command):
+        return run_kubectl(command['args'], context=command.get('context'), kubeconfig=command.get('kubeconfig'),
+                           input=command.get('input'), timeout=command.get('timeout', timeout),
+                           retries=command.get('retries', retries), label=command.get('label'), on_line=on_line)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(commands)))) as pool:
+        return list(pool.map(run, commands))
+
+
+def render_manifests(manifests):
+    """Join manifests (dicts or YAML/JSON strings) into one multi-document YAML stream."""
+    documents = []
+    for manifest in manifests:
+        if isinstance(manifest, (dict, list)):
+            manifest = yaml.safe_dump(json.loads(json.dumps(manifest)), sort_keys=False)
+        documents.append(manifest.strip())
+    return '\n---\n'.join(documents) + '\n'
+
+
+def apply_manifests(manifests_by_context, server_side=True, field_manager=FIELD_MANAGER, max_workers=8,
+                    timeout=DEFAULT_TIMEOUT, retries=2, on_line=print_line):
+    """Apply every cluster's manifests with a single kubectl process per cluster.
+
+    manifests_by_context maps a kubeconfig context to a list of manifests.
+    Returns {context: result}.
+    """
+    commands = []
+    for context, manifests in manifests_by_context.items():
+        args = ['apply', '-f', '-']
+        if server_side:
+            args += ['--server-side', f'--field-manager={field_manager}']
+        commands.append({'args': args, 'context': context, 'input': render_manifests(manifests), 'label': context})
+    results = run_batch(commands, max_workers=max_workers, timeout=timeout, retries=retries, on_line=on_line)
+    return {command['context']: result for command, result in zip(commands, results)}
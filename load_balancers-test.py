@@ -0,0 +1,127 @@
+import json
+
+import pytest
+from cdktf import Testing
+
+from load_balancers import access_logs_bucket_name, referenced_services, service_target, target_group_name
+from main import MyStack
+
+CONFIG = {
+    'region': 'us-east-1',
+    'availability_zones': {'us-east-1': ['us-east-1a', 'us-east-1b']},
+    'network': {'vpc_cidr': '10.0.0.0/16', 'az_count': 2, 'nat_gateways': 'single'},
+    'eks_clusters': [
+        {'name': 'angularnew-cs', 'alias': 'angular2',
+         'workload': {'image': 'public.ecr.aws/nginx/nginx:1.27', 'container_port': 8080,
+                      'readiness_probe': {'path': '/healthz'}}},
+        {'name': 'reports-cs', 'alias': 'reports'},
+    ],
+    'node_group': {'desired_size': 2, 'max_size': 2, 'min_size': 1},
+    'rds': {'username': 'admin'},
+    's3_bucket': {'name': 'training-trinet-reports'},
+    'lb_access_logs': {'bucket_prefix': 'training-trinet', 'expiration_days': 14},
+    'load_balancers': [
+        {'name': 'web', 'idle_timeout': 120, 'listeners': [{'port': 80, 'rules': [
+            {'service': 'angular2', 'paths': ['/app/*'], 'priority': 10},
+            {'service': 'reports', 'hosts': ['reports.example.com']},
+        ]}]},
+        {'name': 'reports-nlb', 'type': 'network', 'scheme': 'internal', 'deregistration_delay': 5,
+         'listeners': [{'port': 9000, 'service': 'reports'}]},
+    ],
+}
+
+
+@pytest.fixture(scope='module')
+def resources():
+    return json.loads(Testing.synth(MyStack(Testing.app(), 'cdktf-eks-cluster', CONFIG)))['resource']
+
+
+def by_logical_id(blocks, prefix):
+    return next(block for logical_id, block in blocks.items() if logical_id.startswith(prefix))
+
+
+class TestServiceTarget:
+
+    def test_port_and_health_check_come_from_the_workload(self):
+        assert service_target(CONFIG, 'angular2') == {'port': 8080, 'health_check_path': '/healthz'}
+        assert service_target(CONFIG, 'reports') == {'port': 8080, 'health_check_path': '/'}
+
+    def test_referenced_services(self):
+        assert referenced_services(CONFIG) == ['angular2', 'reports']
+
+    def test_unknown_service_is_rejected(self):
+        with pytest.raises(KeyError):
+            service_target(CONFIG, 'django')
+
+
+class TestLoadBalancers:
+
+    def test_application_load_balancer(self, resources):
+        alb = by_logical_id(resources['aws_lb'], 'WebLoadBalancer_')
+        assert alb['load_balancer_type'] == 'application' and alb['internal'] is False
+        assert alb['enable_http2'] is True and alb['idle_timeout'] == 120
+        assert alb['subnets'] == ['${aws_subnet.PublicSubnet1.id}', '${aws_subnet.PublicSubnet2.id}']
+        assert alb['access_logs'] == {'bucket': 'training-trinet-lb-logs-us-east-1', 'enabled': True,
+                                      'prefix': 'lb-logs/web'}
+        assert alb['depends_on'] == ['aws_s3_bucket_policy.LbAccessLogsBucketPolicy']
+
+    def test_ip_target_groups_per_service(self, resources):
+        target_group = by_logical_id(resources['aws_lb_target_group'], 'WebLoadBalancer_Angular2TargetGroup')
+        assert target_group['target_type'] == 'ip' and target_group['port'] == 8080
+        assert target_group['deregistration_delay'] == '30'
+        assert target_group['name'] == target_group_name('web', 'angular2')
+        assert target_group['health_check']['path'] == '/healthz'
+        nlb_group = by_logical_id(resources['aws_lb_target_group'], 'ReportsNlbLoadBalancer_ReportsTargetGroup')
+        assert nlb_group['protocol'] == 'TCP' and nlb_group['deregistration_delay'] == '5'
+
+    def test_listener_rules_forward_per_service(self, resources):
+        rules = sorted(resources['aws_lb_listener_rule'].values(), key=lambda rule: rule['priority'])
+        assert [rule['priority'] for rule in rules] == [10, 20]
+        assert rules[0]['condition'] == [{'path_pattern': {'values': ['/app/*']}}]
+        assert rules[1]['condition'] == [{'host_header': {'values': ['reports.example.com']}}]
+        assert rules[1]['action'][0]['type'] == 'forward'
+        listener = by_logical_id(resources['aws_lb_listener'], 'WebLoadBalancer_')
+        assert listener['default_action'][0]['fixed_response']['status_code'] == '404'
+
+    def test_internal_network_load_balancer(self, resources):
+        nlb = by_logical_id(resources['aws_lb'], 'ReportsNlbLoadBalancer_')
+        assert nlb['internal'] is True and nlb['enable_cross_zone_load_balancing'] is True
+        assert nlb['subnets'] == ['${aws_subnet.PrivateSubnet1.id}', '${aws_subnet.PrivateSubnet2.id}']
+        assert 'security_groups' not in nlb
+        listener = by_logical_id(resources['aws_lb_listener'], 'ReportsNlbLoadBalancer_')
+        assert listener['protocol'] == 'TCP' and listener['default_action'][0]['type'] == 'forward'
+
+    def test_stack_owns_its_access_log_bucket(self, resources):
+        assert resources['aws_s3_bucket']['LbAccessLogsBucket']['bucket'] == 'training-trinet-lb-logs-us-east-1'
+        policy_resource = resources['aws_s3_bucket_policy']['LbAccessLogsBucketPolicy']
+        assert policy_resource['bucket'] == '${aws_s3_bucket.LbAccessLogsBucket.id}'
+        policy = json.loads(policy_resource['policy'])
+        assert {statement['Resource'] for statement in policy['Statement']} == {
+            'arn:aws:s3:::training-trinet-lb-logs-us-east-1/lb-logs/*', 'arn:aws:s3:::training-trinet-lb-logs-us-east-1'}
+        lifecycle = resources['aws_s3_bucket_lifecycle_configuration']['LbAccessLogsBucketLifecycle']
+        assert lifecycle['rule'][0]['expiration'] == [{'days': 14}]
+
+    def test_access_logs_are_opt_in(self):
+        config = {key: value for key, value in CONFIG.items() if key != 'lb_access_logs'}
+        resources = json.loads(Testing.synth(MyStack(Testing.app(), 'cdktf-eks-cluster', config)))['resource']
+        assert 'aws_s3_bucket_policy' not in resources and 'aws_s3_bucket' not in resources
+        assert 'access_logs' not in by_logical_id(resources['aws_lb'], 'WebLoadBalancer_')
+
+
+class TestNames:
+
+    def test_access_log_bucket_per_region_and_environment(self):
+        config = dict(CONFIG, region='eu-west-1', name_suffix='-prod')
+        assert access_logs_bucket_name(config) == 'training-trinet-lb-logs-eu-west-1-prod'
+        assert access_logs_bucket_name({'region': 'us-east-1'}) is None
+        with pytest.raises(ValueError):
+            access_logs_bucket_name({'lb_access_logs': {}})
+
+    def test_target_group_names_fit_and_stay_distinct(self):
+        long_names = [target_group_name('internal-web-frontend', alias, '-staging')
+                      for alias in ('reports-api-v1', 'reports-api-v2')]
+        assert all(len(name) <= 32 and not name.endswith('-') for name in long_names)
+        assert long_names[0] != long_names[1]
+        # A cut that lands on a hyphen does not leave a double hyphen before the hash
+        assert not target_group_name('abcdefghijklmnopqrstuv', 'x').startswith('abcdefghijklmnopqrstuv--')
+        assert target_group_name('web', 'angular2') != target_group_name('web', 'angular2', '-prod')
@@ -0,0 +1,274 @@
+"""Application and network load balancers in front of the cluster workloads.
+
+config.json may list load balancers:
+
+    "load_balancers": [{
+        "name": "web",
+        "type": "application",
+        "scheme": "internet-facing",
+        "idle_timeout": 60,
+        "deregistration_delay": 30,
+        "listeners": [{"port": 80, "protocol": "HTTP", "rules": [
+            {"service": "angular2", "paths": ["/*"], "priority": 100}
+        ]}]
+    }]
+
+Internet-facing load balancers go in the subnets tagged kubernetes.io/role/elb,
+internal ones in those tagged kubernetes.io/role/internal-elb. Every service a
+rule (or, for a network load balancer, a listener) names gets an IP-mode target
+group on its workload's container port, so traffic goes straight to the pods
+instead of through a NodePort. The AWS Load Balancer Controller registers the
+pods with a TargetGroupBinding for the exported target group ARN. Cross-zone
+load balancing and HTTP/2 are on.
+
+Access logs are opt-in:
+
+    "lb_access_logs": {"bucket_prefix": "training-trinet", "expiration_days": 30}
+
+Load balancers can only log to a bucket in their own region, and a bucket
+policy replaces whatever policy the bucket had. Each stack (one per
+environment and region) therefore creates and owns its own log bucket,
+<bucket_prefix>-lb-logs-<region><name_suffix>, and logs go under
+lb-logs/<name>/.
+"""
+import hashlib
+import json
+
+from constructs import Construct
+from cdktf import TerraformOutput
+
+import tracing
+from stacks import DEFAULT_REGION, camel_case
+
+LB_TYPES = {'application': 'HTTP', 'network': 'TCP'}
+DEFAULT_SSL_POLICY = 'ELBSecurityPolicy-TLS13-1-2-2021-06'
+ACCESS_LOG_PREFIX = 'lb-logs'
+MAX_TARGET_GROUP_NAME = 32
+
+
+def service_target(config, alias):
+    """{'port', 'health_check_path'} of the workload a rule forwards to."""
+    for cluster in config['eks_clusters']:
+        if cluster['alias'] == alias:
+            workload = cluster.get('workload', {})
+            return {'port': workload.get('container_port', 8080),
+                    'health_check_path': workload.get('readiness_probe', {}).get('path', '/')}
+    raise KeyError(f"Load balancer rule names unknown service {alias}")
+
+
+def listener_services(load_balancer):
+    """Aliases of the services a load balancer's listeners and rules forward to, in order."""
+    services = []
+    for listener in load_balancer.get('listeners', []):
+        services += [rule['service'] for rule in listener.get('rules', [])]
+        if listener.get('service'):
+            services.append(listener['service'])
+    return list(dict.fromkeys(services))
+
+
+def referenced_services(config):
+    """Aliases of every service any load balancer in config forwards to."""
+    return list(dict.fromkeys(alias for load_balancer in config.get('load_balancers', [])
+                              for alias in listener_services(load_balancer)))
+
+
+def target_group_name(load_balancer_name, alias, suffix=''):
+    """A target group name within the 32 character limit, unique per load balancer, service and suffix.
+
+    The readable part is cut to fit and the hash of the full name keeps
+    truncated names apart; the result never ends in '-'.
+    """
+    digest = hashlib.sha256(f"{load_balancer_name}{suffix}/{alias}".encode()).hexdigest()[:8]
+    stem = f"{load_balancer_name}-{alias}"[:MAX_TARGET_GROUP_NAME - len(digest) - 1].rstrip('-')
+    return f"{stem}-{digest}"
+
+
+def access_logs_bucket_name(config):
+    """The cell's own access log bucket, or None when lb_access_logs is not configured."""
+    access_logs = config.get('lb_access_logs')
+    if access_logs is None:
+        return None
+    if not access_logs.get('bucket_prefix'):
+        raise ValueError("lb_access_logs needs a bucket_prefix (bucket names are global)")
+    region = config.get('region', DEFAULT_REGION)
+    name = f"{access_logs['bucket_prefix']}-{ACCESS_LOG_PREFIX}-{region}{config.get('name_suffix', '')}"
+    if len(name) > 63:
+        raise ValueError(f"Access log bucket name {name} is longer than 63 characters")
+    return name
+
+
+def access_logs_policy(bucket, elb_account_arn):
+    """Bucket policy letting ALB and NLB log delivery write under lb-logs/."""
+    objects = f"arn:aws:s3:::{bucket}/{ACCESS_LOG_PREFIX}/*"
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            # Regions launched before August 2022 deliver ALB logs from a regional ELB account
+            {"Effect": "Allow", "Principal": {"AWS": elb_account_arn}, "Action": "s3:PutObject", "Resource": objects},
+            {"Effect": "Allow", "Principal": {"Service": "logdelivery.elasticloadbalancing.amazonaws.com"},
+             "Action": "s3:PutObject", "Resource": objects},
+            # NLB (TLS listener) logs are delivered by CloudWatch Logs delivery
+            {"Effect": "Allow", "Principal": {"Service": "delivery.logs.amazonaws.com"}, "Action": "s3:PutObject",
+             "Resource": objects, "Condition": {"StringEquals": {"s3:x-amz-acl": "bucket-owner-full-control"}}},
+            {"Effect": "Allow", "Principal": {"Service": "delivery.logs.amazonaws.com"}, "Action": "s3:GetBucketAcl",
+             "Resource": f"arn:aws:s3:::{bucket}"},
+        ],
+    }
+
+
+class LoadBalancerConstruct(Construct):
+
+    def __init__(self, scope: Construct, id: str, config: dict, load_balancer: dict, network: dict,
+                 access_logs_bucket: str = None, depends_on: list = None):
+        super().__init__(scope, id)
+
+        from cdktf_cdktf_provider_aws.lb import Lb
+        from cdktf_cdktf_provider_aws.lb_listener import LbListener, LbListenerDefaultAction
+        from cdktf_cdktf_provider_aws.lb_listener_rule import LbListenerRule, LbListenerRuleAction, LbListenerRuleCondition
+        from cdktf_cdktf_provider_aws.lb_target_group import LbTargetGroup
+        from cdktf_cdktf_provider_aws.security_group import SecurityGroup, SecurityGroupEgress, SecurityGroupIngress
+
+        name = load_balancer['name']
+        lb_type = load_balancer.get('type', 'application')
+        if lb_type not in LB_TYPES:
+            raise ValueError(f"Load balancer {name}: unknown type {lb_type}, expected one of {list(LB_TYPES)}")
+        internal = load_balancer.get('scheme', 'internet-facing') == 'internal'
+        suffix = config.get('name_suffix', '')
+        vpc = network['vpc']
+        listeners = load_balancer.get('listeners', [])
+
+        security_groups = None
+        if lb_type == 'application':
+            security_group = SecurityGroup(self, 'SecurityGroup', vpc_id=vpc.id, description=f"{name} load balancer")
+            source = [vpc.cidr_block] if internal else ['0.0.0.0/0']
+            security_group.put_ingress([SecurityGroupIngress(from_port=listener['port'], to_port=listener['port'],
+                                                             protocol='tcp', cidr_blocks=source)
+                                        for listener in listeners])
+            security_group.put_egress([SecurityGroupEgress(from_port=0, to_port=0, protocol='-1',
+                                                           cidr_blocks=[vpc.cidr_block])])
+            security_groups = [security_group.id]
+
+        self.load_balancer = Lb(self, 'LoadBalancer',
+            name=f"{name}{suffix}",
+            load_balancer_type=lb_type,
+            internal=internal,
+            subnets=network['internal_elb_subnet_ids' if internal else 'elb_subnet_ids'],
+            security_groups=security_groups,
+            # Always on for application load balancers, off by default for network ones
+            enable_cross_zone_load_balancing=True if lb_type == 'network' else None,
+            enable_http2=True if lb_type == 'application' else None,
+            idle_timeout=load_balancer.get('idle_timeout', 60) if lb_type == 'application' else None,
+            access_logs={'bucket': access_logs_bucket, 'prefix': f"{ACCESS_LOG_PREFIX}/{name}", 'enabled': True}
+            if access_logs_bucket else None,
+            depends_on=depends_on)
+
+        self.target_groups = {}
+        for alias in listener_services(load_balancer):
+            target = service_target(config, alias)
+            self.target_groups[alias] = LbTargetGroup(self, f"{camel_case(alias)}TargetGroup",
+                name=target_group_name(name, alias, suffix),
+                target_type='ip',
+                port=target['port'],
+                protocol=LB_TYPES[lb_type],
+                vpc_id=vpc.id,
+                # Pods drain in seconds; the 300s default only slows down rollouts
+                deregistration_delay=str(load_balancer.get('deregistration_delay', 30)),
+                load_balancing_cross_zone_enabled='true',
+                health_check={
+                    'path': target['health_check_path'], 'matcher': '200-399', 'interval': 10,
+                    'healthy_threshold': 2, 'unhealthy_threshold': 3,
+                } if lb_type == 'application' else {'protocol': 'TCP', 'interval': 10})
+            TerraformOutput(self, f"{camel_case(alias)}TargetGroupArn",
+                            value=self.target_groups[alias].arn).override_logical_id(f"{name}_{alias}_target_group_arn")
+
+        self.listeners = []
+        for listener in listeners:
+            protocol = listener.get('protocol', LB_TYPES[lb_type])
+            if listener.get('service'):
+                default_action = LbListenerDefaultAction(type='forward',
+                                                         target_group_arn=self.target_groups[listener['service']].arn)
+            elif lb_type == 'application':
+                default_action = LbListenerDefaultAction(type='fixed-response', fixed_response={
+                    'content_type': 'text/plain', 'status_code': '404', 'message_body': 'Not found'})
+            else:
+                raise ValueError(f"Load balancer {name}: network listener {listener['port']} needs a service")
+            lb_listener = LbListener(self, f"Listener{listener['port']}",
+                load_balancer_arn=self.load_balancer.arn,
+                port=listener['port'],
+                protocol=protocol,
+                certificate_arn=listener.get('certificate_arn'),
+                ssl_policy=listener.get('ssl_policy', DEFAULT_SSL_POLICY) if protocol in ('HTTPS', 'TLS') else None,
+                default_action=[default_action])
+            self.listeners.append(lb_listener)
+            for index, rule in enumerate(listener.get('rules', []), start=1):
+                if lb_type != 'application':
+                    raise ValueError(f"Load balancer {name}: listener rules need an application load balancer")
+                conditions = []
+                if rule.get('paths'):
+                    conditions.append(LbListenerRuleCondition(path_pattern={'values': rule['paths']}))
+                if rule.get('hosts'):
+                    conditions.append(LbListenerRuleCondition(host_header={'values': rule['hosts']}))
+                if not conditions:
+                    raise ValueError(f"Load balancer {name}: the rule for {rule['service']} needs paths or hosts")
+                LbListenerRule(self, f"Listener{listener['port']}Rule{index}",
+                    listener_arn=lb_listener.arn,
+                    priority=rule.get('priority', index * 10),
+                    condition=conditions,
+                    action=[LbListenerRuleAction(type='forward', target_group_arn=self.target_groups[rule['service']].arn)])
+
+        TerraformOutput(self, 'DnsName', value=self.load_balancer.dns_name).override_logical_id(f"{name}_lb_dns_name")
+
+
+def build_access_logs_bucket(scope, config):
+    """The stack's own access log bucket and its delivery policy; returns the policy to depend on."""
+    from cdktf_cdktf_provider_aws.data_aws_elb_service_account import DataAwsElbServiceAccount
+    from cdktf_cdktf_provider_aws.s3_bucket import S3Bucket
+    from cdktf_cdktf_provider_aws.s3_bucket_lifecycle_configuration import (
+        S3BucketLifecycleConfiguration,
+        S3BucketLifecycleConfigurationRule,
+        S3BucketLifecycleConfigurationRuleExpiration,
+        S3BucketLifecycleConfigurationRuleFilter,
+    )
+    from cdktf_cdktf_provider_aws.s3_bucket_policy import S3BucketPolicy
+    from cdktf_cdktf_provider_aws.s3_bucket_public_access_block import S3BucketPublicAccessBlock
+    from cdktf_cdktf_provider_aws.s3_bucket_server_side_encryption_configuration import (
+        S3BucketServerSideEncryptionConfigurationA,
+        S3BucketServerSideEncryptionConfigurationRuleA,
+    )
+
+    name = access_logs_bucket_name(config)
+    bucket = S3Bucket(scope, 'LbAccessLogsBucket', bucket=name)
+    S3BucketPublicAccessBlock(scope, 'LbAccessLogsBucketPublicAccessBlock', bucket=bucket.id,
+                              block_public_acls=True, block_public_policy=True,
+                              ignore_public_acls=True, restrict_public_buckets=True)
+    # Log delivery only supports SSE-S3
+    S3BucketServerSideEncryptionConfigurationA(scope, 'LbAccessLogsBucketEncryption', bucket=bucket.id,
+        rule=[S3BucketServerSideEncryptionConfigurationRuleA(
+            apply_server_side_encryption_by_default={'sse_algorithm': 'AES256'})])
+    S3BucketLifecycleConfiguration(scope, 'LbAccessLogsBucketLifecycle', bucket=bucket.id,
+        rule=[S3BucketLifecycleConfigurationRule(
+            id='expire-lb-logs', status='Enabled',
+            filter=[S3BucketLifecycleConfigurationRuleFilter(prefix=f"{ACCESS_LOG_PREFIX}/")],
+            expiration=[S3BucketLifecycleConfigurationRuleExpiration(
+                days=config['lb_access_logs'].get('expiration_days', 30))])])
+    elb_account = DataAwsElbServiceAccount(scope, 'ElbServiceAccount')
+    return S3BucketPolicy(scope, 'LbAccessLogsBucketPolicy', bucket=bucket.id,
+                          policy=json.dumps(access_logs_policy(name, elb_account.arn), indent=2))
+
+
+@tracing.traced('construct.load_balancers')
+def build_load_balancers(scope, config, network):
+    """A LoadBalancerConstruct per entry in config["load_balancers"], keyed by name.
+
+    With "lb_access_logs" set, the stack's own log bucket is created first
+    and every load balancer logs to it.
+    """
+    if not config.get('load_balancers'):
+        return {}
+    bucket = access_logs_bucket_name(config)
+    depends_on = [build_access_logs_bucket(scope, config)] if bucket else None
+    return {
+        load_balancer['name']: LoadBalancerConstruct(scope, f"{camel_case(load_balancer['name'])}LoadBalancer", config,
+                                                     load_balancer, network, bucket, depends_on=depends_on)
+        for load_balancer in config['load_balancers']
+    }
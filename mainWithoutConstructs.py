@@ -36,7 +36,7 @@ from cdktf_cdktf_provider_aws.internet_gateway import InternetGateway
 from cdktf_cdktf_provider_aws.route_table import RouteTable
 from cdktf_cdktf_provider_aws.route import Route
 from cdktf_cdktf_provider_aws.route_table_association import RouteTableAssociation
-from cdktf_cdktf_provider_kubernetes.provider import KubernetesProvider
+from cdktf_cdktf_provider_kubernetes.provider import KubernetesProvider, KubernetesProviderExec
 from cdktf_cdktf_provider_kubernetes.deployment import Deployment
 from cdktf_cdktf_provider_kubernetes.service import Service,ServiceSpecPort
 from cdktf_cdktf_provider_aws.lb import Lb
@@ -44,89 +44,45 @@ from cdktf_cdktf_provider_aws import db_subnet_group
 
 
 from dotenv import load_dotenv
-from eks_token import get_token
 import os
 
+from aws_identity import get_caller_identity
+import eks_token_cache
+from stacks import cluster_node_groups, node_group_construct_id, node_group_kwargs, node_group_name
+
 # Load environment variables from .env file
 load_dotenv()
 
 def get_eks_token(cluster_name):
-    #eks_client = boto3.client('eks')
-    #response = eks_client.get_token(clusterName=cluster_name)
-    token = get_token(cluster_name=cluster_name)['status']['token']
-    return token
-
+    # Tokens are reused until shortly before they expire, see eks_token_cache.py
+    return eks_token_cache.get_eks_token(cluster_name)
 
-def update_aws_auth_configmap_for_all_clusters_2(theClusters):
-    # Initialize the EKS client
-    eks_client = boto3.client('eks')
 
-    # List all EKS clusters
-    #clusters = eks_client.list_clusters()['clusters']
+def update_aws_auth_configmap_for_all_clusters_2(theClusters, role_arns=()):
+    from aws_auth import admin_role_mapping, admin_user_mapping, reconcile_clusters
 
     # Get the current AWS user
-    sts_client = boto3.client('sts')
-    current_user_arn = sts_client.get_caller_identity()["Arn"]
-
-    for cluster_name in theClusters:
-        # Get the cluster details
-        cluster_info = eks_client.describe_cluster(name=cluster_name)
-        cluster_endpoint = cluster_info['cluster']['endpoint']
-        cluster_cert = cluster_info['cluster']['certificateAuthority']['data']
-
-        # Load kubeconfig for the cluster
-        configuration = client.Configuration()
-        configuration.host = cluster_endpoint
-        configuration.verify_ssl = True
-
-        # Decode the base64 certificate and write it to a temporary file
-        cert_file = "/tmp/eks_cert.pem"
-        with open(cert_file, "w") as f:
-            f.write(base64.b64decode(cluster_cert).decode('utf-8'))
-        configuration.ssl_ca_cert = cert_file
-
-        configuration.api_key = {"authorization": f"Bearer {get_eks_token(cluster_name)}"}
-        client.Configuration.set_default(configuration)
-
-        # Create a Kubernetes API client
-        v1 = client.CoreV1Api()
+    current_user_arn = get_caller_identity()["Arn"]
 
-        try:
-            # Get the aws-auth ConfigMap
-            config_map = v1.read_namespaced_config_map("aws-auth", "kube-system")
-
-            # Check if the user is already in the mapUsers
-            map_users = config_map.data.get("mapUsers", "[]")
-            map_users_list = json.loads(map_users)
-            user_exists = any(user['userarn'] == current_user_arn for user in map_users_list)
-
-            if not user_exists:
-                # Add the current user to the mapUsers section
-                map_users_list.append({
-                    "userarn": current_user_arn,
-                    "username": "admin",
-                    "groups": ["system:masters"]
-                })
-                config_map.data["mapUsers"] = json.dumps(map_users_list)
-
-                # Update the ConfigMap
-                v1.replace_namespaced_config_map("aws-auth", "kube-system", config_map)
-                print(f"Added {current_user_arn} to aws-auth ConfigMap for cluster {cluster_name}.")
-            else:
-                print(f"{current_user_arn} is already present in aws-auth ConfigMap for cluster {cluster_name}.")
-        except ApiException as e:
-            print(f"Exception when updating aws-auth ConfigMap for cluster {cluster_name}: {e}")
+    # Clusters are reconciled in parallel, each with its own Kubernetes client
+    results = reconcile_clusters(theClusters,
+                                 map_roles=[admin_role_mapping(role_arn) for role_arn in role_arns],
+                                 map_users=[admin_user_mapping(current_user_arn)])
+    for cluster_name, result in results.items():
+        if result['outcome'] == 'error':
+            print(f"Exception when updating aws-auth ConfigMap for cluster {cluster_name}: {result['error']}")
+        else:
+            print(f"aws-auth ConfigMap for cluster {cluster_name}: {result['outcome']}.")
+    print("EKS token cache:", eks_token_cache.default_cache().stats())
+    return results
 
 
 
 
     
 def get_current_user_role_name():
-    # Initialize the STS client
-    sts_client = boto3.client('sts')
-
     # Get the current user's ARN
-    current_user_arn = sts_client.get_caller_identity()["Arn"]
+    current_user_arn = get_caller_identity()["Arn"]
 
     print("arn is:",current_user_arn)
     return "fullstackappuser"
@@ -255,7 +211,7 @@ class MyStack(TerraformStack):
 
 
 
-        update_aws_auth_configmap_for_all_clusters_2(  cluster['name']  for cluster in config['eks_clusters'])
+        # aws-auth is reconciled after apply by postdeploy.py, not while synthesizing
         
         # Create an S3 bucket named 'reports'
         reports_bucket = S3Bucket(self, 'ReportsBucket', bucket=config['s3_bucket']['name'])
@@ -277,15 +233,21 @@ class MyStack(TerraformStack):
         # Create an ECR repository
         ecr_repository = EcrRepository(self, config['ecrRepo']['name'], name=config['ecrRepo']['name'])
 
-        # Create EKS node groups for each cluster
-        for alias, eks_cluster in eks_clusters.items():
-            EksNodeGroup(self, f"{alias.capitalize()}NodeGroup", cluster_name=eks_cluster.name, node_role_arn=eks_node_role.arn, subnet_ids=[subnet1.id, subnet2.id], scaling_config=config['node_group'],instance_types=["t2.micro"])
+        # Create EKS node groups for each cluster from its capacity profile, see stacks.cluster_node_groups
+        for cluster in config['eks_clusters']:
+            alias = cluster['alias']
+            for node_group in cluster_node_groups(config, cluster):
+                EksNodeGroup(self, f"{alias.capitalize()}{node_group_construct_id(node_group)}", cluster_name=eks_clusters[alias].name, node_group_name=node_group_name(alias, node_group) if node_group['name'] else None, node_role_arn=eks_node_role.arn, subnet_ids=[subnet1.id, subnet2.id], **node_group_kwargs(node_group, cluster['name'], config.get('autoscaler')))
 
-        # Retrieve EKS tokens and configure Kubernetes providers
+        # Configure Kubernetes providers; terraform fetches a token with
+        # `aws eks get-token` when it needs one instead of synth baking one in
         for alias, eks_cluster in eks_clusters.items():
-            token = get_eks_token(eks_cluster.name)
             cert_value = Fn.base64decode(eks_cluster.certificate_authority.get(0).data)
-            theProvider=KubernetesProvider(self, f"{alias.capitalize()}K8sProvider", host=eks_cluster.endpoint, token=token, cluster_ca_certificate=cert_value, alias=alias)
+            theProvider=KubernetesProvider(self, f"{alias.capitalize()}K8sProvider", host=eks_cluster.endpoint, cluster_ca_certificate=cert_value, alias=alias, exec=[KubernetesProviderExec(
+                api_version='client.authentication.k8s.io/v1beta1',
+                command='aws',
+                args=['eks', 'get-token', '--cluster-name', eks_cluster.name, '--region', 'us-east-1'],
+            )])
             #Service(self, f"{alias.capitalize()}Service", metadata={'name': f'{alias}-service'}, spec={
             #    'selector': {'app': alias},
             #    'port': [ServiceSpecPort(port=80, target_port='80')],
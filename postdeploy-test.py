@@ -0,0 +1,88 @@
+import threading
+
+import postdeploy
+
+CONFIG = {
+    'region': 'us-east-1',
+    'eks_clusters': [{'name': 'angularnew-cs', 'alias': 'angular2'}],
+    'node_group': {'desired_size': 2, 'max_size': 2, 'min_size': 1},
+}
+
+
+class FakeEks:
+
+    class exceptions:
+        class ResourceNotFoundException(Exception):
+            pass
+
+    def __init__(self, status, barrier=None):
+        self.status = status
+        self.barrier = barrier
+
+    def describe_cluster(self, name):
+        if self.barrier:
+            # Raises BrokenBarrierError unless the other regions are polled at the same time
+            self.barrier.wait(timeout=10)
+        return {'cluster': {'name': name, 'status': self.status}}
+
+
+class TestClusterTargets:
+
+    def test_single_cell(self):
+        assert postdeploy.cluster_targets(CONFIG) == [
+            {'name': 'angularnew-cs', 'alias': 'angular2', 'region': 'us-east-1', 'label': 'angularnew-cs'}]
+
+    def test_matrix_labels_include_the_region(self):
+        config = dict(CONFIG, deployments={'environments': {'dev': {}}, 'regions': ['us-east-1', 'eu-west-1']})
+        assert [target['label'] for target in postdeploy.cluster_targets(config)] == [
+            'angularnew-cs-dev@us-east-1', 'angularnew-cs-dev@eu-west-1']
+
+    def test_region_override_lists_each_cluster_once(self):
+        config = dict(CONFIG, deployments={'environments': {'dev': {}, 'prod': {}},
+                                           'regions': ['us-east-1', 'eu-west-1']})
+        assert postdeploy.cluster_targets(config, region='us-west-2') == [
+            {'name': 'angularnew-cs-dev', 'alias': 'angular2', 'region': 'us-west-2', 'label': 'angularnew-cs-dev'},
+            {'name': 'angularnew-cs-prod', 'alias': 'angular2', 'region': 'us-west-2', 'label': 'angularnew-cs-prod'},
+        ]
+
+
+class TestPipeline:
+
+    def test_phases_run_in_order_and_stop_at_the_first_failure(self):
+        calls = []
+
+        def phase(name, ok):
+            def run(targets):
+                calls.append(name)
+                return ok, {target['label']: name for target in targets}
+            return run
+
+        report = postdeploy.run_pipeline(postdeploy.cluster_targets(CONFIG),
+                                         [('wait', phase('wait', True)), ('aws-auth', phase('aws-auth', False)),
+                                          ('kubeconfig', phase('kubeconfig', True))])
+        assert calls == ['wait', 'aws-auth']
+        assert report['wait']['ok'] and report['wait']['results'] == {'angularnew-cs': 'wait'}
+        assert report['aws-auth']['ok'] is False
+        assert report['kubeconfig'] == {'ok': None, 'skipped': True}
+
+    def test_wait_phase_uses_a_client_per_region(self):
+        regions = []
+
+        def factory(region):
+            regions.append(region)
+            return FakeEks('ACTIVE' if region == 'us-east-1' else 'FAILED')
+
+        config = dict(CONFIG, deployments={'environments': {'dev': {}}, 'regions': ['us-east-1', 'eu-west-1']})
+        ok, results = postdeploy.phase_wait(postdeploy.cluster_targets(config), eks_client_factory=factory)
+        assert sorted(regions) == ['eu-west-1', 'us-east-1']
+        assert not ok
+        assert results['angularnew-cs-dev@us-east-1']['outcome'] == 'active'
+        assert results['angularnew-cs-dev@eu-west-1']['outcome'] == 'failed'
+
+    def test_wait_phase_runs_the_regions_concurrently(self):
+        barrier = threading.Barrier(2)
+        config = dict(CONFIG, deployments={'environments': {'dev': {}}, 'regions': ['us-east-1', 'eu-west-1']})
+        ok, results = postdeploy.phase_wait(postdeploy.cluster_targets(config),
+                                            eks_client_factory=lambda region: FakeEks('ACTIVE', barrier))
+        assert ok
+        assert {result['outcome'] for result in results.values()} == {'active'}
@@ -0,0 +1,193 @@
+"""Post-deploy pipeline: the live AWS and Kubernetes steps that synth no longer does.
+
+Synth (main.py) only builds the construct tree; the account id comes from a
+Terraform data source and nothing talks to AWS. Once the stacks are applied,
+run the runtime steps here, all of them or one phase at a time:
+
+    pipenv run python deploy.py apply && pipenv run python postdeploy.py
+    pipenv run python postdeploy.py --phase aws-auth --role-arn arn:aws:iam::123456789012:role/admin
+
+Phases, in order:
+
+    wait        poll until every cluster is ACTIVE (eks_waiter.py)
+    aws-auth    map the caller and --role-arn roles to system:masters (aws_auth.py)
+    kubeconfig  add a kubeconfig context per cluster; kubectl gets tokens through
+                `aws eks get-token` exec auth
+
+The wait and aws-auth phases handle every region at the same time, each with
+its own EKS client, so a multi-region matrix waits as long as its slowest
+region. The pipeline stops at the first phase that fails, later phases are
+skipped.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from deployment_matrix import cell_config, expand_cells
+from process_runner import run_streamed
+
+PHASES = ['wait', 'aws-auth', 'kubeconfig']
+DEFAULT_WAIT_TIMEOUT = 30 * 60
+
+
+def cluster_targets(config, region=None):
+    """One {'name', 'alias', 'region', 'label'} dict per distinct (cluster name, region) of the matrix cells.
+
+    With region set, cells of one environment in several regions all map to
+    the same cluster, which is then listed once.
+    """
+    targets = {}
+    for cell in expand_cells(config):
+        for cluster in cell_config(config, cell).get('eks_clusters', []):
+            key = (cluster['name'], region or cell['region'])
+            targets.setdefault(key, {'name': cluster['name'], 'alias': cluster['alias'], 'region': key[1]})
+    regions = {cluster_region for _, cluster_region in targets}
+    for target in targets.values():
+        # The same environment's clusters share a name across regions
+        target['label'] = target['name'] if len(regions) == 1 else f"{target['name']}@{target['region']}"
+    return list(targets.values())
+
+
+def _by_region(targets):
+    regions = defaultdict(list)
+    for target in targets:
+        regions[target['region']].append(target)
+    return regions
+
+
+def _for_each_region(targets, run):
+    """{region: run(region, region_targets)}, with the regions running concurrently."""
+    regions = _by_region(targets)
+    with ThreadPoolExecutor(max_workers=max(1, len(regions))) as pool:
+        futures = {region: pool.submit(run, region, region_targets) for region, region_targets in regions.items()}
+    return {region: future.result() for region, future in futures.items()}
+
+
+def _eks_client(region):
+    import boto3
+
+    return boto3.client('eks', region_name=region)
+
+
+def phase_wait(targets, eks_client_factory=_eks_client, timeout=DEFAULT_WAIT_TIMEOUT):
+    """Wait for every cluster to become ACTIVE. Returns (ok, {label: report})."""
+    from eks_waiter import ClusterWaitError, wait_for_clusters
+
+    def wait(region, region_targets):
+        try:
+            return True, wait_for_clusters([target['name'] for target in region_targets],
+                                           eks_client=eks_client_factory(region), timeout=timeout)
+        except ClusterWaitError as e:
+            logging.error(str(e))
+            return False, e.report
+
+    ok = True
+    results = {}
+    regions = _by_region(targets)
+    for region, (region_ok, report) in _for_each_region(targets, wait).items():
+        ok = ok and region_ok
+        results.update({target['label']: report[target['name']] for target in regions[region]})
+    return ok, results
+
+
+def phase_aws_auth(targets, eks_client_factory=_eks_client, role_arns=(), token_provider=None):
+    """Reconcile aws-auth on every cluster. Returns (ok, {label: result})."""
+    from aws_auth import admin_role_mapping, admin_user_mapping, reconcile_clusters
+    from aws_identity import get_caller_identity
+    import eks_token_cache
+
+    map_users = [admin_user_mapping(get_caller_identity()['Arn'])]
+    map_roles = [admin_role_mapping(role_arn) for role_arn in role_arns]
+
+    def reconcile(region, region_targets):
+        provider = token_provider or (lambda name: eks_token_cache.get_eks_token(name, region_name=region))
+        return reconcile_clusters([target['name'] for target in region_targets], map_roles, map_users,
+                                  eks_client=eks_client_factory(region), token_provider=provider)
+
+    results = {}
+    regions = _by_region(targets)
+    for region, region_results in _for_each_region(targets, reconcile).items():
+        results.update({target['label']: region_results[target['name']] for target in regions[region]})
+    return all(result['outcome'] != 'error' for result in results.values()), results
+
+
+def update_kubeconfig_argv(target, kubeconfig=None):
+    argv = ['aws', 'eks', 'update-kubeconfig', '--name', target['name'], '--region', target['region'],
+            '--alias', target['label']]
+    if kubeconfig:
+        argv += ['--kubeconfig', kubeconfig]
+    return argv
+
+
+def phase_kubeconfig(targets, kubeconfig=None, timeout=120):
+    """Add a kubeconfig context per cluster, named after its label. Returns (ok, {label: result})."""
+    # Run one at a time: update-kubeconfig rewrites the whole file
+    results = {target['label']: run_streamed(update_kubeconfig_argv(target, kubeconfig), prefix=target['label'],
+                                             timeout=timeout)
+               for target in targets}
+    return all(result['returncode'] == 0 for result in results.values()), results
+
+
+def run_pipeline(targets, phases):
+    """Run [(name, phase)] in order, where phase(targets) returns (ok, results).
+
+    Returns {name: {'ok', 'duration_s', 'results'}}; phases after a failed one
+    get {'ok': None, 'skipped': True}.
+    """
+    report = {}
+    failed = None
+    for name, phase in phases:
+        if failed:
+            logging.error(f"Skipping {name}: phase {failed} failed")
+            report[name] = {'ok': None, 'skipped': True}
+            continue
+        logging.info(f"Post-deploy phase {name} for {len(targets)} clusters")
+        started = time.monotonic()
+        with tracing.span(f"postdeploy.{name}", clusters=len(targets)) as span:
+            ok, results = phase(targets)
+            span.set_attribute('ok', ok)
+        report[name] = {'ok': ok, 'duration_s': round(time.monotonic() - started, 3), 'results': results}
+        if not ok:
+            failed = name
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the post-deploy steps for the clusters in config.json.')
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--phase', action='append', choices=PHASES,
+                        help='phase to run, may be repeated (default: all, in order)')
+    parser.add_argument('--region', help='look for every cluster in this region instead of the ones in config.json')
+    parser.add_argument('--role-arn', action='append', default=[],
+                        help='IAM role to map to system:masters in aws-auth, may be repeated')
+    parser.add_argument('--timeout', type=int, default=DEFAULT_WAIT_TIMEOUT,
+                        help='seconds to wait for the clusters to become active (default: 1800)')
+    parser.add_argument('--kubeconfig', help='kubeconfig file to update (default: ~/.kube/config)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    tracing.configure_from_env()
+
+    with open(args.config) as f:
+        targets = cluster_targets(json.load(f), region=args.region)
+    available = {
+        'wait': lambda targets: phase_wait(targets, timeout=args.timeout),
+        'aws-auth': lambda targets: phase_aws_auth(targets, role_arns=args.role_arn),
+        'kubeconfig': lambda targets: phase_kubeconfig(targets, kubeconfig=args.kubeconfig),
+    }
+    selected = [name for name in PHASES if name in (args.phase or PHASES)]
+    report = run_pipeline(targets, [(name, available[name]) for name in selected])
+
+    for name, entry in report.items():
+        status = 'skipped' if entry.get('skipped') else f"{'ok' if entry['ok'] else 'failed'} in {entry['duration_s']}s"
+        print(f"{name}: {status}")
+    return 0 if all(entry['ok'] for entry in report.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
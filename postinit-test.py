@@ -0,0 +1,164 @@
+import json
+import os
+import stat
+import subprocess
+import sys
+import time
+
+import pytest
+import yaml
+
+import postinit
+
+FAKE_EKSCTL = '''#!/bin/sh
+# Fake eksctl: behaviour depends on the cluster name passed with --name
+while [ $# -gt 0 ]; do
+  if [ "$1" = "--name" ]; then name="$2"; fi
+  shift
+done
+echo "creating cluster $name"
+case "$name" in
+  broken*) echo "AccessDenied" >&2; exit 3 ;;
+  stuck*) sleep 30 ;;
+esac
+sleep 0.3
+echo "cluster $name is ready"
+'''
+
+
+@pytest.fixture
+def fake_eksctl(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'eksctl'
+    script.write_text(FAKE_EKSCTL)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(postinit, 'get_caller_identity',
+                        lambda: {'Account': '123456789012', 'Arn': 'arn:aws:iam::123456789012:user/test'})
+    return script
+
+
+def write_config(tmp_path, names):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({
+        'eks_clusters': [{'name': name, 'alias': name} for name in names],
+        'node_group': {'desired_size': 2, 'max_size': 2, 'min_size': 1},
+    }))
+    return str(path)
+
+
+class TestCreateEksClusters:
+
+    def test_creates_clusters_in_parallel_with_prefixed_output(self, fake_eksctl, tmp_path, capsys):
+        config = write_config(tmp_path, ['one', 'two', 'three', 'four'])
+        started = time.monotonic()
+        results = postinit.create_eks_clusters_from_config(config, concurrency=4, timeout=10)
+
+        assert time.monotonic() - started < 1.0
+        assert {result['returncode'] for result in results.values()} == {0}
+        out = capsys.readouterr().out
+        for name in ['one', 'two', 'three', 'four']:
+            assert f"[{name}] creating cluster {name}" in out
+            assert f"[{name}] cluster {name} is ready" in out
+
+    def test_reports_failures_and_timeouts(self, fake_eksctl, tmp_path, capsys):
+        config = write_config(tmp_path, ['ok', 'broken', 'stuck'])
+        results = postinit.create_eks_clusters_from_config(config, concurrency=3, timeout=1)
+
+        assert results['ok']['returncode'] == 0
+        assert results['broken']['returncode'] == 3
+        assert results['broken']['stderr'] == ['AccessDenied']
+        assert results['stuck']['timed_out']
+        summary = capsys.readouterr().out.splitlines()[-4:]
+        assert summary[0].split() == ['CLUSTER', 'DURATION', 'EXIT', 'CODE', 'RESULT']
+        assert summary[2].split()[2:] == ['3', 'failed']
+        assert summary[3].split()[-2:] == ['timed', 'out']
+
+    def test_region_override_creates_each_cluster_once(self, fake_eksctl, tmp_path, capsys):
+        path = tmp_path / 'config.json'
+        path.write_text(json.dumps({
+            'eks_clusters': [{'name': 'one', 'alias': 'one'}],
+            'node_group': {'desired_size': 2, 'max_size': 2, 'min_size': 1},
+            'deployments': {'environments': {'dev': {}}, 'regions': ['us-east-1', 'us-west-2']},
+        }))
+        results = postinit.create_eks_clusters_from_config(str(path), concurrency=2, timeout=10, region='eu-west-1')
+
+        assert list(results) == ['one-dev']
+        assert capsys.readouterr().out.count('creating cluster one-dev') == 1
+        results = postinit.create_eks_clusters_from_config(str(path), concurrency=2, timeout=10)
+        assert sorted(results) == ['one-dev@us-east-1', 'one-dev@us-west-2']
+
+    def test_main_exit_code(self, fake_eksctl, tmp_path):
+        assert postinit.main(['--config', write_config(tmp_path, ['ok'])]) == 0
+        assert postinit.main(['--config', write_config(tmp_path, ['broken'])]) == 1
+
+
+def test_import_does_not_load_jsii():
+    code = "import sys, postinit; print(sorted({'stacks', 'cdktf', 'deployment_matrix'} & set(sys.modules)))"
+    out = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(postinit.__file__)),
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip() == '[]'
+
+
+GENERAL = {'name': 'general', 'instance_types': ['m6i.large'], 'desired_size': 2, 'max_size': 6, 'min_size': 2}
+SPOT_ARM = {'name': 'spot-arm', 'instance_types': ['m7g.large'], 'capacity_type': 'SPOT', 'desired_size': 0,
+            'max_size': 10, 'min_size': 0, 'labels': {'workload': 'batch'},
+            'taints': [{'key': 'spot', 'value': 'true', 'effect': 'NO_SCHEDULE'}]}
+
+
+class RecordingRunner:
+    """Stands in for run_streamed, keeping each argv and the ClusterConfig file it names."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, argv, prefix=None, timeout=None):
+        config = None
+        if '--config-file' in argv:
+            with open(argv[argv.index('--config-file') + 1]) as f:
+                config = yaml.safe_load(f)
+        self.calls.append((argv, config))
+        return {'returncode': 0, 'timed_out': False, 'duration_s': 1.0}
+
+
+class TestTaintedNodeGroups:
+
+    def create(self, tmp_path, monkeypatch, profile):
+        path = tmp_path / 'config.json'
+        path.write_text(json.dumps({
+            'capacity_profiles': {'mixed': profile},
+            'eks_clusters': [{'name': 'one', 'alias': 'one', 'capacity_profile': 'mixed'}],
+        }))
+        runner = RecordingRunner()
+        monkeypatch.setattr(postinit, 'run_streamed', runner)
+        monkeypatch.setattr(postinit, 'get_caller_identity',
+                            lambda: {'Account': '123456789012', 'Arn': 'arn:aws:iam::123456789012:user/test'})
+        postinit.create_eks_clusters_from_config(str(path), timeout=10)
+        return runner.calls
+
+    def test_flags_refuse_taints(self):
+        node_group = {'name': 'spot-arm', 'instance_types': ['m7g.large'], 'capacity_type': 'SPOT',
+                      'scaling_config': {}, 'labels': {}, 'taints': SPOT_ARM['taints']}
+        with pytest.raises(ValueError):
+            postinit.eksctl_node_group_flags('one', node_group)
+
+    def test_tainted_node_group_goes_through_a_cluster_config(self, tmp_path, monkeypatch):
+        calls = self.create(tmp_path, monkeypatch, [GENERAL, SPOT_ARM])
+
+        assert calls[0][0][:3] == ['eksctl', 'create', 'cluster']
+        assert 'one-general' in calls[0][0]
+        argv, config = calls[1]
+        assert argv[:4] == ['eksctl', 'create', 'nodegroup', '--config-file']
+        assert config['metadata'] == {'name': 'one', 'region': 'us-east-1'}
+        managed = config['managedNodeGroups'][0]
+        assert managed['name'] == 'one-spot-arm' and managed['spot']
+        assert managed['taints'] == [{'key': 'spot', 'value': 'true', 'effect': 'NoSchedule'}]
+        assert managed['labels'] == {'workload': 'batch'}
+
+    def test_tainted_first_node_group_is_added_after_the_cluster(self, tmp_path, monkeypatch):
+        calls = self.create(tmp_path, monkeypatch, [SPOT_ARM, GENERAL])
+
+        assert '--without-nodegroup' in calls[0][0]
+        assert calls[1][1]['managedNodeGroups'][0]['name'] == 'one-spot-arm'
+        assert calls[2][0][:3] == ['eksctl', 'create', 'nodegroup'] and 'one-general' in calls[2][0]
@@ -1,61 +1,206 @@
+import argparse
 import json
-import subprocess
 import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import yaml
 
-def run_command(command):
-    """Run a shell command and return the output."""
-    try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error executing command: {e}")
-        logging.error(f"Output: {e.output}")
-        return None
+import tracing
+from aws_identity import get_caller_identity
+from process_runner import run_streamed
+
+DEFAULT_TIMEOUT = 45 * 60  # eksctl create cluster usually takes 15-20 minutes
+EKSCTL_API_VERSION = "eksctl.io/v1alpha5"
+
+
+def eksctl_node_group_flags(alias, node_group):
+    """eksctl flags for one entry of stacks.cluster_node_groups without taints."""
+    # stacks pulls in jsii, so it is only imported by the functions that need it
+    from stacks import node_group_name
+
+    if node_group.get("taints"):
+        # Dropping them would leave Cluster Autoscaler's node template (stacks.autoscaler_tags) out of step
+        raise ValueError(f"Node group {node_group_name(alias, node_group)} has taints, "
+                         "which eksctl only takes from a ClusterConfig file")
+    scaling = node_group["scaling_config"]
+    flags = [
+        "--nodegroup-name", node_group_name(alias, node_group),
+        "--nodes", str(scaling.get("desired_size", 2)),
+        "--nodes-min", str(scaling.get("min_size", 1)),
+        "--nodes-max", str(scaling.get("max_size", 2)),
+    ]
+    if node_group["name"] is None:
+        return flags + ["--node-type", node_group["instance_types"][0]]
+    # eksctl picks the AMI architecture from the instance types
+    flags += ["--instance-types", ",".join(node_group["instance_types"])]
+    if node_group["capacity_type"] == "SPOT":
+        flags.append("--spot")
+    if node_group["labels"]:
+        flags += ["--node-labels", ",".join(f"{key}={value}" for key, value in node_group["labels"].items())]
+    return flags
+
+
+def eksctl_cluster_config(cluster_name, alias, node_group, region):
+    """An eksctl ClusterConfig document with one managed node group, taints included."""
+    from stacks import TAINT_EFFECTS, node_group_name
+
+    scaling = node_group["scaling_config"]
+    managed = {
+        "name": node_group_name(alias, node_group),
+        "instanceTypes": list(node_group["instance_types"]),
+        "spot": node_group["capacity_type"] == "SPOT",
+        "desiredCapacity": scaling.get("desired_size", 2),
+        "minSize": scaling.get("min_size", 1),
+        "maxSize": scaling.get("max_size", 2),
+        "labels": dict(node_group["labels"]),
+        "taints": [{"key": taint["key"], "value": taint.get("value", ""), "effect": TAINT_EFFECTS[taint["effect"]]}
+                   for taint in node_group["taints"]],
+    }
+    return {
+        "apiVersion": EKSCTL_API_VERSION,
+        "kind": "ClusterConfig",
+        "metadata": {"name": cluster_name, "region": region},
+        "managedNodeGroups": [managed],
+    }
+
+
+def eksctl_create_cluster_argv(cluster_name, alias, node_group, region):
+    """eksctl create cluster with node_group, or without any node group when it is None."""
+    flags = ["--without-nodegroup"] if node_group is None else eksctl_node_group_flags(alias, node_group)
+    return [
+        "eksctl", "create", "cluster",
+        "--name", cluster_name,
+        "--region", region,
+        *flags,
+        "--verbose", "4",
+    ]
+
+
+def eksctl_create_nodegroup_argv(cluster_name, alias, node_group, region, config_file=None):
+    """eksctl create nodegroup from flags, or from config_file (see eksctl_cluster_config) when given."""
+    if config_file:
+        return ["eksctl", "create", "nodegroup", "--config-file", config_file, "--verbose", "4"]
+    return [
+        "eksctl", "create", "nodegroup",
+        "--cluster", cluster_name,
+        "--region", region,
+        *eksctl_node_group_flags(alias, node_group),
+        "--verbose", "4",
+    ]
+
+
+def create_node_group(cluster_name, alias, node_group, region, label, timeout=DEFAULT_TIMEOUT):
+    """Add one node group to an existing cluster, through a ClusterConfig file when it has taints."""
+    if not node_group.get("taints"):
+        argv = eksctl_create_nodegroup_argv(cluster_name, alias, node_group, region)
+        return run_streamed(argv, prefix=label, timeout=timeout)
+    with tempfile.TemporaryDirectory() as directory:
+        config_file = os.path.join(directory, "cluster.yaml")
+        with open(config_file, "w") as f:
+            yaml.safe_dump(eksctl_cluster_config(cluster_name, alias, node_group, region), f, sort_keys=False)
+        argv = eksctl_create_nodegroup_argv(cluster_name, alias, node_group, region, config_file=config_file)
+        return run_streamed(argv, prefix=label, timeout=timeout)
+
+
+def print_summary(results):
+    """Print one row per cluster with its duration and eksctl exit code."""
+    rows = [("CLUSTER", "DURATION", "EXIT CODE", "RESULT")]
+    for cluster_name, result in results.items():
+        if result['timed_out']:
+            outcome = "timed out"
+        elif result['returncode'] == 0:
+            outcome = "created"
+        else:
+            outcome = "failed"
+        minutes, seconds = divmod(int(result['duration_s']), 60)
+        rows.append((cluster_name, f"{minutes}m{seconds:02d}s", str(result['returncode']), outcome))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def create_eks_clusters_from_config(config_file, concurrency=1, timeout=DEFAULT_TIMEOUT, region=None):
+    """Create every cluster in config_file with eksctl, up to concurrency at a time.
+
+    Clusters are created in the config's region, or in every environment and
+    region of its "deployments" matrix; region overrides both. A cluster that
+    several cells place in the same region (an environment deployed to more
+    than one region, all moved to region) is created once. Output of each
+    eksctl process is streamed with a [cluster-name] prefix. Returns
+    {cluster_name: result} as produced by process_runner.run_streamed.
+    """
+    from deployment_matrix import cell_config, expand_cells
+    from stacks import cluster_node_groups
 
-def create_eks_clusters_from_config(config_file):
     # Load configuration
     with open(config_file) as f:
         config = json.load(f)
 
-    node_group_config = config.get("node_group", {})
-    desired_size = node_group_config.get("desired_size", 2)
-    max_size = node_group_config.get("max_size", 2)
-    min_size = node_group_config.get("min_size", 1)
+    identity = get_caller_identity()
+    logging.info(f"Provisioning clusters in account {identity['Account']} as {identity['Arn']}")
+
+    jobs = {}
+    for cell in expand_cells(config):
+        derived = cell_config(config, cell)
+        for cluster in derived.get("eks_clusters", []):
+            key = (cluster.get("name"), region or cell['region'])
+            if key in jobs:
+                logging.warning(f"Cluster {key[0]} is listed more than once for {key[1]}, creating it once")
+                continue
+            jobs[key] = (cluster, cluster_node_groups(derived, cluster), key[1])
+    regions = {cluster_region for _, cluster_region in jobs}
 
-    for cluster in config.get("eks_clusters", []):
+    def create(job):
+        cluster, node_groups, cluster_region = job
         cluster_name = cluster.get("name")
-        alias = cluster.get("alias")
-
-        # Generate eksctl command
-        eksctl_command = (
-            f"eksctl create cluster "
-            f"--name {cluster_name} "
-            f"--region us-west-1 "  # Specify the region as needed
-            f"--nodegroup-name {alias}-nodegroup "
-            f"--nodes {desired_size} "
-            f"--nodes-min {min_size} "
-            f"--nodes-max {max_size} "
-            f"--node-type t2.micro  --verbose 4"  # Specify the instance type as needed
-        )
-
-        # Run eksctl command
-        logging.info(f"Creating EKS cluster: {cluster_name}")
-        output = run_command(eksctl_command)
-        if output:
-            logging.info(f"Cluster {cluster_name} created successfully.")
-            logging.info(output)
-
-            # Output cluster details
-            logging.info(f"Cluster Name: {cluster_name}")
-            logging.info(f"Node Group Name: {alias}nodegroup")
-            logging.info(f"Desired Size: {desired_size}")
-            logging.info(f"Max Size: {max_size}")
-            logging.info(f"Min Size: {min_size}")
+        # The same environment's clusters share a name across regions
+        label = cluster_name if len(regions) == 1 else f"{cluster_name}@{cluster_region}"
+        logging.info(f"Creating EKS cluster: {cluster_name} in {cluster_region}")
+        # eksctl creates one node group with the cluster, the others are added to it afterwards; a tainted
+        # first node group is added afterwards too, since create cluster only takes node group flags
+        with_cluster = None if node_groups[0].get("taints") else node_groups[0]
+        argv = eksctl_create_cluster_argv(cluster_name, cluster.get("alias"), with_cluster, cluster_region)
+        result = run_streamed(argv, prefix=label, timeout=timeout)
+        for node_group in node_groups[1:] if with_cluster else node_groups:
+            if result['returncode'] != 0:
+                break
+            duration_s = result['duration_s']
+            result = create_node_group(cluster_name, cluster.get("alias"), node_group, cluster_region, label, timeout)
+            result['duration_s'] = round(result['duration_s'] + duration_s, 3)
+        if result['returncode'] == 0:
+            logging.info(f"Cluster {cluster_name} created successfully in {result['duration_s']}s.")
         else:
             logging.error(f"Failed to create cluster {cluster_name}.")
+        return label, result
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = dict(pool.map(create, jobs.values()))
+
+    print_summary(results)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create the EKS clusters listed in config.json with eksctl.")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="number of clusters to create at the same time (default: 4)")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT,
+                        help="seconds before an eksctl process is killed (default: 2700)")
+    parser.add_argument("--region", help="create every cluster in this region instead of the ones in config.json")
+    args = parser.parse_args(argv)
+
+    # Configure logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    tracing.configure_from_env()
+
+    results = create_eks_clusters_from_config(args.config, concurrency=args.concurrency,
+                                              timeout=args.timeout, region=args.region)
+    return 0 if all(result['returncode'] == 0 for result in results.values()) else 1
+
 
-# Example usage
-create_eks_clusters_from_config('config.json')
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Run subprocesses without a shell, streaming their output line by line.
+
+Every stdout/stderr line is forwarded as soon as it is written, prefixed with
+a label such as the cluster name, so several long-running processes can share
+one terminal. Only the last few lines are kept in memory for error reporting.
+"""
+import collections
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import tracing
+
+_print_lock = threading.Lock()
+
+
+def print_line(prefix, stream, line):
+    """Default line sink: '[prefix] line', stderr lines go to stderr."""
+    target = sys.stderr if stream == 'stderr' else sys.stdout
+    with _print_lock:
+        print(f"[{prefix}] {line}", file=target, flush=True)
+
+
+def _pump(pipe, prefix, stream, on_line, tail):
+    for raw in iter(pipe.readline, ''):
+        line = raw.rstrip('\n')
+        tail.append(line)
+        on_line(prefix, stream, line)
+    pipe.close()
+
+
+def run_streamed(argv, prefix=None, timeout=None, input=None, on_line=print_line, env=None, cwd=None, tail_lines=50):
+    """Run argv to completion and return a result dict.
+
+    The result has argv, returncode, duration_s, timed_out and the last
+    tail_lines lines of stdout and stderr (all of them if tail_lines is None). A process still running after
+    timeout seconds is killed and reported with timed_out=True.
+    """
+    prefix = prefix or argv[0]
+    with tracing.span('subprocess', command=' '.join(argv), label=prefix) as span:
+        result = _run_streamed(argv, prefix, timeout, input, on_line, env, cwd, tail_lines)
+        span.set_attribute('returncode', result['returncode'])
+        span.set_attribute('timed_out', result['timed_out'])
+    return result
+
+
+def _run_streamed(argv, prefix, timeout, input, on_line, env, cwd, tail_lines):
+    started = time.monotonic()
+    try:
+        process = subprocess.Popen(argv, stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1, env=env, cwd=cwd,
+                                   start_new_session=True)
+    except OSError as e:
+        on_line(prefix, 'stderr', f"failed to start {argv[0]}: {e}")
+        return {'argv': argv, 'returncode': None, 'duration_s': 0.0, 'timed_out': False,
+                'stdout': [], 'stderr': [str(e)]}
+
+    tails = {'stdout': collections.deque(maxlen=tail_lines), 'stderr': collections.deque(maxlen=tail_lines)}
+    readers = [threading.Thread(target=_pump, args=(getattr(process, stream), prefix, stream, on_line, tails[stream]),
+                                daemon=True)
+               for stream in ('stdout', 'stderr')]
+    for reader in readers:
+        reader.start()
+    if input is not None:
+        try:
+            process.stdin.write(input)
+        except BrokenPipeError:
+            pass
+        finally:
+            process.stdin.close()
+
+    timed_out = False
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        on_line(prefix, 'stderr', f"timed out after {timeout}s, killing process")
+        # Kill the whole process group so children can't keep the pipes open
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    for reader in readers:
+        reader.join()
+
+    return {
+        'argv': argv,
+        'returncode': process.returncode,
+        'duration_s': round(time.monotonic() - started, 3),
+        'timed_out': timed_out,
+        'stdout': list(tails['stdout']),
+        'stderr': list(tails['stderr']),
+    }
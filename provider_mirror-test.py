@@ -0,0 +1,194 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+from provider_mirror import (
+    MirrorError,
+    build,
+    check,
+    cli_config,
+    mirror_modules,
+    mirror_paths,
+    package_hash_h1,
+    package_hash_zh,
+    parse_lock_file,
+    provider_address,
+    required_providers,
+)
+
+AWS = 'registry.terraform.io/hashicorp/aws'
+KUBERNETES = 'registry.terraform.io/hashicorp/kubernetes'
+
+
+def write_outdir(outdir, stacks):
+    """A cdktf outdir with a manifest and a cdk.tf.json per {stack name: required_providers}."""
+    manifest = {'stacks': {}}
+    for name, providers in stacks.items():
+        directory = outdir / 'stacks' / name
+        directory.mkdir(parents=True)
+        (directory / 'cdk.tf.json').write_text(json.dumps({'terraform': {'required_providers': providers}}))
+        manifest['stacks'][name] = {'dependencies': [], 'workingDirectory': f"stacks/{name}"}
+    (outdir / 'manifest.json').write_text(json.dumps(manifest))
+    return str(outdir)
+
+
+def write_archive(mirror_dir, address, version, platform, content=b'binary'):
+    provider_type = address.rsplit('/', 1)[1]
+    directory = os.path.join(mirror_dir, *address.split('/'))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"terraform-provider-{provider_type}_{version}_{platform}.zip")
+    with zipfile.ZipFile(path, 'w') as package:
+        package.writestr(f"terraform-provider-{provider_type}_v{version}_x5", content)
+    return path
+
+
+def lock_text(entries):
+    blocks = []
+    for address, version, hashes in entries:
+        lines = ''.join(f'    "{value}",\n' for value in hashes)
+        blocks.append(f'provider "{address}" {{\n  version     = "{version}"\n  constraints = "{version}"\n'
+                      f'  hashes = [\n{lines}  ]\n}}\n')
+    return '# This file is maintained automatically by "terraform init".\n\n' + '\n'.join(blocks)
+
+
+class FakeTerraform:
+    """Stands in for run_streamed: mirror writes archives, lock writes a lock file with their h1 hashes."""
+
+    def __init__(self, returncode=0):
+        self.returncode = returncode
+        self.calls = []
+        self.envs = []
+
+    def __call__(self, argv, prefix=None, cwd=None, env=None):
+        self.calls.append((argv, cwd))
+        self.envs.append(env)
+        platforms = [arg.split('=', 1)[1] for arg in argv if arg.startswith('-platform=')]
+        with open(os.path.join(cwd, 'main.tf.json')) as f:
+            required = json.load(f)['terraform']['required_providers']
+        if argv[2] == 'mirror':
+            for requirement in required.values():
+                for platform in platforms:
+                    write_archive(argv[-1], requirement['source'], requirement['version'], platform)
+        elif argv[2] == 'lock':
+            mirror_dir = argv[3].split('=', 1)[1]
+            entries = []
+            for requirement in required.values():
+                address, version = requirement['source'], requirement['version']
+                provider_type = address.rsplit('/', 1)[1]
+                hashes = [package_hash_h1(os.path.join(mirror_dir, *address.split('/'),
+                                                       f"terraform-provider-{provider_type}_{version}_{platform}.zip"))
+                          for platform in platforms]
+                entries.append((address, version, hashes))
+            with open(os.path.join(cwd, '.terraform.lock.hcl'), 'w') as f:
+                f.write(lock_text(entries))
+        return {'returncode': self.returncode}
+
+
+class TestProviders:
+
+    def test_provider_address(self):
+        assert provider_address('aws') == AWS
+        assert provider_address('hashicorp/Kubernetes') == KUBERNETES
+        assert provider_address('example.com/team/thing') == 'example.com/team/thing'
+
+    def test_required_providers_across_stacks(self, tmp_path):
+        outdir = write_outdir(tmp_path, {
+            'network': {'aws': {'source': 'aws', 'version': '6.25.0'}},
+            'cluster': {'aws': {'source': 'aws', 'version': '6.25.0'},
+                        'kubernetes': {'source': 'kubernetes', 'version': '2.38.0'}},
+            'legacy': {'aws': {'source': 'hashicorp/aws', 'version': '5.100.0'}},
+        })
+        assert required_providers(outdir) == {AWS: ['5.100.0', '6.25.0'], KUBERNETES: ['2.38.0']}
+
+    def test_unpinned_provider(self, tmp_path):
+        outdir = write_outdir(tmp_path, {'network': {'aws': {'source': 'aws'}}})
+        with pytest.raises(ValueError):
+            required_providers(outdir)
+
+    def test_one_version_per_module(self):
+        modules = mirror_modules({AWS: ['5.100.0', '6.25.0'], KUBERNETES: ['2.38.0']})
+        assert modules == [
+            {'terraform': {'required_providers': {'aws': {'source': AWS, 'version': '5.100.0'},
+                                                  'kubernetes': {'source': KUBERNETES, 'version': '2.38.0'}}}},
+            {'terraform': {'required_providers': {'aws': {'source': AWS, 'version': '6.25.0'}}}},
+        ]
+
+    def test_cli_config(self):
+        text = cli_config('/cache/mirror', '/cache/plugin-cache', [AWS, KUBERNETES])
+        assert 'plugin_cache_dir   = "/cache/plugin-cache"' in text
+        assert 'path    = "/cache/mirror"' in text
+        assert text.count(f'["{AWS}", "{KUBERNETES}"]') == 2
+        assert 'exclude' in text.split('direct')[1]
+
+
+class TestLockFile:
+
+    def test_parse(self):
+        text = lock_text([(AWS, '6.25.0', ['h1:abc=', 'zh:0123']), (KUBERNETES, '2.38.0', ['h1:def='])])
+        assert parse_lock_file(text) == {
+            AWS: {'version': '6.25.0', 'hashes': ['h1:abc=', 'zh:0123']},
+            KUBERNETES: {'version': '2.38.0', 'hashes': ['h1:def=']},
+        }
+
+    def test_h1_hashes_contents_not_archive(self, tmp_path):
+        first = write_archive(str(tmp_path / 'a'), AWS, '6.25.0', 'linux_amd64')
+        second = str(tmp_path / 'deflated.zip')
+        with zipfile.ZipFile(second, 'w', compression=zipfile.ZIP_DEFLATED) as package:
+            package.writestr('terraform-provider-aws_v6.25.0_x5', b'binary')
+        assert package_hash_zh(first) != package_hash_zh(second)
+        assert package_hash_h1(first) == package_hash_h1(second)
+        assert package_hash_h1(first).startswith('h1:')
+        other = write_archive(str(tmp_path / 'c'), AWS, '6.25.0', 'linux_amd64', content=b'tampered')
+        assert package_hash_h1(other) != package_hash_h1(first)
+
+
+class TestBuild:
+
+    def test_build_and_check(self, tmp_path):
+        outdir = write_outdir(tmp_path / 'out', {'cluster': {
+            'aws': {'source': 'aws', 'version': '6.25.0'}, 'kubernetes': {'source': 'kubernetes', 'version': '2.38.0'}}})
+        cache_dir = str(tmp_path / 'cache')
+        terraform = FakeTerraform()
+        result = build(outdir, ['linux_amd64', 'darwin_arm64'], cache_dir, run=terraform)
+
+        assert result['problems'] == []
+        assert [argv[:3] for argv, _ in terraform.calls] == [['terraform', 'providers', 'mirror'],
+                                                             ['terraform', 'providers', 'lock'],
+                                                             ['terraform', 'init', '-input=false']]
+        assert '-platform=darwin_arm64' in terraform.calls[0][0]
+        # The init that fills the plugin cache goes through the mirror's CLI config
+        assert terraform.envs[2]['TF_CLI_CONFIG_FILE'] == result['cli_config']
+        paths = mirror_paths(cache_dir)
+        with open(result['cli_config']) as f:
+            assert paths['mirror'] in f.read()
+        assert os.path.isdir(paths['plugin_cache'])
+
+    def test_check_catches_tampered_archive(self, tmp_path):
+        outdir = write_outdir(tmp_path / 'out', {'network': {'aws': {'source': 'aws', 'version': '6.25.0'}}})
+        cache_dir = str(tmp_path / 'cache')
+        build(outdir, ['linux_amd64'], cache_dir, run=FakeTerraform())
+        write_archive(mirror_paths(cache_dir)['mirror'], AWS, '6.25.0', 'linux_amd64', content=b'tampered')
+        problems = [problem for found in check(outdir, cache_dir).values() for problem in found]
+        assert len(problems) == 1 and 'linux_amd64' in problems[0]
+
+    def test_check_stack_lock_files(self, tmp_path):
+        outdir = write_outdir(tmp_path / 'out', {'network': {'aws': {'source': 'aws', 'version': '6.25.0'}}})
+        cache_dir = str(tmp_path / 'cache')
+        archive = write_archive(mirror_paths(cache_dir)['mirror'], AWS, '6.25.0', 'linux_amd64')
+        stack_dir = tmp_path / 'out' / 'stacks' / 'network'
+        (stack_dir / '.terraform.lock.hcl').write_text(lock_text([
+            (AWS, '6.25.0', [package_hash_zh(archive)]), (KUBERNETES, '2.38.0', ['h1:def='])]))
+        results = check(outdir, cache_dir)
+        assert results == {str(stack_dir / '.terraform.lock.hcl'): [f"{KUBERNETES} 2.38.0 is locked but not mirrored"]}
+
+    def test_failed_terraform(self, tmp_path):
+        outdir = write_outdir(tmp_path / 'out', {'network': {'aws': {'source': 'aws', 'version': '6.25.0'}}})
+        with pytest.raises(MirrorError):
+            build(outdir, ['linux_amd64'], str(tmp_path / 'cache'), run=FakeTerraform(returncode=1))
+
+    def test_check_without_lock_files(self, tmp_path):
+        outdir = write_outdir(tmp_path / 'out', {'network': {'aws': {'source': 'aws', 'version': '6.25.0'}}})
+        with pytest.raises(MirrorError):
+            check(outdir, str(tmp_path / 'cache'))
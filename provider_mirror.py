@@ -0,0 +1,289 @@
+"""Local Terraform provider mirror and plugin cache for offline `terraform init`.
+
+Every fresh workspace downloads the aws and kubernetes provider binaries
+(several hundred MB) from the registry on init. `build` collects the
+providers the synthesized stacks declare in cdktf.out, mirrors exactly those
+versions for the requested platforms with `terraform providers mirror`,
+records their hashes for every platform in a lock file with `terraform
+providers lock` and writes a CLI config that installs them from the mirror
+only, through a shared plugin cache:
+
+    pipenv run python main.py && pipenv run python provider_mirror.py build
+    eval "$(pipenv run python provider_mirror.py env)"
+    pipenv run python deploy.py plan
+
+With TF_CLI_CONFIG_FILE pointing at that config, init never contacts the
+registry for the mirrored providers and links them from the plugin cache.
+`build` fills the plugin cache for this machine's platform with an init of
+each mirror module, and deploy.py runs init one stack at a time while a
+plugin cache is configured, since terraform does not support concurrent
+installs into a shared cache.
+`check` verifies the mirrored archives against the lock files, both the
+mirror's own and those next to each stack in cdktf.out, so a tampered mirror
+or a lock file pinning a version the mirror lacks is caught before init.
+The mirror directory is what CI should cache between runs.
+"""
+import argparse
+import base64
+import glob
+import hashlib
+import json
+import logging
+import os
+import platform
+import re
+import shlex
+import sys
+import zipfile
+
+from deploy import load_stack_graph
+from process_runner import run_streamed
+
+DEFAULT_CACHE_DIR = os.getenv('TF_PROVIDER_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache',
+                                                                     'srefromnoobtoninja', 'terraform'))
+DEFAULT_REGISTRY = 'registry.terraform.io'
+DEFAULT_NAMESPACE = 'hashicorp'
+LOCK_FILE = '.terraform.lock.hcl'
+
+
+class MirrorError(Exception):
+    pass
+
+
+def mirror_paths(cache_dir=DEFAULT_CACHE_DIR):
+    """Where the mirror, the plugin cache, the mirror's root modules and the CLI config live."""
+    return {
+        'mirror': os.path.join(cache_dir, 'mirror'),
+        'plugin_cache': os.path.join(cache_dir, 'plugin-cache'),
+        'modules': os.path.join(cache_dir, 'modules'),
+        'cli_config': os.path.join(cache_dir, 'terraformrc'),
+    }
+
+
+def host_platform():
+    """The terraform platform name of this machine, e.g. linux_amd64."""
+    machine = platform.machine().lower()
+    arch = {'x86_64': 'amd64', 'amd64': 'amd64', 'aarch64': 'arm64', 'arm64': 'arm64'}.get(machine, machine)
+    return f"{platform.system().lower()}_{arch}"
+
+
+def provider_address(source):
+    """The fully qualified address of a required_providers source: aws -> registry.terraform.io/hashicorp/aws."""
+    parts = source.lower().split('/')
+    if len(parts) == 1:
+        parts = [DEFAULT_REGISTRY, DEFAULT_NAMESPACE] + parts
+    elif len(parts) == 2:
+        parts = [DEFAULT_REGISTRY] + parts
+    return '/'.join(parts)
+
+
+def required_providers(outdir):
+    """{provider address: [versions]} over the required_providers of every stack in a cdktf outdir."""
+    providers = {}
+    for name, stack in load_stack_graph(outdir).items():
+        with open(os.path.join(stack['working_directory'], 'cdk.tf.json')) as f:
+            terraform = json.load(f).get('terraform', {})
+        for local_name, requirement in terraform.get('required_providers', {}).items():
+            address = provider_address(requirement.get('source', local_name))
+            version = requirement.get('version')
+            if not version:
+                raise ValueError(f"Stack {name} does not pin a version for provider {address}")
+            providers.setdefault(address, set()).add(version)
+    return {address: sorted(versions) for address, versions in sorted(providers.items())}
+
+
+def mirror_modules(providers):
+    """Root module documents requiring every provider version, one version of each provider per module.
+
+    terraform providers mirror installs a single version per provider for a
+    module, so stacks pinning different versions of a provider need more than one.
+    """
+    modules = []
+    for address, versions in providers.items():
+        for index, version in enumerate(versions):
+            if index == len(modules):
+                modules.append({'terraform': {'required_providers': {}}})
+            local_name = address.rsplit('/', 1)[1]
+            modules[index]['terraform']['required_providers'][local_name] = {
+                'source': address, 'version': version}
+    return modules
+
+
+def cli_config(mirror_dir, plugin_cache_dir, addresses):
+    """Text of a terraform CLI config installing addresses from mirror_dir only, through plugin_cache_dir."""
+    quoted = ', '.join(json.dumps(address) for address in addresses)
+    return (
+        f"plugin_cache_dir   = {json.dumps(plugin_cache_dir)}\n"
+        "disable_checkpoint = true\n"
+        "\n"
+        "provider_installation {\n"
+        "  filesystem_mirror {\n"
+        f"    path    = {json.dumps(mirror_dir)}\n"
+        f"    include = [{quoted}]\n"
+        "  }\n"
+        "  direct {\n"
+        f"    exclude = [{quoted}]\n"
+        "  }\n"
+        "}\n"
+    )
+
+
+def parse_lock_file(text):
+    """{provider address: {'version', 'hashes'}} from the contents of a .terraform.lock.hcl file."""
+    locked = {}
+    for address, body in re.findall(r'provider\s+"([^"]+)"\s*\{(.*?)\n\}', text, re.DOTALL):
+        version = re.search(r'\bversion\s*=\s*"([^"]+)"', body)
+        locked[address] = {'version': version.group(1) if version else None,
+                           'hashes': re.findall(r'"((?:h1|zh):[^"]+)"', body)}
+    return locked
+
+
+def package_hash_h1(archive):
+    """The h1: hash terraform records for a provider zip: a hash over the hashes of the files it contains."""
+    lines = []
+    with zipfile.ZipFile(archive) as package:
+        for info in sorted(package.infolist(), key=lambda info: info.filename):
+            if info.is_dir():
+                continue
+            with package.open(info) as f:
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            lines.append(f"{digest.hexdigest()}  {info.filename}\n")
+    return 'h1:' + base64.b64encode(hashlib.sha256(''.join(lines).encode()).digest()).decode()
+
+
+def package_hash_zh(archive):
+    """The zh: hash terraform records for a provider zip: the SHA-256 of the archive itself."""
+    digest = hashlib.sha256()
+    with open(archive, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return 'zh:' + digest.hexdigest()
+
+
+def mirrored_archives(mirror_dir, address, version):
+    """{platform: zip path} of the archives of one provider version in a packed mirror."""
+    provider_type = address.rsplit('/', 1)[1]
+    prefix = f"terraform-provider-{provider_type}_{version}_"
+    pattern = os.path.join(mirror_dir, *address.split('/'), f"{prefix}*.zip")
+    return {os.path.basename(path)[len(prefix):-len('.zip')]: path for path in sorted(glob.glob(pattern))}
+
+
+def check_lock(mirror_dir, locked):
+    """Problems (as strings) between the parsed lock file entries and the mirror; empty when they match."""
+    problems = []
+    for address, entry in sorted(locked.items()):
+        archives = mirrored_archives(mirror_dir, address, entry['version'])
+        if not archives:
+            problems.append(f"{address} {entry['version']} is locked but not mirrored")
+        for platform_name, archive in archives.items():
+            if package_hash_h1(archive) not in entry['hashes'] and package_hash_zh(archive) not in entry['hashes']:
+                problems.append(f"{address} {entry['version']} {platform_name}: "
+                                f"{os.path.basename(archive)} matches none of the locked hashes")
+    return problems
+
+
+def lock_files(outdir, cache_dir=DEFAULT_CACHE_DIR):
+    """Lock files to check: the mirror modules' and any next to a synthesized stack."""
+    paths = sorted(glob.glob(os.path.join(mirror_paths(cache_dir)['modules'], '*', LOCK_FILE)))
+    if os.path.exists(os.path.join(outdir, 'manifest.json')):
+        for stack in load_stack_graph(outdir).values():
+            path = os.path.join(stack['working_directory'], LOCK_FILE)
+            if os.path.exists(path):
+                paths.append(path)
+    return paths
+
+
+def check(outdir, cache_dir=DEFAULT_CACHE_DIR):
+    """{lock file path: [problems]} for every lock file; raises MirrorError when there is none."""
+    mirror_dir = mirror_paths(cache_dir)['mirror']
+    paths = lock_files(outdir, cache_dir)
+    if not paths:
+        raise MirrorError("No lock files to check, run `provider_mirror.py build` first")
+    results = {}
+    for path in paths:
+        with open(path) as f:
+            results[path] = check_lock(mirror_dir, parse_lock_file(f.read()))
+    return results
+
+
+def _terraform(argv, cwd, run, env=None):
+    result = run(argv, prefix='terraform', cwd=cwd, env=dict(os.environ, TF_IN_AUTOMATION='1', **(env or {})))
+    if result['returncode'] != 0:
+        raise MirrorError(f"`{' '.join(argv)}` in {cwd} failed with exit code {result['returncode']}")
+    return result
+
+
+def build(outdir, platforms, cache_dir=DEFAULT_CACHE_DIR, run=run_streamed):
+    """Mirror every provider the stacks in outdir use, lock their hashes, write the CLI config and fill the plugin cache.
+
+    Returns {'providers', 'cli_config', 'problems'}; problems lists hash
+    mismatches between the new lock files and the mirror.
+    """
+    paths = mirror_paths(cache_dir)
+    providers = required_providers(outdir)
+    for path in (paths['mirror'], paths['plugin_cache'], paths['modules']):
+        os.makedirs(path, exist_ok=True)
+    platform_flags = [f"-platform={name}" for name in platforms]
+    with open(paths['cli_config'], 'w') as f:
+        f.write(cli_config(paths['mirror'], paths['plugin_cache'], list(providers)))
+    logging.info(f"Wrote the terraform CLI config to {paths['cli_config']}")
+
+    for index, module in enumerate(mirror_modules(providers)):
+        module_dir = os.path.join(paths['modules'], str(index))
+        os.makedirs(module_dir, exist_ok=True)
+        with open(os.path.join(module_dir, 'main.tf.json'), 'w') as f:
+            json.dump(module, f, indent=2)
+        # Already mirrored archives are kept, so a rebuild only downloads what is new
+        _terraform(['terraform', 'providers', 'mirror'] + platform_flags + [paths['mirror']], module_dir, run)
+        # Hashes for every platform, taken from the mirror rather than the registry
+        _terraform(['terraform', 'providers', 'lock', f"-fs-mirror={paths['mirror']}"] + platform_flags,
+                   module_dir, run)
+        # Installs from the mirror into the plugin cache, so stack inits only link what they need
+        _terraform(['terraform', 'init', '-input=false', '-backend=false'], module_dir, run,
+                   env=environment(cache_dir))
+        logging.info(f"Mirrored {sorted(module['terraform']['required_providers'])} for {', '.join(platforms)}")
+
+    problems = [problem for found in check(outdir, cache_dir).values() for problem in found]
+    return {'providers': providers, 'cli_config': paths['cli_config'], 'problems': problems}
+
+
+def environment(cache_dir=DEFAULT_CACHE_DIR):
+    """Variables pointing terraform at the mirror's CLI config."""
+    return {'TF_CLI_CONFIG_FILE': mirror_paths(cache_dir)['cli_config']}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build and check a local terraform provider mirror.')
+    parser.add_argument('command', choices=['build', 'check', 'env'])
+    parser.add_argument('--outdir', default=os.getenv('CDKTF_OUTDIR', 'cdktf.out'))
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='where the mirror, plugin cache and CLI config go (default: %(default)s)')
+    parser.add_argument('--platform', action='append', dest='platforms',
+                        help=f"platform to mirror, may be repeated (default: linux_amd64 and {host_platform()})")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'env':
+        for name, value in environment(args.cache_dir).items():
+            print(f"export {name}={shlex.quote(value)}")
+        return 0
+    try:
+        if args.command == 'build':
+            platforms = args.platforms or sorted({'linux_amd64', host_platform()})
+            problems = build(args.outdir, platforms, args.cache_dir)['problems']
+        else:
+            problems = [f"{path}: {problem}" for path, found in check(args.outdir, args.cache_dir).items()
+                        for problem in found]
+    except MirrorError as e:
+        logging.error(e)
+        return 1
+    for problem in problems:
+        logging.error(problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import reports_transfer
+from reports_transfer import MIB, TransferError, download, plan_parts, upload
+
+BUCKET = 'training-trinet-reports'
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+        monkeypatch.setenv(name, 'testing')
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def report(tmp_path):
+    path = tmp_path / 'report.bin'
+    path.write_bytes(os.urandom(17 * MIB + 123))
+    return path
+
+
+class FailingPart:
+    """Wraps an S3 client and fails upload_part for one part number."""
+
+    def __init__(self, client, part_number):
+        self.client = client
+        self.part_number = part_number
+        self.exceptions = client.exceptions
+
+    def upload_part(self, **kwargs):
+        if kwargs['PartNumber'] == self.part_number:
+            raise ConnectionError('connection reset')
+        return self.client.upload_part(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+class TestPlanParts:
+
+    def test_parts_cover_the_file(self):
+        assert plan_parts(12 * MIB, 5 * MIB) == [(1, 0, 5 * MIB), (2, 5 * MIB, 5 * MIB), (3, 10 * MIB, 2 * MIB)]
+        assert plan_parts(0, 5 * MIB) == [(1, 0, 0)]
+
+    def test_part_size_grows_to_stay_under_the_part_limit(self):
+        parts = plan_parts(100000 * MIB, 5 * MIB)
+        assert len(parts) == 10000
+        assert sum(length for _, _, length in parts) == 100000 * MIB
+
+    def test_parts_below_the_s3_minimum_are_rejected(self):
+        with pytest.raises(ValueError):
+            plan_parts(10 * MIB, MIB)
+
+
+class TestTransfer:
+
+    def test_multipart_round_trip(self, s3, report, tmp_path):
+        uploaded = upload(str(report), BUCKET, 'reports/report.bin', part_size=5 * MIB, concurrency=4, client=s3)
+        assert uploaded['parts'] == 4 and uploaded['resumed_parts'] == 0
+        assert s3.head_object(Bucket=BUCKET, Key='reports/report.bin')['Metadata'] == {'sha256': uploaded['sha256']}
+        assert not os.path.exists(reports_transfer.resume_path(str(report)))
+
+        target = tmp_path / 'copy.bin'
+        downloaded = download(BUCKET, 'reports/report.bin', str(target), part_size=5 * MIB, concurrency=4, client=s3)
+        assert downloaded['sha256'] == uploaded['sha256']
+        assert target.read_bytes() == report.read_bytes()
+
+    def test_small_file_is_a_single_put(self, s3, tmp_path):
+        path = tmp_path / 'small.csv'
+        path.write_bytes(b'id,total\n1,42\n')
+        assert upload(str(path), BUCKET, 'small.csv', client=s3)['parts'] == 1
+        target = tmp_path / 'small-copy.csv'
+        download(BUCKET, 'small.csv', str(target), client=s3)
+        assert target.read_bytes() == b'id,total\n1,42\n'
+
+    def test_interrupted_upload_resumes_with_the_missing_parts(self, s3, report):
+        with pytest.raises(ConnectionError):
+            upload(str(report), BUCKET, 'report.bin', part_size=5 * MIB, concurrency=1, client=FailingPart(s3, 3))
+        record = json.loads(open(reports_transfer.resume_path(str(report))).read())
+        assert sorted(record['parts']) == ['1', '2', '4']
+
+        result = upload(str(report), BUCKET, 'report.bin', part_size=5 * MIB, concurrency=4, client=s3)
+        assert result['resumed_parts'] == 3
+        body = s3.get_object(Bucket=BUCKET, Key='report.bin')['Body'].read()
+        assert body == report.read_bytes()
+        assert not os.path.exists(reports_transfer.resume_path(str(report)))
+
+    def test_changed_file_starts_a_new_upload(self, s3, report):
+        with pytest.raises(ConnectionError):
+            upload(str(report), BUCKET, 'report.bin', part_size=5 * MIB, concurrency=1, client=FailingPart(s3, 2))
+        stale = json.loads(open(reports_transfer.resume_path(str(report))).read())['upload_id']
+        report.write_bytes(os.urandom(11 * MIB))
+        assert upload(str(report), BUCKET, 'report.bin', part_size=5 * MIB, client=s3)['resumed_parts'] == 0
+        # The abandoned upload is aborted rather than left to accrue storage for its parts
+        uploads = s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', [])
+        assert stale not in [upload['UploadId'] for upload in uploads]
+
+    def test_changed_part_size_aborts_the_old_upload_before_a_single_put(self, s3, report):
+        with pytest.raises(ConnectionError):
+            upload(str(report), BUCKET, 'report.bin', part_size=5 * MIB, concurrency=1, client=FailingPart(s3, 2))
+        assert upload(str(report), BUCKET, 'report.bin', part_size=64 * MIB, client=s3)['parts'] == 1
+        assert s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+        assert not os.path.exists(reports_transfer.resume_path(str(report)))
+
+    def test_checksum_mismatch_keeps_the_target_untouched(self, s3, tmp_path):
+        s3.put_object(Bucket=BUCKET, Key='tampered.bin', Body=b'x' * 100, Metadata={'sha256': '0' * 64})
+        target = tmp_path / 'tampered.bin'
+        target.write_bytes(b'previous')
+        with pytest.raises(TransferError):
+            download(BUCKET, 'tampered.bin', str(target), client=s3)
+        assert target.read_bytes() == b'previous'
+        assert os.listdir(tmp_path) == ['tampered.bin']
@@ -0,0 +1,308 @@
+"""Parallel transfers in and out of the reports bucket (config["s3_bucket"]["name"]).
+
+Uploads larger than one part use a multipart upload whose parts are sent by a
+thread pool; downloads fetch byte ranges in parallel and write them straight
+to their offset in the target file. Each worker reads or writes one part at a
+time, so memory stays around part_size * concurrency whatever the file size.
+
+    pipenv run python reports_transfer.py upload report.csv reports/2024/report.csv
+    pipenv run python reports_transfer.py download reports/2024/report.csv report.csv --concurrency 16
+
+Integrity: every part carries a SHA-256 checksum that S3 verifies on receipt,
+and the SHA-256 of the whole file is stored in the object metadata
+(x-amz-meta-sha256) and checked after a download before the file is moved
+into place.
+
+Resuming: the upload id and the finished parts are recorded in a small JSON
+file next to the source (<file>.upload.json). Running the same upload again
+after a crash lists the parts S3 already has and only sends the missing ones.
+The record is dropped when the file, bucket, key or part size changes.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+MIB = 1024 * 1024
+MIN_PART_SIZE = 5 * MIB  # S3 rejects smaller parts, except the last one
+MAX_PARTS = 10000
+DEFAULT_PART_SIZE = 64 * MIB
+DEFAULT_CONCURRENCY = 8
+CHUNK_SIZE = MIB  # hashing and download streaming granularity
+
+
+class TransferError(Exception):
+    pass
+
+
+def bucket_name(config):
+    return config['s3_bucket']['name']
+
+
+def _default_client_factory(region=None, endpoint_url=None):
+    import boto3
+    from botocore.config import Config
+
+    # One connection per worker thread, the default pool of 10 would serialize larger pools
+    return boto3.client('s3', region_name=region, endpoint_url=endpoint_url,
+                        config=Config(max_pool_connections=64, retries={'mode': 'adaptive', 'max_attempts': 10}))
+
+
+def plan_parts(size, part_size=DEFAULT_PART_SIZE):
+    """[(part_number, offset, length)] covering size bytes; part_size grows to stay under MAX_PARTS."""
+    if part_size < MIN_PART_SIZE:
+        raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes, got {part_size}")
+    part_size = max(part_size, -(-size // MAX_PARTS))
+    return [(number, offset, min(part_size, size - offset))
+            for number, offset in enumerate(range(0, size, part_size), start=1)] or [(1, 0, 0)]
+
+
+def _read_range(path, offset, length):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def _b64_sha256(data):
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file, read in CHUNK_SIZE pieces."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def resume_path(path):
+    return f"{path}.upload.json"
+
+
+def _load_resume(path):
+    try:
+        with open(resume_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_resume(path, record):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, staging = tempfile.mkstemp(prefix='.upload-', dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(record, f)
+    os.replace(staging, resume_path(path))
+
+
+def _drop_resume(path):
+    try:
+        os.remove(resume_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def _abort_stale(client, record):
+    """Abort the multipart upload of a resume record that no longer matches the file, so its parts stop billing."""
+    identity = record.get('identity') or {}
+    if not (record.get('upload_id') and identity.get('bucket') and identity.get('key')):
+        return
+    try:
+        client.abort_multipart_upload(Bucket=identity['bucket'], Key=identity['key'], UploadId=record['upload_id'])
+        logging.info(f"Aborted stale multipart upload {record['upload_id']} of s3://{identity['bucket']}/{identity['key']}")
+    except client.exceptions.NoSuchUpload:
+        pass
+
+
+def _existing_parts(client, bucket, key, upload_id):
+    """{part_number: part} already stored for upload_id, or None when the upload is gone."""
+    parts = {}
+    kwargs = {'Bucket': bucket, 'Key': key, 'UploadId': upload_id}
+    try:
+        while True:
+            response = client.list_parts(**kwargs)
+            for part in response.get('Parts', []):
+                parts[part['PartNumber']] = part
+            if not response.get('IsTruncated'):
+                return parts
+            kwargs['PartNumberMarker'] = response['NextPartNumberMarker']
+    except client.exceptions.NoSuchUpload:
+        return None
+
+
+@tracing.traced('s3.upload')
+def upload(path, bucket, key, part_size=DEFAULT_PART_SIZE, concurrency=DEFAULT_CONCURRENCY, client=None,
+           progress=None):
+    """Upload path to s3://bucket/key. Returns {'bytes', 'parts', 'resumed_parts', 'seconds', 'sha256'}.
+
+    progress, if given, is called with the byte count of every finished part.
+    """
+    client = client or _default_client_factory()
+    started = time.perf_counter()
+    stat = os.stat(path)
+    parts = plan_parts(stat.st_size, part_size)
+    sha256 = file_sha256(path)
+    metadata = {'sha256': sha256}
+    identity = {'bucket': bucket, 'key': key, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                'part_size': parts[0][2], 'sha256': sha256}
+    record = _load_resume(path)
+    if record and record.get('identity') != identity:
+        # The file or the part size changed since that upload started, its parts are of no use
+        _abort_stale(client, record)
+        _drop_resume(path)
+        record = None
+
+    if len(parts) == 1:
+        # Below one part a multipart upload only adds round trips
+        body = _read_range(path, 0, stat.st_size)
+        client.put_object(Bucket=bucket, Key=key, Body=body, Metadata=metadata,
+                          ChecksumAlgorithm='SHA256', ChecksumSHA256=_b64_sha256(body))
+        if progress:
+            progress(stat.st_size)
+        return {'bytes': stat.st_size, 'parts': 1, 'resumed_parts': 0,
+                'seconds': time.perf_counter() - started, 'sha256': sha256}
+
+    done = {}
+    if record:
+        existing = _existing_parts(client, bucket, key, record['upload_id'])
+        if existing is None:
+            record = None
+        else:
+            # Only trust parts S3 still has with the ETag we recorded for them
+            done = {int(number): part for number, part in record['parts'].items()
+                    if int(number) in existing and existing[int(number)]['ETag'] == part['ETag']}
+    if not record:
+        response = client.create_multipart_upload(Bucket=bucket, Key=key, Metadata=metadata,
+                                                  ChecksumAlgorithm='SHA256')
+        record = {'identity': identity, 'upload_id': response['UploadId'], 'parts': {}}
+        _save_resume(path, record)
+    resumed = len(done)
+    upload_id = record['upload_id']
+    lock = threading.Lock()
+
+    def send(part):
+        number, offset, length = part
+        with tracing.span('s3.upload_part', part=number, bytes=length):
+            body = _read_range(path, offset, length)
+            checksum = _b64_sha256(body)
+            response = client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body,
+                                          ChecksumAlgorithm='SHA256', ChecksumSHA256=checksum)
+        with lock:
+            done[number] = {'ETag': response['ETag'], 'ChecksumSHA256': checksum}
+            record['parts'] = {str(n): p for n, p in done.items()}
+            _save_resume(path, record)
+        if progress:
+            progress(length)
+
+    pending = [part for part in parts if part[0] not in done]
+    logging.info(f"Uploading {path} to s3://{bucket}/{key}: {len(pending)} of {len(parts)} parts, "
+                 f"{concurrency} workers")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # list() re-raises the first failed part; the record keeps the others for the next run
+        list(executor.map(send, pending))
+
+    client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': [
+        {'PartNumber': number, 'ETag': done[number]['ETag'], 'ChecksumSHA256': done[number]['ChecksumSHA256']}
+        for number in sorted(done)]})
+    _drop_resume(path)
+    return {'bytes': stat.st_size, 'parts': len(parts), 'resumed_parts': resumed,
+            'seconds': time.perf_counter() - started, 'sha256': sha256}
+
+
+@tracing.traced('s3.download')
+def download(bucket, key, path, part_size=DEFAULT_PART_SIZE, concurrency=DEFAULT_CONCURRENCY, client=None,
+             progress=None, verify=True):
+    """Download s3://bucket/key to path with parallel ranged GETs.
+
+    Returns {'bytes', 'parts', 'seconds', 'sha256'}. The data goes to a
+    temporary file next to path and only replaces path once complete and,
+    when the object has a sha256 metadata entry, verified against it.
+    """
+    client = client or _default_client_factory()
+    started = time.perf_counter()
+    head = client.head_object(Bucket=bucket, Key=key)
+    size = head['ContentLength']
+    # Pin every range to the version we sized, a concurrent overwrite fails the download instead of mixing objects
+    etag = head['ETag']
+    parts = plan_parts(size, part_size)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, staging = tempfile.mkstemp(prefix='.download-', dir=directory)
+    try:
+        os.ftruncate(fd, size)
+        os.close(fd)
+
+        def fetch(part):
+            number, offset, length = part
+            if length == 0:
+                return
+            with tracing.span('s3.get_range', part=number, bytes=length):
+                response = client.get_object(Bucket=bucket, Key=key, IfMatch=etag,
+                                             Range=f"bytes={offset}-{offset + length - 1}")
+                with open(staging, 'r+b') as f:
+                    f.seek(offset)
+                    for chunk in response['Body'].iter_chunks(CHUNK_SIZE):
+                        f.write(chunk)
+            if progress:
+                progress(length)
+
+        logging.info(f"Downloading s3://{bucket}/{key} to {path}: {len(parts)} parts, {concurrency} workers")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(fetch, parts))
+
+        sha256 = file_sha256(staging) if verify else None
+        expected = head.get('Metadata', {}).get('sha256')
+        if verify and expected and sha256 != expected:
+            raise TransferError(f"s3://{bucket}/{key}: SHA-256 {sha256} does not match the uploaded {expected}")
+        os.replace(staging, path)
+    except BaseException:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+    return {'bytes': size, 'parts': len(parts), 'seconds': time.perf_counter() - started, 'sha256': sha256}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--bucket', help='defaults to s3_bucket.name from the config')
+    parser.add_argument('--part-size-mb', type=int, default=DEFAULT_PART_SIZE // MIB)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--endpoint-url', help='a local S3 stand-in such as MinIO')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    upload_parser = subparsers.add_parser('upload')
+    upload_parser.add_argument('path')
+    upload_parser.add_argument('key', nargs='?', help='defaults to the file name')
+    download_parser = subparsers.add_parser('download')
+    download_parser.add_argument('key')
+    download_parser.add_argument('path')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    tracing.configure_from_env()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    bucket = args.bucket or bucket_name(config)
+    client = _default_client_factory(config.get('region'), args.endpoint_url)
+    part_size = args.part_size_mb * MIB
+    if args.command == 'upload':
+        result = upload(args.path, bucket, args.key or os.path.basename(args.path), part_size, args.concurrency, client)
+    else:
+        result = download(bucket, args.key, args.path, part_size, args.concurrency, client)
+    result['mib_per_s'] = result['bytes'] / MIB / result['seconds'] if result['seconds'] else None
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
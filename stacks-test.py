@@ -0,0 +1,258 @@
+import json
+
+import pytest
+from cdktf import Testing
+
+import stacks
+from deployment_matrix import cell_config, expand_cells
+from main import MyStack
+
+PROFILE = [
+    {'name': 'general', 'instance_types': ['m6i.large', 'm5.large'], 'desired_size': 2, 'max_size': 6, 'min_size': 2,
+     'labels': {'workload': 'general'}},
+    {'name': 'spot-arm', 'instance_types': ['m7g.large', 'c6gn.large'], 'capacity_type': 'SPOT',
+     'desired_size': 0, 'max_size': 10, 'min_size': 0,
+     'taints': [{'key': 'spot', 'value': 'true', 'effect': 'NO_SCHEDULE'}]},
+]
+
+CONFIG = {
+    'region': 'us-east-1',
+    'availability_zones': {'us-east-1': ['us-east-1a', 'us-east-1b']},
+    'autoscaler': 'cluster-autoscaler',
+    'capacity_profiles': {'mixed': PROFILE},
+    'eks_clusters': [{'name': 'angularnew-cs', 'alias': 'angular2', 'capacity_profile': 'mixed'},
+                     {'name': 'legacy-cs', 'alias': 'legacy'}],
+    'node_group': {'desired_size': 2, 'max_size': 2, 'min_size': 1},
+    'rds': {'username': 'admin'},
+}
+
+
+class TestClusterNodeGroups:
+
+    def test_legacy_cluster_keeps_one_micro_node_group(self):
+        assert stacks.cluster_node_groups(CONFIG, CONFIG['eks_clusters'][1]) == [{
+            'name': None, 'instance_types': ['t2.micro'], 'ami_type': 'AL2_x86_64',
+            'scaling_config': {'desired_size': 2, 'max_size': 2, 'min_size': 1}}]
+
+    def test_profile_fills_in_ami_type_and_capacity_type(self):
+        general, spot = stacks.cluster_node_groups(CONFIG, CONFIG['eks_clusters'][0])
+        assert (general['ami_type'], general['capacity_type']) == ('AL2023_x86_64_STANDARD', 'ON_DEMAND')
+        assert (spot['ami_type'], spot['capacity_type']) == ('AL2023_ARM_64_STANDARD', 'SPOT')
+        assert spot['scaling_config'] == {'desired_size': 0, 'max_size': 10, 'min_size': 0}
+
+    def test_rejects_mixed_architectures_and_unknown_profiles(self):
+        with pytest.raises(ValueError):
+            stacks.cluster_node_groups(CONFIG, {'alias': 'a', 'node_groups': [
+                dict(PROFILE[0], instance_types=['m6i.large', 'm7g.large'])]})
+        with pytest.raises(KeyError):
+            stacks.cluster_node_groups(CONFIG, {'alias': 'a', 'capacity_profile': 'missing'})
+
+    def test_cluster_autoscaler_tags_describe_labels_and_taints(self):
+        spot = stacks.cluster_node_groups(CONFIG, CONFIG['eks_clusters'][0])[1]
+        assert stacks.autoscaler_tags('angularnew-cs', spot, 'cluster-autoscaler') == {
+            'k8s.io/cluster-autoscaler/enabled': 'true',
+            'k8s.io/cluster-autoscaler/angularnew-cs': 'owned',
+            'k8s.io/cluster-autoscaler/node-template/taint/spot': 'true:NoSchedule',
+        }
+
+
+@pytest.fixture(scope='module')
+def synthesized():
+    return json.loads(Testing.synth(MyStack(Testing.app(), 'cdktf-eks-cluster', CONFIG)))
+
+
+class TestSynthesizedNodeGroups:
+
+    def test_one_node_group_per_profile_entry(self, synthesized):
+        node_groups = synthesized['resource']['aws_eks_node_group']
+        by_name = {block['node_group_name']: block for block in node_groups.values()}
+        assert sorted(by_name) == ['angular2-general', 'angular2-spot-arm', 'legacy-nodegroup']
+        spot = by_name['angular2-spot-arm']
+        assert spot['capacity_type'] == 'SPOT'
+        assert spot['taint'] == [{'effect': 'NO_SCHEDULE', 'key': 'spot', 'value': 'true'}]
+        assert spot['lifecycle'] == {'ignore_changes': ['scaling_config[0].desired_size']}
+        assert 'lifecycle' not in by_name['legacy-nodegroup']
+        assert by_name['legacy-nodegroup']['instance_types'] == ['t2.micro']
+
+    def test_node_role_may_resize_tagged_groups(self, synthesized):
+        policy = json.loads(synthesized['resource']['aws_iam_policy']['AutoscalerPolicy']['policy'])
+        assert 'autoscaling:SetDesiredCapacity' in policy['Statement'][1]['Action']
+
+
+TIERED = dict(CONFIG, network={'vpc_cidr': '10.0.0.0/16', 'az_count': 3,
+                                'tiers': {'public': 24, 'private': 19, 'data': 24}},
+              availability_zones={'us-east-1': ['us-east-1a', 'us-east-1b', 'us-east-1c']})
+
+
+@pytest.fixture(scope='module')
+def resources():
+    return json.loads(Testing.synth(MyStack(Testing.app(), 'cdktf-eks-cluster', TIERED)))['resource']
+
+
+class TestTieredNetwork:
+
+    def test_subnets_per_tier_and_zone(self, resources):
+        subnets = resources['aws_subnet']
+        assert sorted(subnets) == sorted(f"{tier}Subnet{number}" for tier in ['Public', 'Private', 'Data']
+                                         for number in [1, 2, 3])
+        assert subnets['PrivateSubnet3']['cidr_block'] == '10.0.64.0/19'
+        assert subnets['PrivateSubnet3']['availability_zone'] == 'us-east-1c'
+        assert subnets['PublicSubnet1']['map_public_ip_on_launch'] is True
+
+    def test_private_subnets_use_the_nat_gateway_in_their_zone(self, resources):
+        assert len(resources['aws_nat_gateway']) == 3
+        assert resources['aws_nat_gateway']['NatGateway2']['subnet_id'] == '${aws_subnet.PublicSubnet2.id}'
+        assert resources['aws_route']['PrivateRouteToNat2']['nat_gateway_id'] == '${aws_nat_gateway.NatGateway2.id}'
+        assert resources['aws_route_table_association']['PrivateSubnet2RouteTableAssociation']['route_table_id'] == \
+            '${aws_route_table.PrivateRouteTable2.id}'
+
+    def test_database_and_clusters_use_their_tiers(self, resources):
+        assert resources['aws_db_subnet_group']['DbSubnetGroup']['subnet_ids'] == \
+            [f"${{aws_subnet.DataSubnet{number}.id}}" for number in [1, 2, 3]]
+        cluster = next(iter(resources['aws_eks_cluster'].values()))
+        assert cluster['vpc_config']['subnet_ids'][:3] == \
+            [f"${{aws_subnet.PrivateSubnet{number}.id}}" for number in [1, 2, 3]]
+        node_group = next(iter(resources['aws_eks_node_group'].values()))
+        assert node_group['subnet_ids'] == [f"${{aws_subnet.PrivateSubnet{number}.id}}" for number in [1, 2, 3]]
+
+
+class TestVpcEndpoints:
+
+    def test_endpoints_are_off_by_default(self, resources):
+        assert 'aws_vpc_endpoint' not in resources
+
+    def test_gateway_and_interface_endpoints(self):
+        config = dict(TIERED, vpc_endpoints={'enabled': True, 'interface': ['ecr.api', 'ecr.dkr', 'sts']})
+        resources = json.loads(Testing.synth(MyStack(Testing.app(), 'cdktf-eks-cluster', config)))['resource']
+        endpoints = resources['aws_vpc_endpoint']
+        assert sorted(endpoints) == ['EcrApiInterfaceEndpoint', 'EcrDkrInterfaceEndpoint', 'S3GatewayEndpoint',
+                                     'StsInterfaceEndpoint']
+        s3 = endpoints['S3GatewayEndpoint']
+        assert s3['service_name'] == 'com.amazonaws.us-east-1.s3'
+        assert '${aws_route_table.PrivateRouteTable3.id}' in s3['route_table_ids']
+        ecr = endpoints['EcrDkrInterfaceEndpoint']
+        assert ecr['private_dns_enabled'] is True
+        assert ecr['subnet_ids'] == [f"${{aws_subnet.PrivateSubnet{number}.id}}" for number in [1, 2, 3]]
+        assert ecr['security_group_ids'] == ['${aws_security_group.VpcEndpointSecurityGroup.id}']
+        assert resources['aws_security_group']['VpcEndpointSecurityGroup']['ingress'][0]['from_port'] == 443
+
+
+class TestAuroraReaders:
+
+    def test_cluster_without_instance_class_has_no_instances(self, synthesized):
+        assert 'aws_rds_cluster_instance' not in synthesized['resource']
+        assert synthesized['output']['rds_reader_endpoint'] == {'value': '${aws_rds_cluster.RdsCluster.reader_endpoint}'}
+
+    def test_writer_and_autoscaled_readers_across_zones(self):
+        rds = {'username': 'admin', 'instance_class': 'db.r6g.large',
+               'readers': {'count': 2, 'instance_class': 'db.r6g.xlarge',
+                           'autoscaling': {'metric': 'connections', 'target_value': 500, 'max_capacity': 5}}}
+        resources = json.loads(Testing.synth(MyStack(Testing.app(), 'cdktf-eks-cluster', dict(TIERED, rds=rds))))['resource']
+        instances = resources['aws_rds_cluster_instance']
+        assert sorted(instances) == ['RdsReaderInstance1', 'RdsReaderInstance2', 'RdsWriterInstance']
+        assert [instances[name]['availability_zone'] for name in sorted(instances)] == \
+            ['us-east-1b', 'us-east-1c', 'us-east-1a']
+        assert instances['RdsReaderInstance1']['instance_class'] == 'db.r6g.xlarge'
+        assert instances['RdsWriterInstance']['promotion_tier'] == 0
+        target = resources['aws_appautoscaling_target']['RdsReaderScalingTarget']
+        assert (target['min_capacity'], target['max_capacity']) == (2, 5)
+        assert target['scalable_dimension'] == 'rds:cluster:ReadReplicaCount'
+        policy = resources['aws_appautoscaling_policy']['RdsReaderScalingPolicy']
+        tracking = policy['target_tracking_scaling_policy_configuration']
+        assert tracking['predefined_metric_specification']['predefined_metric_type'] == \
+            'RDSReaderAverageDatabaseConnections'
+        assert target['depends_on'] == ['aws_rds_cluster_instance.RdsReaderInstance1',
+                                        'aws_rds_cluster_instance.RdsReaderInstance2']
+
+
+@pytest.fixture(scope='module')
+def synthesized_proxy():
+    rds = {'username': 'admin', 'instance_class': 'db.r6g.large', 'readers': {'count': 1},
+           'proxy': {'enabled': True, 'connection_borrow_timeout': 30, 'max_connections_percent': 75}}
+    return json.loads(Testing.synth(MyStack(Testing.app(), 'cdktf-eks-cluster', dict(TIERED, rds=rds))))
+
+
+class TestRdsProxy:
+
+    def test_proxy_authenticates_with_the_rds_secret_through_its_role(self, synthesized_proxy):
+        resources = synthesized_proxy['resource']
+        assert resources['aws_secretsmanager_secret']['RdsPasswordSecret']['name'] == 'springboot-django-rds-password'
+        proxy = resources['aws_db_proxy']['RdsProxy']
+        assert proxy['auth'] == [{'auth_scheme': 'SECRETS', 'iam_auth': 'DISABLED',
+                                  'secret_arn': '${aws_secretsmanager_secret.RdsPasswordSecret.arn}'}]
+        assert proxy['role_arn'] == '${aws_iam_role.RdsProxyRole.arn}'
+        assert proxy['vpc_subnet_ids'] == [f"${{aws_subnet.DataSubnet{number}.id}}" for number in [1, 2, 3]]
+        policy = json.loads(resources['aws_iam_role_policy']['RdsProxySecretPolicy']['policy'])
+        assert policy['Statement'][0]['Resource'] == '${aws_secretsmanager_secret.RdsPasswordSecret.arn}'
+        assume = json.loads(resources['aws_iam_role']['RdsProxyRole']['assume_role_policy'])
+        assert assume['Statement'][0]['Principal'] == {'Service': 'rds.amazonaws.com'}
+
+    def test_only_the_eks_security_group_reaches_the_proxy(self, synthesized_proxy):
+        rules = synthesized_proxy['resource']['aws_security_group_rule']
+        assert rules['RdsProxyIngress1']['source_security_group_id'] == '${aws_security_group.EksSecurityGroup.id}'
+        assert rules['RdsProxyIngress1']['security_group_id'] == '${aws_security_group.RdsProxySecurityGroup.id}'
+        assert (rules['RdsProxyIngress1']['from_port'], rules['RdsProxyIngress1']['to_port']) == (3306, 3306)
+        assert rules['RdsProxyEgress1']['type'] == 'egress'
+
+    def test_pool_target_and_outputs(self, synthesized_proxy):
+        resources = synthesized_proxy['resource']
+        pool = resources['aws_db_proxy_default_target_group']['RdsProxyTargetGroup']['connection_pool_config']
+        assert pool == {'connection_borrow_timeout': 30, 'max_connections_percent': 75,
+                        'max_idle_connections_percent': 50}
+        target = resources['aws_db_proxy_target']['RdsProxyTarget']
+        assert target['db_cluster_identifier'] == '${aws_rds_cluster.RdsCluster.cluster_identifier}'
+        assert resources['aws_db_proxy_endpoint']['RdsProxyReaderEndpoint']['target_role'] == 'READ_ONLY'
+        assert synthesized_proxy['output']['rds_proxy_endpoint'] == {'value': '${aws_db_proxy.RdsProxy.endpoint}'}
+        assert 'rds_proxy_reader_endpoint' in synthesized_proxy['output']
+
+
+REGISTRY = dict(CONFIG, ecrRepo={
+    'name': 'apprepos', 'immutable_tags': True, 'lifecycle': {'untagged_expire_days': 3, 'keep_last': 50},
+    'pull_through_cache': [{'prefix': 'docker-hub', 'credential_secret': 'ecr-pullthroughcache/docker-hub'},
+                           {'prefix': 'k8s'}],
+}, deployments={'environments': {'dev': {}, 'prod': {}}, 'regions': ['us-east-1', 'eu-west-1']})
+
+
+def synth_cell(config, cell_id):
+    cell = next(cell for cell in expand_cells(config) if cell['id'] == cell_id)
+    return json.loads(Testing.synth(MyStack(Testing.app(), cell['stack_prefix'], cell_config(config, cell))))
+
+
+@pytest.fixture(scope='module')
+def registry_cells():
+    return {cell_id: synth_cell(REGISTRY, cell_id)['resource'] for cell_id in ['dev-us-east-1', 'prod-us-east-1']}
+
+
+class TestRegistry:
+
+    def test_repository_settings_and_lifecycle(self, registry_cells):
+        resources = registry_cells['prod-us-east-1']
+        repository = resources['aws_ecr_repository']['EcrRepository']
+        assert repository['name'] == 'apprepos-prod'
+        assert repository['image_tag_mutability'] == 'IMMUTABLE'
+        assert repository['image_scanning_configuration'] == {'scan_on_push': True}
+        rules = json.loads(resources['aws_ecr_lifecycle_policy']['EcrLifecyclePolicy']['policy'])['rules']
+        assert [rule['selection']['tagStatus'] for rule in rules] == ['untagged', 'any']
+        assert rules[0]['selection']['countNumber'] == 3 and rules[1]['selection']['countNumber'] == 50
+
+    def test_registry_wide_resources_come_from_the_first_environment_only(self, registry_cells):
+        dev = registry_cells['dev-us-east-1']
+        rules = dev['aws_ecr_pull_through_cache_rule']
+        assert rules['K8sPullThroughCacheRule']['upstream_registry_url'] == 'registry.k8s.io'
+        assert rules['DockerHubPullThroughCacheRule']['credential_arn'] == \
+            '${data.aws_secretsmanager_secret.DockerHubPullThroughCacheRuleCredentials.arn}'
+        replication = dev['aws_ecr_replication_configuration']['EcrReplication']['replication_configuration']
+        assert replication['rule'][0]['destination'] == [
+            {'region': 'eu-west-1', 'registry_id': '${data.aws_caller_identity.CallerIdentity.account_id}'}]
+        assert replication['rule'][0]['repository_filter'] == [{'filter': 'apprepos', 'filter_type': 'PREFIX_MATCH'}]
+
+        prod = registry_cells['prod-us-east-1']
+        assert 'aws_ecr_pull_through_cache_rule' not in prod
+        assert 'aws_ecr_replication_configuration' not in prod
+        # Nodes still pull through the cache rules the dev cell created
+        assert 'EcrPullThroughCachePolicyAttachment' in prod['aws_iam_role_policy_attachment']
+
+    def test_unknown_upstream_is_rejected(self):
+        config = dict(CONFIG, ecrRepo={'name': 'apprepos', 'pull_through_cache': [{'prefix': 'nexus'}]})
+        with pytest.raises(ValueError):
+            MyStack(Testing.app(), 'cdktf-eks-cluster', config)
@@ -0,0 +1,984 @@
+"""Building blocks for the cdktf-eks-cluster infrastructure.
+
+The build_* functions add resources to whatever scope they are given, the
+same way create_managed_node_group does in main.py. MyStack calls them all
+with itself as the scope, which keeps the single-stack logical ids unchanged.
+With "stack_layout": "split" in config.json, build_split_stacks puts them in
+separate network, IAM, data and per-cluster stacks instead. Those stacks
+reference each other across stack boundaries, so each one can be planned
+and applied on its own (see deploy.py).
+"""
+import json
+import logging
+import os
+import re
+
+from constructs import Construct
+from cdktf import Fn, TerraformStack, TerraformOutput
+
+import tracing
+
+DEFAULT_REGION = 'us-east-1'
+
+
+def assume_role_policy(service):
+    return f'''{{
+            "Version": "2012-10-17",
+            "Statement": [
+                {{
+                    "Effect": "Allow",
+                    "Principal": {{
+                        "Service": "{service}"
+                    }},
+                    "Action": "sts:AssumeRole"
+                }}
+            ]
+        }}'''
+
+
+def availability_zones(scope, config, count=2):
+    """AZ names for config['region']: from config['availability_zones'] if listed, else looked up at plan time."""
+    region = config.get('region', DEFAULT_REGION)
+    zones = config.get('availability_zones', {}).get(region)
+    if zones:
+        return zones[:count]
+
+    from cdktf_cdktf_provider_aws.data_aws_availability_zones import DataAwsAvailabilityZones
+
+    available = DataAwsAvailabilityZones(scope, 'AvailabilityZones', state='available')
+    return [Fn.element(available.names, index) for index in range(count)]
+
+
+# Tiers build_tiered_subnets knows how to route
+SUBNET_TIERS = ('public', 'private', 'data')
+DEFAULT_TIERS = {'public': 24, 'private': 19, 'data': 24}
+
+
+def build_tiered_subnets(scope, config, vpc, internet_gateway, public_route_table):
+    """Public, private and data subnets in every AZ, carved by cidr_allocator from config["network"].
+
+    Public subnets route to the internet gateway. Each private subnet routes
+    through a NAT gateway in its own AZ ("nat_gateways": "per_az", the default),
+    one shared NAT gateway ("single") or none ("none"). Data subnets only get
+    the VPC-local route. Returns {'subnets': {tier: [Subnet]}, 'route_tables': {tier: [RouteTable]},
+    'zones': [zone]}.
+    """
+    from cdktf_cdktf_provider_aws.eip import Eip
+    from cdktf_cdktf_provider_aws.nat_gateway import NatGateway
+    from cdktf_cdktf_provider_aws.route import Route
+    from cdktf_cdktf_provider_aws.route_table import RouteTable
+    from cdktf_cdktf_provider_aws.route_table_association import RouteTableAssociation
+    from cdktf_cdktf_provider_aws.subnet import Subnet
+    from cidr_allocator import allocate_subnets
+
+    layout = config['network']
+    tiers = layout.get('tiers', DEFAULT_TIERS)
+    unknown = set(tiers) - set(SUBNET_TIERS)
+    if unknown:
+        raise ValueError(f"Unknown subnet tiers {sorted(unknown)}, expected some of {list(SUBNET_TIERS)}")
+    nat_mode = layout.get('nat_gateways', 'per_az')
+    if nat_mode not in ('per_az', 'single', 'none'):
+        raise ValueError(f"Unknown nat_gateways mode {nat_mode}, expected per_az, single or none")
+    if 'private' in tiers and nat_mode != 'none' and 'public' not in tiers:
+        raise ValueError("NAT gateways for the private tier need a public tier")
+
+    zones = availability_zones(scope, config, count=layout.get('az_count', 3))
+    tier_tags = {
+        'public': {'kubernetes.io/role/elb': '1'},
+        'private': {'kubernetes.io/role/internal-elb': '1', **karpenter_discovery_tags(config)},
+        'data': {},
+    }
+    subnets = {tier: [] for tier in tiers}
+    for allocation in allocate_subnets(layout.get('vpc_cidr', '10.0.0.0/16'), zones, tiers):
+        tier, number = allocation['tier'], allocation['index'] + 1
+        subnets[tier].append(Subnet(scope, f"{tier.capitalize()}Subnet{number}",
+            vpc_id=vpc.id,
+            cidr_block=allocation['cidr'],
+            availability_zone=allocation['zone'],
+            map_public_ip_on_launch=tier == 'public',
+            tags=tier_tags[tier] or None))
+
+    route_tables = {tier: [] for tier in tiers}
+    for number, subnet in enumerate(subnets.get('public', []), start=1):
+        RouteTableAssociation(scope, f"PublicSubnet{number}RouteTableAssociation", subnet_id=subnet.id, route_table_id=public_route_table.id)
+    if 'public' in tiers:
+        route_tables['public'].append(public_route_table)
+
+    nat_gateways = []
+    if 'private' in tiers and nat_mode != 'none':
+        for number, subnet in enumerate(subnets['public'][:1 if nat_mode == 'single' else None], start=1):
+            eip = Eip(scope, f"NatEip{number}", domain='vpc')
+            nat_gateways.append(NatGateway(scope, f"NatGateway{number}", allocation_id=eip.id, subnet_id=subnet.id,
+                                           depends_on=[internet_gateway]))
+
+    # One route table per private subnet so its traffic leaves through the NAT gateway in the same AZ
+    for number, subnet in enumerate(subnets.get('private', []), start=1):
+        route_table = RouteTable(scope, f"PrivateRouteTable{number}", vpc_id=vpc.id)
+        if nat_gateways:
+            Route(scope, f"PrivateRouteToNat{number}", route_table_id=route_table.id, destination_cidr_block='0.0.0.0/0',
+                  nat_gateway_id=nat_gateways[min(number, len(nat_gateways)) - 1].id)
+        RouteTableAssociation(scope, f"PrivateSubnet{number}RouteTableAssociation", subnet_id=subnet.id, route_table_id=route_table.id)
+        route_tables['private'].append(route_table)
+
+    if subnets.get('data'):
+        data_route_table = RouteTable(scope, 'DataRouteTable', vpc_id=vpc.id)
+        for number, subnet in enumerate(subnets['data'], start=1):
+            RouteTableAssociation(scope, f"DataSubnet{number}RouteTableAssociation", subnet_id=subnet.id, route_table_id=data_route_table.id)
+        route_tables['data'].append(data_route_table)
+
+    return {'subnets': subnets, 'route_tables': route_tables, 'zones': zones}
+
+
+DEFAULT_INTERFACE_ENDPOINTS = ['ecr.api', 'ecr.dkr', 'sts', 'eks', 'logs']
+
+
+def build_vpc_endpoints(scope, config, vpc, subnet_ids, route_table_ids):
+    """Gateway and interface endpoints from config["vpc_endpoints"], or nothing when it is off.
+
+    S3 (a gateway endpoint) gets a route in every route table. Interface
+    endpoints (by default ECR api/dkr, STS, EKS and CloudWatch Logs) get an ENI
+    in each of subnet_ids, private DNS, and a security group that allows HTTPS
+    from inside the VPC, so image pulls and token signing stay off the
+    internet gateway.
+    """
+    endpoints = config.get('vpc_endpoints', {})
+    if not endpoints.get('enabled'):
+        return {}
+
+    from cdktf_cdktf_provider_aws.security_group import SecurityGroup, SecurityGroupIngress
+    from cdktf_cdktf_provider_aws.vpc_endpoint import VpcEndpoint
+
+    region = config.get('region', DEFAULT_REGION)
+    created = {}
+    for service in endpoints.get('gateway', ['s3']):
+        created[service] = VpcEndpoint(scope, f"{camel_case(service)}GatewayEndpoint",
+            vpc_id=vpc.id,
+            service_name=f"com.amazonaws.{region}.{service}",
+            vpc_endpoint_type='Gateway',
+            route_table_ids=route_table_ids)
+
+    interface_services = endpoints.get('interface', DEFAULT_INTERFACE_ENDPOINTS)
+    if interface_services:
+        endpoint_security_group = SecurityGroup(scope, 'VpcEndpointSecurityGroup', vpc_id=vpc.id,
+                                                description='HTTPS from the VPC to interface endpoints')
+        endpoint_security_group.put_ingress([SecurityGroupIngress(from_port=443, to_port=443, protocol='tcp',
+                                                                  cidr_blocks=[vpc.cidr_block])])
+        for service in interface_services:
+            created[service] = VpcEndpoint(scope, f"{camel_case(service)}InterfaceEndpoint",
+                vpc_id=vpc.id,
+                service_name=f"com.amazonaws.{region}.{service}",
+                vpc_endpoint_type='Interface',
+                subnet_ids=subnet_ids,
+                security_group_ids=[endpoint_security_group.id],
+                private_dns_enabled=True)
+    return created
+
+
+@tracing.traced('construct.network')
+def build_network(scope, config):
+    """VPC, internet gateway, subnets and the EKS security group.
+
+    With a "network" section in config the subnets come from
+    build_tiered_subnets; without one, the two original public /24 subnets.
+    Besides the resources, the returned dict has the subnet ids for each use:
+    'subnet_ids' for node groups (private when there is a private tier),
+    'cluster_subnet_ids' for the EKS control plane, 'db_subnet_ids' for the
+    DB subnet group, 'elb_subnet_ids' and 'internal_elb_subnet_ids' for load
+    balancers and 'route_table_ids' for gateway endpoints. VPC endpoints are
+    added by build_vpc_endpoints.
+    """
+    from cdktf_cdktf_provider_aws.vpc import Vpc
+    from cdktf_cdktf_provider_aws.subnet import Subnet
+    from cdktf_cdktf_provider_aws.security_group import SecurityGroup, SecurityGroupIngress
+    from cdktf_cdktf_provider_aws.internet_gateway import InternetGateway
+    from cdktf_cdktf_provider_aws.route_table import RouteTable
+    from cdktf_cdktf_provider_aws.route import Route
+    from cdktf_cdktf_provider_aws.route_table_association import RouteTableAssociation
+
+    layout = config.get('network')
+
+    # Create a VPC
+    if layout or config.get('vpc_endpoints', {}).get('enabled'):
+        # DNS hostnames are needed for private DNS on interface endpoints
+        vpc = Vpc(scope, 'Vpc', cidr_block=(layout or {}).get('vpc_cidr', '10.0.0.0/16'), enable_dns_hostnames=True, enable_dns_support=True)
+    else:
+        vpc = Vpc(scope, 'Vpc', cidr_block='10.0.0.0/16')
+
+    # Create an Internet Gateway
+    internet_gateway = InternetGateway(scope, 'InternetGateway', vpc_id=vpc.id)
+
+    # Create a Route Table for the public subnets
+    public_route_table = RouteTable(scope, 'PublicRouteTable', vpc_id=vpc.id)
+
+    # Create a route to the Internet Gateway
+    Route(scope, 'RouteToInternet', route_table_id=public_route_table.id, destination_cidr_block='0.0.0.0/0', gateway_id=internet_gateway.id)
+
+    if layout:
+        tiered = build_tiered_subnets(scope, config, vpc, internet_gateway, public_route_table)
+        by_tier = {tier: [subnet.id for subnet in tiered['subnets'].get(tier, [])] for tier in SUBNET_TIERS}
+        subnets = [subnet for tier_subnets in tiered['subnets'].values() for subnet in tier_subnets]
+        subnet_ids = by_tier['private'] or by_tier['public']
+        cluster_subnet_ids = by_tier['private'] + by_tier['public']
+        db_subnet_ids = by_tier['data'] or subnet_ids
+        elb_subnet_ids = by_tier['public'] or subnet_ids
+        internal_elb_subnet_ids = by_tier['private'] or by_tier['public']
+        route_table_ids = [route_table.id for tables in tiered['route_tables'].values() for route_table in tables]
+        zones = tiered['zones']
+    else:
+        zones = availability_zones(scope, config)
+
+        # Create subnets with auto-assign public IP enabled
+        subnet1 = Subnet(scope, 'Subnet1',
+            vpc_id=vpc.id,
+            cidr_block='10.0.1.0/24',
+            availability_zone=zones[0],
+            map_public_ip_on_launch=True,  # Enable auto-assign public IP
+            tags={
+            'kubernetes.io/role/elb': '1',
+            **karpenter_discovery_tags(config),
+        })
+
+        subnet2 = Subnet(scope, 'Subnet2', vpc_id=vpc.id, cidr_block='10.0.2.0/24', availability_zone=zones[1], map_public_ip_on_launch=True, tags={
+            'kubernetes.io/role/internal-elb': '1',
+            **karpenter_discovery_tags(config),
+        })
+        # Associate the public subnets with the Route Table
+        RouteTableAssociation(scope, 'Subnet1RouteTableAssociation', subnet_id=subnet1.id, route_table_id=public_route_table.id)
+        RouteTableAssociation(scope, 'Subnet2RouteTableAssociation', subnet_id=subnet2.id, route_table_id=public_route_table.id)
+        subnets = [subnet1, subnet2]
+        subnet_ids = cluster_subnet_ids = db_subnet_ids = [subnet1.id, subnet2.id]
+        # A load balancer needs subnets in two AZs, and both subnets route to the internet gateway
+        elb_subnet_ids = internal_elb_subnet_ids = [subnet1.id, subnet2.id]
+        route_table_ids = [public_route_table.id]
+
+    # Create a security group for EKS clusters
+    eks_security_group = SecurityGroup(scope, 'EksSecurityGroup', vpc_id=vpc.id, description='EKS Security Group',
+                                       tags=karpenter_discovery_tags(config) or None)
+    eks_security_group.put_ingress([SecurityGroupIngress(from_port=0, to_port=0, protocol="-1", cidr_blocks=['0.0.0.0/0'])])
+
+    # S3, ECR, STS, EKS and CloudWatch Logs endpoints when "vpc_endpoints" is enabled
+    vpc_endpoints = build_vpc_endpoints(scope, config, vpc, subnet_ids, route_table_ids)
+
+    return {
+        'vpc': vpc,
+        'vpc_endpoints': vpc_endpoints,
+        'availability_zones': zones,
+        'subnets': subnets,
+        'subnet_ids': subnet_ids,
+        'cluster_subnet_ids': cluster_subnet_ids,
+        'db_subnet_ids': db_subnet_ids,
+        'elb_subnet_ids': elb_subnet_ids,
+        'internal_elb_subnet_ids': internal_elb_subnet_ids,
+        'route_table_ids': route_table_ids,
+        'eks_security_group': eks_security_group,
+    }
+
+
+def autoscaler_policy_document(autoscaler, node_role_arn):
+    """IAM permissions for Cluster Autoscaler or the Karpenter controller."""
+    if autoscaler == 'cluster-autoscaler':
+        statements = [
+            {
+                "Effect": "Allow",
+                "Action": [
+                    "autoscaling:DescribeAutoScalingGroups",
+                    "autoscaling:DescribeAutoScalingInstances",
+                    "autoscaling:DescribeLaunchConfigurations",
+                    "autoscaling:DescribeScalingActivities",
+                    "autoscaling:DescribeTags",
+                    "ec2:DescribeImages",
+                    "ec2:DescribeInstanceTypes",
+                    "ec2:DescribeLaunchTemplateVersions",
+                    "ec2:GetInstanceTypesFromInstanceRequirements",
+                    "eks:DescribeNodegroup",
+                ],
+                "Resource": "*",
+            },
+            {
+                # Only node groups tagged by autoscaler_tags can be resized
+                "Effect": "Allow",
+                "Action": ["autoscaling:SetDesiredCapacity", "autoscaling:TerminateInstanceInAutoScalingGroup"],
+                "Resource": "*",
+                "Condition": {"StringEquals": {"aws:ResourceTag/k8s.io/cluster-autoscaler/enabled": "true"}},
+            },
+        ]
+    else:
+        statements = [
+            {
+                "Effect": "Allow",
+                "Action": [
+                    "ec2:CreateFleet",
+                    "ec2:CreateLaunchTemplate",
+                    "ec2:CreateTags",
+                    "ec2:DeleteLaunchTemplate",
+                    "ec2:RunInstances",
+                    "ec2:TerminateInstances",
+                    "ec2:DescribeAvailabilityZones",
+                    "ec2:DescribeImages",
+                    "ec2:DescribeInstances",
+                    "ec2:DescribeInstanceTypeOfferings",
+                    "ec2:DescribeInstanceTypes",
+                    "ec2:DescribeLaunchTemplates",
+                    "ec2:DescribeSecurityGroups",
+                    "ec2:DescribeSpotPriceHistory",
+                    "ec2:DescribeSubnets",
+                    "eks:DescribeCluster",
+                    "iam:GetInstanceProfile",
+                    "iam:CreateInstanceProfile",
+                    "iam:TagInstanceProfile",
+                    "iam:AddRoleToInstanceProfile",
+                    "iam:RemoveRoleFromInstanceProfile",
+                    "iam:DeleteInstanceProfile",
+                    "pricing:GetProducts",
+                    "ssm:GetParameter",
+                ],
+                "Resource": "*",
+            },
+            {
+                # Karpenter's nodes run with the same role as the managed node groups
+                "Effect": "Allow",
+                "Action": "iam:PassRole",
+                "Resource": node_role_arn,
+            },
+        ]
+    return {"Version": "2012-10-17", "Statement": statements}
+
+
+@tracing.traced('construct.iam')
+def build_iam(scope, config, account_id=None):
+    """The EKS cluster and node roles with their policies.
+
+    Without an account_id the account is read from an aws_caller_identity
+    data source at plan time, so synth makes no AWS calls.
+    """
+    from cdktf_cdktf_provider_aws.data_aws_caller_identity import DataAwsCallerIdentity
+    from cdktf_cdktf_provider_aws.iam_role import IamRole
+    from cdktf_cdktf_provider_aws.iam_policy import IamPolicy
+    from cdktf_cdktf_provider_aws.iam_role_policy_attachment import IamRolePolicyAttachment
+
+    eks_role = IamRole(scope, 'EksRole', assume_role_policy=assume_role_policy('eks.amazonaws.com'))
+
+    eks_node_role = IamRole(scope, 'EksNodeRole', assume_role_policy=assume_role_policy('ec2.amazonaws.com'))
+
+    if account_id is None:
+        account_id = DataAwsCallerIdentity(scope, 'CallerIdentity').account_id
+
+    # Define the IAM policy for PassRole dynamically
+    pass_role_policy = IamPolicy(scope, 'PassRolePolicy', policy=f'''{{
+            "Version": "2012-10-17",
+            "Statement": [
+                {{
+                    "Effect": "Allow",
+                    "Action": "iam:PassRole",
+                    "Resource": "arn:aws:iam::{account_id}:role/{eks_node_role.name}"
+                }}
+            ]
+        }}''')
+
+    # Attach the PassRole policy to the role used by your application
+    IamRolePolicyAttachment(scope, 'PassRolePolicyAttachment', role=eks_node_role.name, policy_arn=pass_role_policy.arn)
+
+    # Create a policy for S3 access
+    s3_access_policy = IamPolicy(scope, 'S3AccessPolicy', policy='''{
+            "Version": "2012-10-17",
+            "Statement": [
+                {
+                    "Effect": "Allow",
+                    "Action": "s3:*",
+                    "Resource": "arn:aws:s3:::reports/*"
+                }
+            ]
+        }''')
+
+    # Attach S3 access policy to the EKS node role
+    IamRolePolicyAttachment(scope, 'S3AccessPolicyAttachment', role=eks_node_role.name, policy_arn=s3_access_policy.arn)
+
+    # Attach policies to roles
+    IamRolePolicyAttachment(scope, 'EksPolicyAttachment', role=eks_role.name, policy_arn='arn:aws:iam::aws:policy/AmazonEKSClusterPolicy')
+    IamRolePolicyAttachment(scope, 'EksNodePolicyAttachment', role=eks_node_role.name, policy_arn='arn:aws:iam::aws:policy/AmazonEKSWorkerNodePolicy')
+    IamRolePolicyAttachment(scope, 'CloudWatchPolicyAttachment', role=eks_role.name, policy_arn="arn:aws:iam::aws:policy/CloudWatchLogsFullAccess")
+
+    # Add AmazonEKSWorkerNodePolicy to the EksNodeRole
+    IamRolePolicyAttachment(scope, 'EksNodeWorkerNodePolicyAttachment', role=eks_node_role.name, policy_arn='arn:aws:iam::aws:policy/AmazonEKSWorkerNodePolicy')
+
+    # Let the autoscaler running on the nodes resize node groups or launch instances
+    autoscaler = config.get('autoscaler')
+    if autoscaler:
+        if autoscaler not in AUTOSCALERS:
+            raise ValueError(f"Unknown autoscaler {autoscaler}, expected one of {list(AUTOSCALERS)}")
+        autoscaler_policy = IamPolicy(scope, 'AutoscalerPolicy', policy=json.dumps(
+            autoscaler_policy_document(autoscaler, eks_node_role.arn), indent=2))
+        IamRolePolicyAttachment(scope, 'AutoscalerPolicyAttachment', role=eks_node_role.name, policy_arn=autoscaler_policy.arn)
+
+    return {
+        'eks_role': eks_role,
+        'eks_node_role': eks_node_role,
+        'account_id': account_id,
+    }
+
+
+READER_SCALING_METRICS = {
+    'cpu': 'RDSReaderAverageCPUUtilization',
+    'connections': 'RDSReaderAverageDatabaseConnections',
+}
+
+
+def build_reader_autoscaling(scope, rds_cluster, readers, depends_on=None):
+    """Application Auto Scaling of the Aurora reader count on CPU or connections.
+
+    Aurora only scales a cluster that already has a reader, so the target
+    should depend on the reader instances.
+    """
+    from cdktf_cdktf_provider_aws.appautoscaling_policy import AppautoscalingPolicy
+    from cdktf_cdktf_provider_aws.appautoscaling_target import AppautoscalingTarget
+
+    scaling = readers['autoscaling']
+    metric = scaling.get('metric', 'cpu')
+    if metric not in READER_SCALING_METRICS:
+        raise ValueError(f"Unknown reader scaling metric {metric}, expected one of {sorted(READER_SCALING_METRICS)}")
+    target = AppautoscalingTarget(scope, 'RdsReaderScalingTarget',
+        service_namespace='rds',
+        scalable_dimension='rds:cluster:ReadReplicaCount',
+        resource_id=f"cluster:{rds_cluster.cluster_identifier}",
+        min_capacity=scaling.get('min_capacity', readers.get('count', 1)),
+        max_capacity=scaling['max_capacity'],
+        depends_on=depends_on)
+    return AppautoscalingPolicy(scope, 'RdsReaderScalingPolicy',
+        name=f"{rds_cluster.cluster_identifier}-reader-{metric}",
+        policy_type='TargetTrackingScaling',
+        service_namespace=target.service_namespace,
+        scalable_dimension=target.scalable_dimension,
+        resource_id=target.resource_id,
+        target_tracking_scaling_policy_configuration={
+            'predefined_metric_specification': {'predefined_metric_type': READER_SCALING_METRICS[metric]},
+            'target_value': scaling.get('target_value', 60),
+            'scale_in_cooldown': scaling.get('scale_in_cooldown', 300),
+            'scale_out_cooldown': scaling.get('scale_out_cooldown', 300),
+        })
+
+
+RDS_PASSWORD_SECRET_NAME = 'springboot-django-rds-password'
+
+
+def build_rds_proxy(scope, config, rds_cluster, subnet_ids, vpc_id, database_security_group_ids,
+                    client_security_group_ids, has_readers=False):
+    """An RDS Proxy in front of the Aurora cluster, from config["rds"]["proxy"].
+
+    The proxy signs in with the springboot-django-rds-password secret through
+    its own IAM role, accepts MySQL connections only from
+    client_security_group_ids and keeps a pool sized by the configured
+    percentages of max_connections. With readers it also gets a read-only
+    endpoint. The database security groups keep their inline rules (mixing
+    them with aws_security_group_rule makes terraform fight itself) and must
+    already admit the proxy; the EKS security group does.
+    """
+    from cdktf_cdktf_provider_aws.db_proxy import DbProxy, DbProxyAuth
+    from cdktf_cdktf_provider_aws.db_proxy_default_target_group import DbProxyDefaultTargetGroup
+    from cdktf_cdktf_provider_aws.db_proxy_endpoint import DbProxyEndpoint
+    from cdktf_cdktf_provider_aws.db_proxy_target import DbProxyTarget
+    from cdktf_cdktf_provider_aws.iam_role import IamRole
+    from cdktf_cdktf_provider_aws.iam_role_policy import IamRolePolicy
+    from cdktf_cdktf_provider_aws.secretsmanager_secret import SecretsmanagerSecret
+    from cdktf_cdktf_provider_aws.secretsmanager_secret_version import SecretsmanagerSecretVersion
+    from cdktf_cdktf_provider_aws.security_group import SecurityGroup
+    from cdktf_cdktf_provider_aws.security_group_rule import SecurityGroupRule
+
+    proxy_config = config['rds']['proxy']
+    suffix = config.get('name_suffix', '')
+
+    # Create a secret in AWS Secrets Manager; the proxy needs both the username and the password
+    rds_password_secret = SecretsmanagerSecret(scope, 'RdsPasswordSecret', name=f"{RDS_PASSWORD_SECRET_NAME}{suffix}")
+    SecretsmanagerSecretVersion(scope, 'RdsPasswordSecretVersion', secret_id=rds_password_secret.id, secret_string=json.dumps({
+        "username": config['rds']['username'], "password": os.getenv('RDS_PASSWORD')}))
+
+    proxy_role = IamRole(scope, 'RdsProxyRole', assume_role_policy=assume_role_policy('rds.amazonaws.com'))
+    IamRolePolicy(scope, 'RdsProxySecretPolicy', role=proxy_role.id, policy=json.dumps({
+        "Version": "2012-10-17",
+        "Statement": [{"Effect": "Allow", "Action": "secretsmanager:GetSecretValue", "Resource": rds_password_secret.arn}],
+    }, indent=2))
+
+    port = proxy_config.get('port', 3306)
+    proxy_security_group = SecurityGroup(scope, 'RdsProxySecurityGroup', vpc_id=vpc_id, description='RDS Proxy')
+    for index, client_group_id in enumerate(client_security_group_ids, start=1):
+        SecurityGroupRule(scope, f"RdsProxyIngress{index}", type='ingress', protocol='tcp', from_port=port, to_port=port,
+                          security_group_id=proxy_security_group.id, source_security_group_id=client_group_id)
+    for index, database_group_id in enumerate(database_security_group_ids, start=1):
+        SecurityGroupRule(scope, f"RdsProxyEgress{index}", type='egress', protocol='tcp', from_port=port, to_port=port,
+                          security_group_id=proxy_security_group.id, source_security_group_id=database_group_id)
+
+    proxy = DbProxy(scope, 'RdsProxy',
+        name=f"rds-proxy{suffix}",
+        engine_family='MYSQL',
+        role_arn=proxy_role.arn,
+        vpc_subnet_ids=subnet_ids,
+        vpc_security_group_ids=[proxy_security_group.id],
+        require_tls=proxy_config.get('require_tls', True),
+        idle_client_timeout=proxy_config.get('idle_client_timeout', 1800),
+        auth=[DbProxyAuth(auth_scheme='SECRETS', iam_auth='DISABLED', secret_arn=rds_password_secret.arn)])
+    target_group = DbProxyDefaultTargetGroup(scope, 'RdsProxyTargetGroup', db_proxy_name=proxy.name, connection_pool_config={
+        'connection_borrow_timeout': proxy_config.get('connection_borrow_timeout', 120),
+        'max_connections_percent': proxy_config.get('max_connections_percent', 90),
+        'max_idle_connections_percent': proxy_config.get('max_idle_connections_percent', 50),
+    })
+    DbProxyTarget(scope, 'RdsProxyTarget', db_proxy_name=proxy.name, target_group_name=target_group.name,
+                  db_cluster_identifier=rds_cluster.cluster_identifier)
+
+    reader_endpoint = None
+    if has_readers:
+        reader_endpoint = DbProxyEndpoint(scope, 'RdsProxyReaderEndpoint', db_proxy_name=proxy.name,
+                                          db_proxy_endpoint_name=f"rds-proxy{suffix}-reader", target_role='READ_ONLY',
+                                          vpc_subnet_ids=subnet_ids, vpc_security_group_ids=[proxy_security_group.id])
+    return {'proxy': proxy, 'reader_endpoint': reader_endpoint, 'secret': rds_password_secret,
+            'security_group': proxy_security_group}
+
+
+@tracing.traced('construct.data')
+def build_data(scope, config, subnet_ids, security_group_ids, zones=None, vpc_id=None, client_security_group_ids=None):
+    """The DB subnet group and the Aurora MySQL cluster with its instances.
+
+    With an "instance_class" in config["rds"] the cluster gets a writer
+    instance and "readers" {"count": N} reader instances spread over zones,
+    optionally autoscaled ("readers": {"autoscaling": {...}}). Without one
+    the cluster has no instances, as before. "proxy": {"enabled": true} adds
+    an RDS Proxy (build_rds_proxy) for client_security_group_ids, which
+    default to security_group_ids.
+    """
+    from cdktf_cdktf_provider_aws.rds_cluster import RdsCluster
+    from cdktf_cdktf_provider_aws.rds_cluster_instance import RdsClusterInstance
+    from cdktf_cdktf_provider_aws import db_subnet_group
+
+    # Create a DB subnet group for the RDS instance
+    the_db_subnet_group = db_subnet_group.DbSubnetGroup(scope, 'DbSubnetGroup',
+        name=f"db-subnet-group{config.get('name_suffix', '')}",
+        subnet_ids=subnet_ids,
+        description='Subnet group for RDS instance'
+    )
+
+    # Create an Aurora RDS MySQL database
+    rds_cluster = RdsCluster(scope, 'RdsCluster', engine='aurora-mysql', master_username=config['rds']['username'], master_password=os.getenv('RDS_PASSWORD'), vpc_security_group_ids=security_group_ids, db_subnet_group_name=the_db_subnet_group.name)
+
+    rds = config['rds']
+    instances = []
+    if rds.get('instance_class'):
+        readers = rds.get('readers', {})
+        zones = zones or [None]
+        # Instances go round-robin over the zones, starting with the writer in the first one
+        for index in range(1 + readers.get('count', 0)):
+            instance_id = 'RdsWriterInstance' if index == 0 else f"RdsReaderInstance{index}"
+            instances.append(RdsClusterInstance(scope, instance_id,
+                cluster_identifier=rds_cluster.id,
+                engine=rds_cluster.engine,
+                instance_class=rds['instance_class'] if index == 0 else readers.get('instance_class', rds['instance_class']),
+                availability_zone=zones[index % len(zones)],
+                db_subnet_group_name=the_db_subnet_group.name,
+                # Failover prefers the lowest tier, so the configured readers go before autoscaled ones
+                promotion_tier=0 if index == 0 else 1))
+        if readers.get('autoscaling'):
+            build_reader_autoscaling(scope, rds_cluster, readers, depends_on=instances[1:] or None)
+
+    proxy = None
+    if rds.get('proxy', {}).get('enabled'):
+        proxy = build_rds_proxy(scope, config, rds_cluster, subnet_ids, vpc_id, security_group_ids,
+                                client_security_group_ids or security_group_ids, has_readers=len(instances) > 1)
+
+    return {
+        'db_subnet_group': the_db_subnet_group,
+        'rds_cluster': rds_cluster,
+        'rds_instances': instances,
+        'rds_proxy': proxy,
+    }
+
+
+def data_outputs(scope, data):
+    """Writer and reader endpoints of the cluster, and of its RDS Proxy when there is one."""
+    # Writes go to the cluster endpoint, reads can be split off to the reader endpoint
+    TerraformOutput(scope, 'rds_cluster_endpoint', value=data['rds_cluster'].endpoint)
+    TerraformOutput(scope, 'rds_reader_endpoint', value=data['rds_cluster'].reader_endpoint)
+    if data['rds_proxy']:
+        TerraformOutput(scope, 'rds_proxy_endpoint', value=data['rds_proxy']['proxy'].endpoint)
+        if data['rds_proxy']['reader_endpoint']:
+            TerraformOutput(scope, 'rds_proxy_reader_endpoint', value=data['rds_proxy']['reader_endpoint'].endpoint)
+
+
+# Upstreams the pull-through cache can front; Docker Hub, GitHub and GitLab need a credential secret
+PULL_THROUGH_UPSTREAMS = {
+    'docker-hub': 'registry-1.docker.io',
+    'ecr-public': 'public.ecr.aws',
+    'k8s': 'registry.k8s.io',
+    'quay': 'quay.io',
+    'github': 'ghcr.io',
+}
+
+
+def ecr_lifecycle_policy(lifecycle):
+    """Expire untagged images after untagged_expire_days and, with keep_last, all but the newest keep_last images."""
+    rules = [{
+        'rulePriority': 1,
+        'description': f"Expire untagged images after {lifecycle.get('untagged_expire_days', 7)} days",
+        'selection': {'tagStatus': 'untagged', 'countType': 'sinceImagePushed', 'countUnit': 'days',
+                      'countNumber': lifecycle.get('untagged_expire_days', 7)},
+        'action': {'type': 'expire'},
+    }]
+    if lifecycle.get('keep_last'):
+        # A tagStatus "any" rule must have the highest priority number
+        rules.append({
+            'rulePriority': 2,
+            'description': f"Keep the newest {lifecycle['keep_last']} images",
+            'selection': {'tagStatus': 'any', 'countType': 'imageCountMoreThan', 'countNumber': lifecycle['keep_last']},
+            'action': {'type': 'expire'},
+        })
+    return {'rules': rules}
+
+
+@tracing.traced('construct.registry')
+def build_registry(scope, config, node_role_name, account_id=None):
+    """The ECR repository from config["ecrRepo"], plus pull-through cache rules and replication.
+
+    The repository gets a lifecycle policy, scan-on-push and, with
+    "immutable_tags", immutable tags. Pull-through cache rules and the
+    replication configuration belong to the account's registry in the region
+    rather than to one repository, so in a deployment matrix only the first
+    environment's cell of each region creates them (config["owns_registry"]).
+    Images pushed to this region are replicated to every other region of the
+    matrix, or to "replication_regions" when listed. The node role gets ECR
+    read access, and may create the cache repositories on a first pull.
+    """
+    from cdktf_cdktf_provider_aws.data_aws_caller_identity import DataAwsCallerIdentity
+    from cdktf_cdktf_provider_aws.data_aws_secretsmanager_secret import DataAwsSecretsmanagerSecret
+    from cdktf_cdktf_provider_aws.ecr_lifecycle_policy import EcrLifecyclePolicy
+    from cdktf_cdktf_provider_aws.ecr_pull_through_cache_rule import EcrPullThroughCacheRule
+    from cdktf_cdktf_provider_aws.ecr_replication_configuration import (
+        EcrReplicationConfiguration,
+        EcrReplicationConfigurationReplicationConfiguration,
+        EcrReplicationConfigurationReplicationConfigurationRule,
+        EcrReplicationConfigurationReplicationConfigurationRuleDestination,
+        EcrReplicationConfigurationReplicationConfigurationRuleRepositoryFilter,
+    )
+    from cdktf_cdktf_provider_aws.ecr_repository import EcrRepository
+    from cdktf_cdktf_provider_aws.iam_policy import IamPolicy
+    from cdktf_cdktf_provider_aws.iam_role_policy_attachment import IamRolePolicyAttachment
+
+    ecr = config['ecrRepo']
+    region = config.get('region', DEFAULT_REGION)
+    if account_id is None:
+        account_id = DataAwsCallerIdentity(scope, 'RegistryCallerIdentity').account_id
+
+    repository = EcrRepository(scope, 'EcrRepository',
+        name=f"{ecr['name']}{config.get('name_suffix', '')}",
+        image_tag_mutability='IMMUTABLE' if ecr.get('immutable_tags') else 'MUTABLE',
+        image_scanning_configuration={'scan_on_push': ecr.get('scan_on_push', True)})
+    EcrLifecyclePolicy(scope, 'EcrLifecyclePolicy', repository=repository.name,
+                       policy=json.dumps(ecr_lifecycle_policy(ecr.get('lifecycle', {})), indent=2))
+
+    IamRolePolicyAttachment(scope, 'EcrReadOnlyPolicyAttachment', role=node_role_name,
+                            policy_arn='arn:aws:iam::aws:policy/AmazonEC2ContainerRegistryReadOnly')
+
+    owns_registry = config.get('owns_registry', True)
+    cache_rules = []
+    for rule in ecr.get('pull_through_cache', []):
+        prefix = rule['prefix']
+        upstream = rule.get('upstream') or PULL_THROUGH_UPSTREAMS.get(prefix)
+        if upstream is None:
+            raise ValueError(f"Pull-through cache rule {prefix} needs an upstream, known prefixes are {list(PULL_THROUGH_UPSTREAMS)}")
+        if not owns_registry:
+            continue
+        construct_id = f"{camel_case(prefix)}PullThroughCacheRule"
+        credential_arn = rule.get('credential_arn')
+        if rule.get('credential_secret'):
+            # Secrets for pull-through cache must be named ecr-pullthroughcache/<something>
+            credential_arn = DataAwsSecretsmanagerSecret(scope, f"{construct_id}Credentials",
+                                                         name=rule['credential_secret']).arn
+        cache_rules.append(EcrPullThroughCacheRule(scope, construct_id, ecr_repository_prefix=prefix,
+                                                   upstream_registry_url=upstream, credential_arn=credential_arn))
+    if ecr.get('pull_through_cache'):
+        # The first pull through a cache rule creates the cache repository and imports the image
+        pull_through_policy = IamPolicy(scope, 'EcrPullThroughCachePolicy', policy=json.dumps({
+            "Version": "2012-10-17",
+            "Statement": [{
+                "Effect": "Allow",
+                "Action": ["ecr:CreateRepository", "ecr:BatchImportUpstreamImage"],
+                "Resource": [f"arn:aws:ecr:{region}:{account_id}:repository/{rule['prefix']}/*"
+                             for rule in ecr['pull_through_cache']],
+            }],
+        }, indent=2))
+        IamRolePolicyAttachment(scope, 'EcrPullThroughCachePolicyAttachment', role=node_role_name,
+                                policy_arn=pull_through_policy.arn)
+
+    replication = None
+    destinations = [other for other in ecr.get('replication_regions', config.get('regions', [])) if other != region]
+    if owns_registry and destinations and ecr.get('replication', True):
+        replication = EcrReplicationConfiguration(scope, 'EcrReplication',
+            replication_configuration=EcrReplicationConfigurationReplicationConfiguration(rule=[
+                EcrReplicationConfigurationReplicationConfigurationRule(
+                    destination=[EcrReplicationConfigurationReplicationConfigurationRuleDestination(
+                        region=destination, registry_id=account_id) for destination in destinations],
+                    # Prefix match also covers the environment-suffixed repositories
+                    repository_filter=[EcrReplicationConfigurationReplicationConfigurationRuleRepositoryFilter(
+                        filter=ecr['name'], filter_type='PREFIX_MATCH')])]))
+
+    TerraformOutput(scope, 'ecr_repository_url', value=repository.repository_url)
+    return {'repository': repository, 'pull_through_cache_rules': cache_rules, 'replication': replication}
+
+
+def cluster_construct_id(cluster):
+    return f"{cluster['alias'].capitalize()}Cluster"
+
+
+# What every cluster got before capacity profiles: one burstable x86 node group
+LEGACY_NODE_GROUP = {'instance_types': ['t2.micro'], 'ami_type': 'AL2_x86_64'}
+
+SCALING_KEYS = ('desired_size', 'max_size', 'min_size')
+
+# EKS taint effects and how Cluster Autoscaler spells them in node-template tags
+TAINT_EFFECTS = {'NO_SCHEDULE': 'NoSchedule', 'NO_EXECUTE': 'NoExecute', 'PREFER_NO_SCHEDULE': 'PreferNoSchedule'}
+
+AUTOSCALERS = ('cluster-autoscaler', 'karpenter')
+
+
+def is_graviton(instance_type):
+    """m7g.large, c6gn.xlarge and t4g.small are Graviton (arm64) instance types."""
+    return re.match(r'^[a-z]+\d+g[a-z]*\.', instance_type) is not None
+
+
+def cluster_node_group(config, cluster):
+    """The cluster's own "node_group" scaling config, or the shared one from config."""
+    return cluster.get('node_group', config['node_group'])
+
+
+def cluster_node_groups(config, cluster):
+    """The node groups of one cluster, with instance types, AMI type and scaling filled in.
+
+    A cluster lists its node groups under "node_groups" or names an entry of
+    config["capacity_profiles"] with "capacity_profile". Without either it
+    keeps the single legacy node group sized by "node_group".
+    """
+    if 'node_groups' in cluster:
+        profile = cluster['node_groups']
+    elif 'capacity_profile' in cluster:
+        profiles = config.get('capacity_profiles', {})
+        if cluster['capacity_profile'] not in profiles:
+            raise KeyError(f"Unknown capacity profile {cluster['capacity_profile']} for cluster {cluster['alias']}")
+        profile = profiles[cluster['capacity_profile']]
+    else:
+        return [dict(LEGACY_NODE_GROUP, name=None, scaling_config=dict(cluster_node_group(config, cluster)))]
+
+    node_groups = []
+    for entry in profile:
+        instance_types = entry['instance_types']
+        graviton = {is_graviton(instance_type) for instance_type in instance_types}
+        if len(graviton) != 1:
+            raise ValueError(f"Node group {entry['name']} of cluster {cluster['alias']} mixes arm64 and x86_64 instance types")
+        node_group = {
+            'name': entry['name'],
+            'instance_types': list(instance_types),
+            'ami_type': entry.get('ami_type', 'AL2023_ARM_64_STANDARD' if graviton.pop() else 'AL2023_x86_64_STANDARD'),
+            'capacity_type': entry.get('capacity_type', 'ON_DEMAND'),
+            'scaling_config': {key: entry[key] for key in SCALING_KEYS},
+            'labels': dict(entry.get('labels', {})),
+            'taints': [dict(taint) for taint in entry.get('taints', [])],
+        }
+        for taint in node_group['taints']:
+            if taint['effect'] not in TAINT_EFFECTS:
+                raise ValueError(f"Unknown taint effect {taint['effect']}, expected one of {sorted(TAINT_EFFECTS)}")
+        node_groups.append(node_group)
+    return node_groups
+
+
+def camel_case(name):
+    """spot-arm, ecr.api and data_tier become SpotArm, EcrApi and DataTier."""
+    return ''.join(part.capitalize() for part in re.split(r'[-_.]', name))
+
+
+def node_group_construct_id(node_group):
+    """spot-arm becomes SpotArmNodeGroup; the legacy node group keeps its original id."""
+    if not node_group['name']:
+        return 'NodeGroup'
+    return camel_case(node_group['name']) + 'NodeGroup'
+
+
+def node_group_name(alias, node_group):
+    return f"{alias}-{node_group['name']}" if node_group['name'] else f"{alias}-nodegroup"
+
+
+def autoscaler_tags(cluster_name, node_group, autoscaler):
+    """Tags that let the configured autoscaler discover the node group and scale it from zero."""
+    if autoscaler == 'cluster-autoscaler':
+        tags = {
+            'k8s.io/cluster-autoscaler/enabled': 'true',
+            f"k8s.io/cluster-autoscaler/{cluster_name}": 'owned',
+        }
+        for key, value in node_group.get('labels', {}).items():
+            tags[f"k8s.io/cluster-autoscaler/node-template/label/{key}"] = value
+        for taint in node_group.get('taints', []):
+            tags[f"k8s.io/cluster-autoscaler/node-template/taint/{taint['key']}"] = \
+                f"{taint.get('value', '')}:{TAINT_EFFECTS[taint['effect']]}"
+        return tags
+    # Karpenter launches its own nodes; it finds subnets and security groups by karpenter_discovery_tags
+    return {}
+
+
+def karpenter_discovery_tags(config):
+    """Tags Karpenter's EC2NodeClass selects subnets and security groups by."""
+    if config.get('autoscaler') != 'karpenter':
+        return {}
+    return {'karpenter.sh/discovery': f"cdktf-eks-cluster{config.get('name_suffix', '')}"}
+
+
+def node_group_kwargs(node_group, cluster_name=None, autoscaler=None):
+    """EksNodeGroup arguments for one entry of cluster_node_groups."""
+    kwargs = {
+        'instance_types': node_group['instance_types'],
+        'ami_type': node_group['ami_type'],
+        'scaling_config': node_group['scaling_config'],
+    }
+    if node_group['name'] is None:
+        return kwargs
+    kwargs['capacity_type'] = node_group['capacity_type']
+    if node_group['labels']:
+        kwargs['labels'] = node_group['labels']
+    if node_group['taints']:
+        kwargs['taint'] = node_group['taints']
+    tags = autoscaler_tags(cluster_name, node_group, autoscaler)
+    if tags:
+        kwargs['tags'] = tags
+    if autoscaler:
+        # The autoscaler owns desired_size once the group exists; don't let apply reset it
+        kwargs['lifecycle'] = {'ignore_changes': ['scaling_config[0].desired_size']}
+    return kwargs
+
+
+class EksClusterConstruct(Construct):
+    """One EKS cluster with its managed node groups and outputs."""
+
+    def __init__(self, scope: Construct, id: str, cluster: dict, node_groups: list,
+                 eks_role_arn: str, node_role_arn: str, subnet_ids: list, security_group_ids: list,
+                 autoscaler: str = None, cluster_subnet_ids: list = None, region: str = DEFAULT_REGION):
+        super().__init__(scope, id)
+
+        from cdktf_cdktf_provider_aws.eks_cluster import EksCluster
+        from cdktf_cdktf_provider_aws.eks_node_group import EksNodeGroup
+
+        alias = cluster['alias']
+        with tracing.span('construct.cluster', alias=alias):
+            logging.info(f"Creating EKS cluster and node group for cluster: {alias}")
+            # The control plane may use more subnets (public ones too) than the nodes
+            self.cluster = EksCluster(self, 'EksCluster', name=cluster['name'], role_arn=eks_role_arn, vpc_config={
+                'subnet_ids': cluster_subnet_ids or subnet_ids,
+                'security_group_ids': security_group_ids,
+            })
+            self.node_groups = {}
+            for node_group in node_groups:
+                self.node_groups[node_group['name']] = EksNodeGroup(self, node_group_construct_id(node_group),
+                    cluster_name=self.cluster.name,
+                    node_group_name=node_group_name(alias, node_group),
+                    node_role_arn=node_role_arn,
+                    subnet_ids=subnet_ids,
+                    **node_group_kwargs(node_group, cluster['name'], autoscaler))
+
+            # Deployment, autoscaler, disruption budget and Service from the cluster's "workload" section
+            self.workload = None
+            if cluster.get('workload'):
+                from workloads import WorkloadConstruct, kubernetes_provider, metrics_server_addon
+
+                provider = kubernetes_provider(self, self.cluster, alias, region)
+                self.metrics_server = None
+                if cluster['workload'].get('autoscaling', {}).get('metrics_server', True):
+                    self.metrics_server = metrics_server_addon(self, self.cluster, list(self.node_groups.values()))
+                self.workload = WorkloadConstruct(self, 'Workload', alias, cluster['workload'], provider,
+                                                  depends_on=list(self.node_groups.values()),
+                                                  autoscaler_depends_on=[self.metrics_server] if self.metrics_server else None)
+
+        TerraformOutput(self, 'EksClusterName', value=self.cluster.name).override_logical_id(f"{alias}_eks_cluster_name")
+
+
+def build_clusters(scope, config, eks_role_arn, node_role_arn, subnet_ids, security_group_ids, cluster_subnet_ids=None):
+    """An EksClusterConstruct per entry in config['eks_clusters'], keyed by alias."""
+    return {
+        cluster['alias']: EksClusterConstruct(scope, cluster_construct_id(cluster), cluster,
+                                              cluster_node_groups(config, cluster), eks_role_arn, node_role_arn,
+                                              subnet_ids, security_group_ids, autoscaler=config.get('autoscaler'),
+                                              cluster_subnet_ids=cluster_subnet_ids,
+                                              region=config.get('region', DEFAULT_REGION))
+        for cluster in config['eks_clusters']
+    }
+
+
+class NetworkStack(TerraformStack):
+
+    def __init__(self, scope: Construct, id: str, config: dict, region: str = DEFAULT_REGION):
+        super().__init__(scope, id)
+        from cdktf_cdktf_provider_aws.provider import AwsProvider
+
+        AwsProvider(self, "Aws", region=region)
+        self.network = build_network(self, config)
+
+        from load_balancers import build_load_balancers
+
+        # Load balancers only need the network and the reports bucket
+        self.load_balancers = build_load_balancers(self, config, self.network)
+
+
+class IamStack(TerraformStack):
+
+    def __init__(self, scope: Construct, id: str, config: dict, account_id: str = None, region: str = DEFAULT_REGION):
+        super().__init__(scope, id)
+        from cdktf_cdktf_provider_aws.provider import AwsProvider
+
+        AwsProvider(self, "Aws", region=region)
+        self.iam = build_iam(self, config, account_id)
+
+
+class DataStack(TerraformStack):
+
+    def __init__(self, scope: Construct, id: str, config: dict, network: dict, region: str = DEFAULT_REGION):
+        super().__init__(scope, id)
+        from cdktf_cdktf_provider_aws.provider import AwsProvider
+
+        AwsProvider(self, "Aws", region=region)
+        self.data = build_data(self, config, network['db_subnet_ids'], [network['eks_security_group'].id],
+                               zones=network['availability_zones'], vpc_id=network['vpc'].id)
+        data_outputs(self, self.data)
+
+
+class RegistryStack(TerraformStack):
+
+    def __init__(self, scope: Construct, id: str, config: dict, iam: dict, region: str = DEFAULT_REGION):
+        super().__init__(scope, id)
+        from cdktf_cdktf_provider_aws.provider import AwsProvider
+
+        AwsProvider(self, "Aws", region=region)
+        self.registry = build_registry(self, config, iam['eks_node_role'].name, iam['account_id'])
+
+
+class ClusterStack(TerraformStack):
+
+    def __init__(self, scope: Construct, id: str, config: dict, cluster: dict, network: dict, iam: dict,
+                 region: str = DEFAULT_REGION):
+        super().__init__(scope, id)
+        from cdktf_cdktf_provider_aws.provider import AwsProvider
+
+        AwsProvider(self, "Aws", region=region)
+        self.eks_cluster = EksClusterConstruct(self, cluster_construct_id(cluster), cluster,
+                                               cluster_node_groups(config, cluster),
+                                               iam['eks_role'].arn, iam['eks_node_role'].arn,
+                                               network['subnet_ids'], [network['eks_security_group'].id],
+                                               autoscaler=config.get('autoscaler'),
+                                               cluster_subnet_ids=network['cluster_subnet_ids'], region=region)
+
+
+def build_split_stacks(app, config, account_id=None, prefix='cdktf-eks-cluster', region=DEFAULT_REGION):
+    """Network, IAM, data, registry (with "ecrRepo") and one stack per cluster, linked by cross-stack references.
+
+    The data stack depends only on the network stack, and each cluster stack
+    on the network and IAM stacks, so a node-group change never refreshes the
+    Aurora cluster's state.
+    """
+    network_stack = NetworkStack(app, f"{prefix}-network", config, region=region)
+    iam_stack = IamStack(app, f"{prefix}-iam", config, account_id, region=region)
+    stacks = [network_stack, iam_stack, DataStack(app, f"{prefix}-data", config, network_stack.network, region=region)]
+    if config.get('ecrRepo'):
+        stacks.append(RegistryStack(app, f"{prefix}-registry", config, iam_stack.iam, region=region))
+    for cluster in config['eks_clusters']:
+        stacks.append(ClusterStack(app, f"{prefix}-cluster-{cluster['alias']}", config, cluster,
+                                   network_stack.network, iam_stack.iam, region=region))
+    return stacks
@@ -0,0 +1,88 @@
+import json
+import os
+
+import synth_cache
+from synth_cache import SynthCache
+
+
+def make_project(tmp_path):
+    (tmp_path / 'config.json').write_text(json.dumps({'eks_clusters': []}))
+    (tmp_path / '.env').write_text('RDS_PASSWORD=secret')
+    (tmp_path / 'main.py').write_text('print("stack")')
+    (tmp_path / 'Pipfile.lock').write_text(json.dumps({'default': {
+        'cdktf': {'version': '==0.20.10'},
+        'cdktf-cdktf-provider-aws': {'version': '==19.42.0'},
+        'boto3': {'version': '==1.35.64'},
+    }}))
+    return tmp_path
+
+
+def make_outdir(path, body):
+    (path / 'stacks' / 'stack').mkdir(parents=True)
+    (path / 'manifest.json').write_text('{}')
+    (path / 'stacks' / 'stack' / 'cdk.tf.json').write_text(body)
+    return path
+
+
+class TestComputeKey:
+
+    def test_key_is_stable(self, tmp_path):
+        project = make_project(tmp_path)
+        assert synth_cache.compute_key(project) == synth_cache.compute_key(project)
+
+    def test_key_changes_with_inputs(self, tmp_path):
+        project = make_project(tmp_path)
+        key = synth_cache.compute_key(project)
+        assert synth_cache.compute_key(project, extra='{"stack": "other"}') != key
+
+        (project / 'config.json').write_text(json.dumps({'eks_clusters': [{'alias': 'a'}]}))
+        assert synth_cache.compute_key(project) != key
+
+    def test_key_changes_with_env_vars(self, tmp_path):
+        project = make_project(tmp_path)
+        key = synth_cache.compute_key(project, environ={'RDS_PASSWORD': 'first'})
+        assert synth_cache.compute_key(project, environ={'RDS_PASSWORD': 'first'}) == key
+        assert synth_cache.compute_key(project, environ={'RDS_PASSWORD': 'second'}) != key
+        assert synth_cache.compute_key(project, environ={}) != key
+        assert synth_cache.compute_key(project, environ={'RDS_PASSWORD': 'first', 'HOME': '/elsewhere'}) == key
+
+    def test_key_ignores_unpinned_packages_and_tests(self, tmp_path):
+        project = make_project(tmp_path)
+        key = synth_cache.compute_key(project)
+        lock = json.loads((project / 'Pipfile.lock').read_text())
+        lock['default']['boto3']['version'] = '==1.36.0'
+        (project / 'Pipfile.lock').write_text(json.dumps(lock))
+        (project / 'main-test.py').write_text('assert True')
+        assert synth_cache.compute_key(project) == key
+
+        lock['default']['cdktf-cdktf-provider-aws']['version'] = '==19.43.0'
+        (project / 'Pipfile.lock').write_text(json.dumps(lock))
+        assert synth_cache.compute_key(project) != key
+
+
+class TestSynthCache:
+
+    def test_miss_then_hit(self, tmp_path):
+        cache = SynthCache(str(tmp_path / 'cache'))
+        outdir = make_outdir(tmp_path / 'out', '{"resource": {}}')
+        assert not cache.restore('abc', str(tmp_path / 'restored'))
+
+        cache.store('abc', str(outdir))
+        assert cache.restore('abc', str(tmp_path / 'restored'))
+        assert (tmp_path / 'restored' / 'stacks' / 'stack' / 'cdk.tf.json').read_text() == '{"resource": {}}'
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = SynthCache(str(tmp_path / 'cache'), max_entries=2)
+        for index, key in enumerate(['a', 'b']):
+            cache.store(key, str(make_outdir(tmp_path / f'out{key}', '{}')))
+            os.utime(tmp_path / 'cache' / key, (index, index))
+        cache.restore('a', str(tmp_path / 'restored'))
+        cache.store('c', str(make_outdir(tmp_path / 'outc', '{}')))
+        assert sorted(cache.entries()) == ['a', 'c']
+
+    def test_evicts_by_size_but_keeps_newest(self, tmp_path):
+        cache = SynthCache(str(tmp_path / 'cache'), max_bytes=10)
+        cache.store('a', str(make_outdir(tmp_path / 'outa', 'x' * 20)))
+        assert cache.entries() == ['a']
+        cache.store('b', str(make_outdir(tmp_path / 'outb', 'y' * 20)))
+        assert cache.entries() == ['b']
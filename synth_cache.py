@@ -0,0 +1,133 @@
+"""Content-addressed cache for synthesized cdktf.out directories.
+
+The cache key is a hash of everything that can change the synthesized stack
+JSON: config.json, .env, the environment variables the constructs read, the
+project's Python sources and the provider versions pinned in Pipfile.lock.
+Environment variables go in as hashes of their values. The AWS account id is
+not part of the key: synth reads it from a data source at plan time, so the
+output is the same in every account. When nothing changed, main.py restores
+the previous output instead of building MyStack again.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_DIR, '.synth-cache')
+
+# Files outside the stack code that feed into synth
+INPUT_FILES = ['config.json', '.env']
+
+# Environment variables read while building the construct tree (stacks.py bakes RDS_PASSWORD into the stack)
+ENV_VARS = ('RDS_PASSWORD',)
+
+# Pipfile.lock packages whose versions change the synthesized output
+PINNED_PACKAGES = ('cdktf', 'constructs', 'jsii')
+
+
+def pinned_provider_versions(lockfile):
+    """Return {package: version} for cdktf, constructs, jsii and the prebuilt providers."""
+    if not os.path.exists(lockfile):
+        return {}
+    with open(lockfile) as f:
+        packages = json.load(f).get('default', {})
+    return {name: info.get('version') for name, info in sorted(packages.items())
+            if name in PINNED_PACKAGES or name.startswith('cdktf-cdktf-provider-')}
+
+
+def source_files(project_dir):
+    """The stack code: every top-level module except tests and benchmarks."""
+    return sorted(name for name in os.listdir(project_dir)
+                  if name.endswith('.py') and not name.endswith('-test.py') and not name.startswith('bench_'))
+
+
+def compute_key(project_dir=PROJECT_DIR, extra=None, input_files=INPUT_FILES, env_vars=ENV_VARS, environ=None):
+    """Hash the synth inputs into a hex digest."""
+    digest = hashlib.sha256()
+
+    def feed(label, data):
+        digest.update(label.encode() + b'\0' + data + b'\0')
+
+    for name in list(input_files) + source_files(project_dir):
+        path = os.path.join(project_dir, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                feed(name, f.read())
+    versions = pinned_provider_versions(os.path.join(project_dir, 'Pipfile.lock'))
+    feed('Pipfile.lock', json.dumps(versions, sort_keys=True).encode())
+    feed('extra', json.dumps(extra, sort_keys=True).encode())
+    environ = os.environ if environ is None else environ
+    for name in env_vars:
+        value = environ.get(name)
+        feed(f"env:{name}", b'unset' if value is None else hashlib.sha256(value.encode()).digest())
+    return digest.hexdigest()
+
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class SynthCache:
+    """A directory of cached cdktf.out trees, one per key, evicted least recently used first."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=20, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def restore(self, key, outdir):
+        """Copy the cached output for key into outdir. Returns False on a miss."""
+        entry = self._entry(key)
+        if not os.path.isfile(os.path.join(entry, 'manifest.json')):
+            return False
+        if os.path.exists(outdir):
+            shutil.rmtree(outdir)
+        shutil.copytree(entry, outdir)
+        # Mark the entry as recently used for eviction
+        os.utime(entry)
+        return True
+
+    def store(self, key, outdir):
+        """Save a freshly synthesized outdir under key and evict old entries."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = self._entry(key)
+        staging = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        try:
+            shutil.copytree(outdir, staging, dirs_exist_ok=True)
+            if os.path.exists(entry):
+                shutil.rmtree(entry)
+            os.replace(staging, entry)
+            os.utime(entry)
+        finally:
+            if os.path.exists(staging):
+                shutil.rmtree(staging)
+        self.evict()
+
+    def entries(self):
+        """Cached keys, most recently used first."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        keys = [name for name in os.listdir(self.cache_dir)
+                if not name.startswith('.') and os.path.isdir(self._entry(name))]
+        return sorted(keys, key=lambda k: os.path.getmtime(self._entry(k)), reverse=True)
+
+    def evict(self):
+        """Drop least recently used entries until both the count and size limits hold."""
+        kept_bytes = 0
+        for index, key in enumerate(self.entries()):
+            size = _tree_size(self._entry(key))
+            if index >= self.max_entries or (index > 0 and kept_bytes + size > self.max_bytes):
+                logging.info(f"Evicting synth cache entry {key[:12]}")
+                shutil.rmtree(self._entry(key))
+            else:
+                kept_bytes += size
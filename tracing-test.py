@@ -0,0 +1,122 @@
+import json
+import threading
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture
+def enabled():
+    tracing.reset()
+    tracing.enable()
+    yield
+    tracing.disable()
+    tracing.reset()
+
+
+def by_name(events):
+    return {event['name']: event for event in events}
+
+
+class TestDisabled:
+
+    def test_span_is_shared_noop(self):
+        assert not tracing.is_enabled()
+        first = tracing.span('a', cluster='x')
+        assert first is tracing.span('b')
+        with first as span:
+            span.set_attribute('ignored', 1)
+        assert tracing.events() == []
+
+    def test_traced_function_still_runs(self):
+        @tracing.traced('double')
+        def double(value):
+            return value * 2
+
+        assert double(21) == 42
+        assert tracing.events() == []
+
+
+class TestSpans:
+
+    def test_nested_spans_record_parent(self, enabled):
+        with tracing.span('outer', cluster='a') as outer:
+            with tracing.span('inner') as inner:
+                inner.set_attribute('returncode', 0)
+        events = by_name(tracing.events())
+        assert events['inner']['args']['parent_id'] == outer.span_id
+        assert 'parent_id' not in events['outer']['args']
+        assert events['outer']['args']['cluster'] == 'a'
+        assert events['inner']['args']['returncode'] == 0
+        assert events['outer']['ph'] == 'X'
+        assert events['outer']['dur'] >= events['inner']['dur']
+        assert events['outer']['ts'] <= events['inner']['ts']
+
+    def test_category_is_name_prefix(self, enabled):
+        with tracing.span('aws.sts.get_caller_identity'):
+            pass
+        assert tracing.events()[0]['cat'] == 'aws'
+
+    def test_error_is_recorded_and_reraised(self, enabled):
+        with pytest.raises(ValueError):
+            with tracing.span('failing'):
+                raise ValueError('bad config')
+        assert tracing.events()[0]['args']['error'] == 'ValueError: bad config'
+
+    def test_threads_have_separate_stacks(self, enabled):
+        def work():
+            with tracing.span('worker'):
+                pass
+
+        with tracing.span('main'):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+        events = by_name(tracing.events())
+        assert 'parent_id' not in events['worker']['args']
+        assert events['worker']['tid'] != events['main']['tid']
+
+    def test_traced_decorator(self, enabled):
+        @tracing.traced('helpers.add', kind='test')
+        def add(a, b):
+            with tracing.span('inside'):
+                return a + b
+
+        assert add(1, 2) == 3
+        events = by_name(tracing.events())
+        assert events['helpers.add']['args']['kind'] == 'test'
+        assert events['inside']['args']['parent_id'] == events['helpers.add']['args']['span_id']
+
+
+class TestMerge:
+
+    def test_export_and_merge_onto_this_timeline(self, enabled):
+        with tracing.span('construct.cell', cell='dev-us-east-1'):
+            pass
+        exported = tracing.export()
+        tracing.reset()
+        # As if the spans came from a process that started a second later
+        tracing.merge(dict(exported, origin_ns=exported['origin_ns'] + 1_000_000_000))
+        merged = tracing.events()
+        assert [event['name'] for event in merged] == ['construct.cell']
+        assert merged[0]['ts'] == exported['events'][0]['ts'] + 1_000_000
+        assert merged[0]['args']['cell'] == 'dev-us-east-1'
+
+
+class TestWrite:
+
+    def test_writes_chrome_trace(self, enabled, tmp_path):
+        with tracing.span('synth.write', outdir=tmp_path):
+            pass
+        path = tmp_path / 'trace.json'
+        tracing.write(str(path))
+        document = json.loads(path.read_text())
+        assert [event['name'] for event in document['traceEvents']] == ['synth.write']
+        # Non-JSON attribute values are written as strings
+        assert document['traceEvents'][0]['args']['outdir'] == str(tmp_path)
+
+    def test_configure_from_env(self, monkeypatch, tmp_path):
+        monkeypatch.delenv('TRACE_FILE', raising=False)
+        assert tracing.configure_from_env() is None
+        assert not tracing.is_enabled()
@@ -0,0 +1,190 @@
+"""Lightweight spans for finding where a run spends its time.
+
+    with tracing.span('synth.network', region=region):
+        ...
+
+    @tracing.traced('aws.sts.get_caller_identity')
+    def fetch(): ...
+
+Spans nest per thread and carry attributes (cluster alias, command, ...).
+Tracing is off unless TRACE_FILE is set (or enable() is called); the entry
+points (main.py, postdeploy.py, postinit.py, deploy.py) then write every
+finished span to that file when the process exits. The file uses the Chrome
+trace event format, which chrome://tracing, Perfetto and speedscope open
+directly and which OpenTelemetry tooling can import:
+
+    TRACE_FILE=trace.json pipenv run python main.py --no-cache
+
+Worker processes do not read TRACE_FILE. A pool that should be traced enables
+tracing in its workers, returns their export() and merge()s it in the parent,
+as deployment_matrix.py does for the matrix cells.
+
+Disabled, span() hands back one shared no-op object and traced() adds a single
+flag check, so the instrumentation can stay in hot paths.
+"""
+import atexit
+import functools
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+_enabled = False
+_events = []
+_events_lock = threading.Lock()
+_ids = itertools.count(1)
+_local = threading.local()
+_origin_ns = time.perf_counter_ns()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ('name', 'attributes', 'span_id', 'parent_id', 'start_ns')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_ids)
+        self.parent_id = None
+        self.start_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent_id = stack[-1].span_id if stack else None
+        stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end_ns = time.perf_counter_ns()
+        _local.stack.pop()
+        if exc_type is not None:
+            self.attributes['error'] = f"{exc_type.__name__}: {exc}"
+        args = dict(self.attributes, span_id=self.span_id)
+        if self.parent_id is not None:
+            args['parent_id'] = self.parent_id
+        event = {
+            'name': self.name,
+            'cat': self.name.split('.', 1)[0],
+            'ph': 'X',
+            'ts': (self.start_ns - _origin_ns) / 1000,
+            'dur': (end_ns - self.start_ns) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+        with _events_lock:
+            _events.append(event)
+        return False
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name, **attributes):
+    """A context manager timing the enclosed block; a shared no-op while tracing is disabled."""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attributes)
+
+
+def traced(name, **attributes):
+    """Decorator running the function inside span(name, **attributes)."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with Span(name, dict(attributes)):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def events():
+    """The finished spans so far, as Chrome trace events."""
+    with _events_lock:
+        return list(_events)
+
+
+def trace_document():
+    return {
+        'traceEvents': events(),
+        'displayTimeUnit': 'ms',
+        'otherData': {'argv': sys.argv, 'pid': os.getpid()},
+    }
+
+
+def write(path):
+    """Write the finished spans to path as a Chrome trace JSON file."""
+    document = trace_document()
+    with open(path, 'w') as f:
+        # Attribute values that are not JSON (tokens, paths) are written as strings
+        json.dump(document, f, default=str)
+    logging.info(f"Wrote {len(document['traceEvents'])} spans to {path}")
+
+
+def enable(path=None):
+    """Start recording spans; with a path they are written there at exit."""
+    global _enabled
+    _enabled = True
+    if path:
+        atexit.register(write, path)
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _events_lock:
+        _events.clear()
+
+
+def export():
+    """This process's finished spans and clock origin, for merge() in another process."""
+    return {'origin_ns': _origin_ns, 'events': events()}
+
+
+def merge(exported):
+    """Add the spans export() returned in another process, moved onto this process's timeline.
+
+    perf_counter is a system-wide monotonic clock on Linux and macOS, so the
+    difference between the two origins lines the timelines up.
+    """
+    shift = (exported['origin_ns'] - _origin_ns) / 1000
+    with _events_lock:
+        _events.extend(dict(event, ts=event['ts'] + shift) for event in exported['events'])
+
+
+def configure_from_env():
+    """Enable tracing when TRACE_FILE is set. Called by the entry points only, so pool workers never write the file."""
+    path = os.getenv('TRACE_FILE')
+    if path and not _enabled:
+        enable(path)
+    return path
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+from cdktf import Testing
+
+from main import MyStack
+from workloads import container_resources
+
+WORKLOAD = {
+    'image': 'public.ecr.aws/nginx/nginx:1.27',
+    'container_port': 8080,
+    'resources': {'requests': {'cpu': '500m'}, 'limits': {'memory': '1Gi'}},
+    'autoscaling': {'min_replicas': 3, 'max_replicas': 12, 'target_cpu_utilization': 65},
+    'readiness_probe': {'path': '/healthz'},
+    'env': {'SPRING_PROFILES_ACTIVE': 'prod'},
+}
+
+CONFIG = {
+    'region': 'eu-west-1',
+    'availability_zones': {'eu-west-1': ['eu-west-1a', 'eu-west-1b']},
+    'eks_clusters': [{'name': 'angularnew-cs', 'alias': 'angular2', 'workload': WORKLOAD},
+                     {'name': 'reports-cs', 'alias': 'reports'}],
+    'node_group': {'desired_size': 2, 'max_size': 2, 'min_size': 1},
+    'rds': {'username': 'admin'},
+}
+
+
+@pytest.fixture(scope='module')
+def synthesized():
+    return json.loads(Testing.synth(MyStack(Testing.app(), 'cdktf-eks-cluster', CONFIG)))
+
+
+def test_container_resources_fill_in_defaults_per_key():
+    assert container_resources(WORKLOAD) == {'requests': {'cpu': '500m', 'memory': '256Mi'},
+                                             'limits': {'cpu': '1', 'memory': '1Gi'}}
+
+
+class TestWorkload:
+
+    def test_provider_per_cluster_with_exec_auth(self, synthesized):
+        providers = synthesized['provider']['kubernetes']
+        assert [provider['alias'] for provider in providers] == ['angular2']
+        args = providers[0]['exec'][0]['args']
+        assert args[:3] == ['eks', 'get-token', '--cluster-name'] and args[4:] == ['--region', 'eu-west-1']
+        assert args[3].startswith('${aws_eks_cluster.Angular2Cluster_EksCluster_')
+
+    def test_deployment(self, synthesized):
+        deployment = next(iter(synthesized['resource']['kubernetes_deployment_v1'].values()))
+        assert deployment['provider'] == 'kubernetes.angular2'
+        assert deployment['lifecycle'] == {'ignore_changes': ['spec[0].replicas']}
+        spec = deployment['spec']
+        assert spec['replicas'] == '3'
+        pod = spec['template']['spec']
+        container = pod['container'][0]
+        assert container['resources'] == container_resources(WORKLOAD)
+        assert container['readiness_probe']['http_get'] == {'path': '/healthz', 'port': 'http'}
+        assert container['port'] == [{'container_port': 8080, 'name': 'http'}]
+        assert container['env'] == [{'name': 'SPRING_PROFILES_ACTIVE', 'value': 'prod'}]
+        assert pod['topology_spread_constraint'] == [{
+            'label_selector': [{'match_labels': {'app': 'angular2'}}], 'max_skew': 1,
+            'topology_key': 'topology.kubernetes.io/zone', 'when_unsatisfiable': 'ScheduleAnyway'}]
+        assert len(deployment['depends_on']) == 1
+
+    def test_autoscaler_budget_and_service(self, synthesized):
+        resources = synthesized['resource']
+        hpa = next(iter(resources['kubernetes_horizontal_pod_autoscaler_v2'].values()))['spec']
+        assert (hpa['min_replicas'], hpa['max_replicas']) == (3, 12)
+        assert hpa['metric'] == [{'type': 'Resource', 'resource': {
+            'name': 'cpu', 'target': {'type': 'Utilization', 'average_utilization': 65}}}]
+        assert hpa['scale_target_ref']['kind'] == 'Deployment'
+        budget = next(iter(resources['kubernetes_pod_disruption_budget_v1'].values()))['spec']
+        assert budget['max_unavailable'] == '1'
+        service = next(iter(resources['kubernetes_service_v1'].values()))['spec']
+        assert service['selector'] == {'app': 'angular2'}
+        assert service['port'] == [{'name': 'http', 'port': 80, 'target_port': 'http'}]
+
+    def test_metrics_server_addon_for_the_autoscaler(self, synthesized):
+        resources = synthesized['resource']
+        addons = resources['aws_eks_addon']
+        assert len(addons) == 1
+        logical_id, addon = next(iter(addons.items()))
+        assert addon['addon_name'] == 'metrics-server'
+        assert addon['cluster_name'].startswith('${aws_eks_cluster.Angular2Cluster_EksCluster_')
+        assert addon['depends_on'][0].startswith('aws_eks_node_group.')
+        hpa = next(iter(resources['kubernetes_horizontal_pod_autoscaler_v2'].values()))
+        assert hpa['depends_on'] == [f"aws_eks_addon.{logical_id}"]
+
+    def test_metrics_server_can_be_left_out(self):
+        workload = dict(WORKLOAD, autoscaling=dict(WORKLOAD['autoscaling'], metrics_server=False))
+        config = dict(CONFIG, eks_clusters=[{'name': 'angularnew-cs', 'alias': 'angular2', 'workload': workload}])
+        synthesized = json.loads(Testing.synth(MyStack(Testing.app(), 'cdktf-eks-cluster', config)))
+        assert 'aws_eks_addon' not in synthesized['resource']
+        hpa = next(iter(synthesized['resource']['kubernetes_horizontal_pod_autoscaler_v2'].values()))
+        assert 'depends_on' not in hpa
+
+    def test_invalid_replica_bounds_are_rejected(self):
+        workload = dict(WORKLOAD, autoscaling={'min_replicas': 5, 'max_replicas': 2})
+        config = dict(CONFIG, eks_clusters=[{'name': 'angularnew-cs', 'alias': 'angular2', 'workload': workload}])
+        with pytest.raises(ValueError):
+            MyStack(Testing.app(), 'cdktf-eks-cluster', config)
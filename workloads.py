@@ -0,0 +1,156 @@
+"""Kubernetes workloads deployed onto each EKS cluster.
+
+An eks_clusters entry in config.json may carry a "workload" section:
+
+    "workload": {
+        "image": "123456789012.dkr.ecr.us-east-1.amazonaws.com/appreposfortrainingtrinet:angular2-1.4.2",
+        "container_port": 8080,
+        "resources": {"requests": {"cpu": "250m", "memory": "256Mi"}, "limits": {"cpu": "1", "memory": "512Mi"}},
+        "autoscaling": {"min_replicas": 2, "max_replicas": 10, "target_cpu_utilization": 70},
+        "readiness_probe": {"path": "/healthz"},
+        "pod_disruption_budget": {"max_unavailable": 1}
+    }
+
+WorkloadConstruct turns it into a Deployment whose pods are spread across
+zones, a HorizontalPodAutoscaler scaling it on CPU, a PodDisruptionBudget and
+a Service, all named after the cluster alias. Once the autoscaler owns the
+replica count, terraform no longer resets it on apply.
+
+EKS does not install metrics-server, without which the autoscaler never sees
+CPU utilization and never scales. Each cluster with a workload therefore gets
+the metrics-server EKS add-on; set "metrics_server": false under "autoscaling"
+when the cluster installs it some other way.
+"""
+from constructs import Construct
+
+DEFAULT_RESOURCES = {'requests': {'cpu': '250m', 'memory': '256Mi'}, 'limits': {'cpu': '1', 'memory': '512Mi'}}
+ZONE_TOPOLOGY_KEY = 'topology.kubernetes.io/zone'
+
+
+def kubernetes_provider(scope, eks_cluster, alias, region):
+    """A kubernetes provider for eks_cluster; terraform gets a token from `aws eks get-token` when it needs one."""
+    from cdktf import Fn
+    from cdktf_cdktf_provider_kubernetes.provider import KubernetesProvider, KubernetesProviderExec
+
+    return KubernetesProvider(scope, 'KubernetesProvider', alias=alias, host=eks_cluster.endpoint,
+        cluster_ca_certificate=Fn.base64decode(eks_cluster.certificate_authority.get(0).data),
+        exec=[KubernetesProviderExec(api_version='client.authentication.k8s.io/v1beta1', command='aws',
+                                     args=['eks', 'get-token', '--cluster-name', eks_cluster.name, '--region', region])])
+
+
+def metrics_server_addon(scope, eks_cluster, depends_on=None):
+    """The metrics-server EKS add-on, which serves the CPU metrics the HorizontalPodAutoscaler scales on."""
+    from cdktf_cdktf_provider_aws.eks_addon import EksAddon
+
+    # Its pods need nodes to run on before the add-on turns ACTIVE
+    return EksAddon(scope, 'MetricsServerAddon', cluster_name=eks_cluster.name, addon_name='metrics-server',
+                    resolve_conflicts_on_create='OVERWRITE', depends_on=depends_on)
+
+
+def container_resources(workload):
+    """Requests and limits of the workload's container, defaults filled in per key."""
+    resources = workload.get('resources', {})
+    return {kind: dict(DEFAULT_RESOURCES[kind], **resources.get(kind, {})) for kind in ('requests', 'limits')}
+
+
+class WorkloadConstruct(Construct):
+
+    def __init__(self, scope: Construct, id: str, alias: str, workload: dict, provider=None, depends_on: list = None,
+                 autoscaler_depends_on: list = None):
+        super().__init__(scope, id)
+
+        from cdktf_cdktf_provider_kubernetes.deployment_v1 import (
+            DeploymentV1,
+            DeploymentV1SpecTemplateSpecContainer,
+            DeploymentV1SpecTemplateSpecContainerEnv,
+            DeploymentV1SpecTemplateSpecContainerPort,
+            DeploymentV1SpecTemplateSpecTopologySpreadConstraint,
+            DeploymentV1SpecTemplateSpecTopologySpreadConstraintLabelSelector,
+        )
+        from cdktf_cdktf_provider_kubernetes.horizontal_pod_autoscaler_v2 import (
+            HorizontalPodAutoscalerV2,
+            HorizontalPodAutoscalerV2SpecMetric,
+        )
+        from cdktf_cdktf_provider_kubernetes.pod_disruption_budget_v1 import PodDisruptionBudgetV1
+        from cdktf_cdktf_provider_kubernetes.service_v1 import ServiceV1, ServiceV1SpecPort
+
+        if not workload.get('image'):
+            raise ValueError(f"Workload {alias} needs an image")
+        labels = {'app': alias}
+        metadata = {'name': alias, 'namespace': workload.get('namespace', 'default'), 'labels': labels}
+        resources = container_resources(workload)
+        autoscaling = workload.get('autoscaling', {})
+        min_replicas = autoscaling.get('min_replicas', workload.get('replicas', 2))
+        max_replicas = autoscaling.get('max_replicas', max(min_replicas, 10))
+        if min_replicas > max_replicas:
+            raise ValueError(f"Workload {alias}: min_replicas {min_replicas} is above max_replicas {max_replicas}")
+        if 'cpu' not in resources['requests']:
+            # CPU utilization is measured against the request
+            raise ValueError(f"Workload {alias}: scaling on CPU needs a CPU request")
+
+        probe = workload.get('readiness_probe', {})
+        spread = workload.get('topology_spread', {})
+        container = DeploymentV1SpecTemplateSpecContainer(
+            name=alias,
+            image=workload['image'],
+            port=[DeploymentV1SpecTemplateSpecContainerPort(name='http', container_port=workload.get('container_port', 8080))],
+            env=[DeploymentV1SpecTemplateSpecContainerEnv(name=name, value=str(value))
+                 for name, value in sorted(workload.get('env', {}).items())] or None,
+            resources=resources,
+            readiness_probe={
+                'http_get': {'path': probe.get('path', '/'), 'port': 'http'},
+                'initial_delay_seconds': probe.get('initial_delay_seconds', 5),
+                'period_seconds': probe.get('period_seconds', 10),
+                'failure_threshold': probe.get('failure_threshold', 3),
+            })
+        self.deployment = DeploymentV1(self, 'Deployment', provider=provider, depends_on=depends_on,
+            metadata=metadata,
+            spec={
+                'replicas': str(min_replicas),
+                'selector': {'match_labels': labels},
+                'template': {
+                    'metadata': {'labels': labels},
+                    'spec': {
+                        'container': [container],
+                        # Keep replicas balanced across zones so losing one AZ never takes all of them
+                        'topology_spread_constraint': [DeploymentV1SpecTemplateSpecTopologySpreadConstraint(
+                            max_skew=spread.get('max_skew', 1),
+                            topology_key=ZONE_TOPOLOGY_KEY,
+                            when_unsatisfiable=spread.get('when_unsatisfiable', 'ScheduleAnyway'),
+                            label_selector=[DeploymentV1SpecTemplateSpecTopologySpreadConstraintLabelSelector(
+                                match_labels=labels)])],
+                    },
+                },
+            },
+            # The HorizontalPodAutoscaler owns the replica count after the first apply
+            lifecycle={'ignore_changes': ['spec[0].replicas']})
+
+        self.autoscaler = HorizontalPodAutoscalerV2(self, 'HorizontalPodAutoscaler', provider=provider,
+            depends_on=autoscaler_depends_on,
+            metadata=metadata,
+            spec={
+                'min_replicas': min_replicas,
+                'max_replicas': max_replicas,
+                'scale_target_ref': {'api_version': 'apps/v1', 'kind': 'Deployment', 'name': self.deployment.metadata.name},
+                'metric': [HorizontalPodAutoscalerV2SpecMetric(type='Resource', resource={
+                    'name': 'cpu',
+                    'target': {'type': 'Utilization', 'average_utilization': autoscaling.get('target_cpu_utilization', 70)},
+                })],
+            })
+
+        budget = workload.get('pod_disruption_budget', {'max_unavailable': 1})
+        self.disruption_budget = PodDisruptionBudgetV1(self, 'PodDisruptionBudget', provider=provider,
+            metadata=metadata,
+            spec={
+                'selector': {'match_labels': labels},
+                'max_unavailable': str(budget['max_unavailable']) if 'max_unavailable' in budget else None,
+                'min_available': str(budget['min_available']) if 'min_available' in budget else None,
+            })
+
+        self.service = ServiceV1(self, 'Service', provider=provider,
+            metadata=metadata,
+            spec={
+                'selector': labels,
+                'type': workload.get('service_type', 'ClusterIP'),
+                'port': [ServiceV1SpecPort(name='http', port=workload.get('service_port', 80), target_port='http')],
+            })